@@ -0,0 +1 @@
+"""Load and performance benchmarks."""
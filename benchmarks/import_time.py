@@ -0,0 +1,97 @@
+"""
+Import time benchmark.
+
+Measures how long importing a module of the package takes in a fresh
+interpreter, and which heavy dependencies it loads eagerly.
+
+    python -m benchmarks.import_time --repeat 10 --budget 50
+"""
+import argparse
+import statistics
+import subprocess
+import sys
+from typing import Dict, List, Tuple
+
+DEFAULT_MODULE = "geojson_client.usgs_earthquake_hazards_program_feed"
+
+# Dependencies that are only needed once a feed is updated.
+HEAVY_MODULES = (
+    "asyncio",
+    "email.utils",
+    "geojson",
+    "haversine",
+    "requests",
+    "urllib.request",
+    "urllib3",
+)
+
+
+def parse_import_times(output: str) -> Dict[str, Tuple[int, int]]:
+    """Return the self and cumulative time in microseconds by module."""
+    times = {}
+    for line in output.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        fields = line[len("import time:") :].split("|")
+        try:
+            self_time, cumulative_time = int(fields[0]), int(fields[1])
+        except ValueError:
+            # The header line.
+            continue
+        times[fields[2].strip()] = (self_time, cumulative_time)
+    return times
+
+
+def measure(module: str = DEFAULT_MODULE) -> Dict[str, Tuple[int, int]]:
+    """Import the module in a fresh interpreter and return the import times."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import " + module],
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+        check=True,
+    )
+    return parse_import_times(result.stderr)
+
+
+def loaded_modules(module: str = DEFAULT_MODULE) -> List[str]:
+    """Return the heavy modules loaded by importing the module."""
+    code = (
+        "import sys, {module}; "
+        "print(','.join(name for name in {heavy} if name in sys.modules))"
+    ).format(module=module, heavy=HEAVY_MODULES)
+    result = subprocess.run(
+        [sys.executable, "-c", code],
+        stdout=subprocess.PIPE,
+        universal_newlines=True,
+        check=True,
+    )
+    return [name for name in result.stdout.strip().split(",") if name]
+
+
+def main(args=None):
+    """Run the benchmark from the command line."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("module", nargs="?", default=DEFAULT_MODULE)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument(
+        "--budget", type=float, default=None, help="maximum median time in ms"
+    )
+    options = parser.parse_args(args)
+    runs = [measure(options.module) for _ in range(options.repeat)]
+    cumulative = statistics.median(run[options.module][1] for run in runs) / 1000
+    print("{}: {:.1f} ms (median of {})".format(options.module, cumulative, len(runs)))
+    slowest = sorted(runs[-1].items(), key=lambda item: item[1][0], reverse=True)
+    for name, (self_time, _) in slowest[: options.top]:
+        print("  {:8.1f} ms  {}".format(self_time / 1000, name))
+    heavy = loaded_modules(options.module)
+    if heavy:
+        print("eagerly loaded: {}".format(", ".join(heavy)))
+    if options.budget is not None and cumulative > options.budget:
+        print("over budget of {:.1f} ms".format(options.budget))
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
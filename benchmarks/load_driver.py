@@ -0,0 +1,318 @@
+"""
+Load driver.
+
+Runs many feed managers against the USGS stub server and reports
+throughput, update latency, memory and callback rates.
+
+    python -m benchmarks.load_driver --managers 200 --rounds 20 --events 2000
+"""
+import argparse
+import logging
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+from benchmarks.stub_server import Scenario, StubFeedServer
+from geojson_client.generic_feed import GenericFeedManager
+from geojson_client.transport import RequestsTransport
+from geojson_client.usgs_earthquake_hazards_program_feed import (
+    UsgsEarthquakeHazardsProgramFeedManager,
+)
+
+KIND_GENERIC = "generic"
+KIND_USGS = "usgs"
+
+HOME_COORDINATES = (-30.0, 150.0)
+
+
+class StubServerTransport(RequestsTransport):
+    """Send all requests to the stub server, including those of feeds with
+    fixed URLs like the USGS feeds."""
+
+    def __init__(self, url: str):
+        """Initialise this transport."""
+        super().__init__()
+        self._url = url
+
+    def __repr__(self):
+        """Return string representation of this transport."""
+        return "<{}(url={})>".format(self.__class__.__name__, self._url)
+
+    def send(self, request, timeout):
+        """Send the request to the stub server."""
+        request = request.copy()
+        request.url = self._url
+        return super().send(request, timeout)
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    """Return the percentile of the values, with linear interpolation."""
+    if not values:
+        return 0.0
+    values = sorted(values)
+    position = (len(values) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+
+class CallbackCounter:
+    """Thread-safe counter of feed manager callbacks."""
+
+    def __init__(self):
+        """Initialise this counter."""
+        self._lock = threading.Lock()
+        self.generated = 0
+        self.updated = 0
+        self.removed = 0
+
+    def generate(self, external_id):
+        """Count a new entry."""
+        with self._lock:
+            self.generated += 1
+
+    def update(self, external_id):
+        """Count an updated entry."""
+        with self._lock:
+            self.updated += 1
+
+    def remove(self, external_id):
+        """Count a removed entry."""
+        with self._lock:
+            self.removed += 1
+
+
+class LoadReport:
+    """Results of a load run."""
+
+    def __init__(
+        self,
+        managers: int,
+        rounds: int,
+        duration: float,
+        latencies: List[float],
+        callbacks: CallbackCounter,
+        statuses: Dict[int, int],
+        bytes_sent: int,
+        peak_memory: int,
+    ):
+        """Initialise this report."""
+        self.managers = managers
+        self.rounds = rounds
+        self.duration = duration
+        self.latencies = latencies
+        self.callbacks = callbacks
+        self.statuses = statuses
+        self.bytes_sent = bytes_sent
+        self.peak_memory = peak_memory
+
+    def __repr__(self):
+        """Return string representation of this report."""
+        return "<{}(managers={}, rounds={}, updates_per_second={:.1f})>".format(
+            self.__class__.__name__,
+            self.managers,
+            self.rounds,
+            self.updates_per_second,
+        )
+
+    @property
+    def updates(self) -> int:
+        """Return the number of feed manager updates."""
+        return len(self.latencies)
+
+    @property
+    def updates_per_second(self) -> float:
+        """Return the number of updates per second."""
+        return self.updates / self.duration if self.duration else 0.0
+
+    def latency(self, fraction: float) -> float:
+        """Return a percentile of the update latency in seconds."""
+        return percentile(self.latencies, fraction)
+
+    def callbacks_per_second(self) -> Dict[str, float]:
+        """Return the rate of each type of callback."""
+        duration = self.duration or 1.0
+        return {
+            "generate": self.callbacks.generated / duration,
+            "update": self.callbacks.updated / duration,
+            "remove": self.callbacks.removed / duration,
+        }
+
+    def format(self) -> str:
+        """Return a human readable summary."""
+        lines = [
+            "managers:        {}".format(self.managers),
+            "rounds:          {}".format(self.rounds),
+            "duration:        {:.2f} s".format(self.duration),
+            "updates:         {} ({:.1f}/s)".format(
+                self.updates, self.updates_per_second
+            ),
+            "latency p50/p95/p99: {:.1f} / {:.1f} / {:.1f} ms".format(
+                self.latency(0.5) * 1000,
+                self.latency(0.95) * 1000,
+                self.latency(0.99) * 1000,
+            ),
+            "callbacks:       "
+            + ", ".join(
+                "{} {:.1f}/s".format(name, rate)
+                for name, rate in self.callbacks_per_second().items()
+            ),
+            "responses:       "
+            + ", ".join(
+                "{}: {}".format(status, count)
+                for status, count in sorted(self.statuses.items())
+            ),
+            "body bytes sent: {}".format(self.bytes_sent),
+        ]
+        if self.peak_memory:
+            lines.append(
+                "peak memory:     {:.1f} MiB".format(self.peak_memory / 2**20)
+            )
+        return "\n".join(lines)
+
+
+class LoadDriver:
+    """Run feed managers against a stub server in rounds.
+
+    In each round the scenario advances once, then every manager updates
+    once, with up to `concurrency` managers updating at the same time.
+    """
+
+    def __init__(
+        self,
+        server: StubFeedServer,
+        managers: int = 10,
+        kind: str = KIND_USGS,
+        concurrency: int = 8,
+        filter_radius: float = None,
+        trace_memory: bool = False,
+    ):
+        """Initialise this driver."""
+        self._server = server
+        self._callbacks = CallbackCounter()
+        self._concurrency = concurrency
+        self._trace_memory = trace_memory
+        self._managers = [
+            self._create_manager(kind, filter_radius) for _ in range(managers)
+        ]
+
+    def __repr__(self):
+        """Return string representation of this driver."""
+        return "<{}(managers={})>".format(self.__class__.__name__, len(self._managers))
+
+    def _create_manager(self, kind: str, filter_radius):
+        """Return a feed manager reading from the stub server."""
+        callbacks = self._callbacks
+        if kind == KIND_GENERIC:
+            return GenericFeedManager(
+                callbacks.generate,
+                callbacks.update,
+                callbacks.remove,
+                HOME_COORDINATES,
+                self._server.url,
+                filter_radius=filter_radius,
+            )
+        # The USGS feed always fetches from the USGS website.
+        return UsgsEarthquakeHazardsProgramFeedManager(
+            callbacks.generate,
+            callbacks.update,
+            callbacks.remove,
+            HOME_COORDINATES,
+            "past_day_all_earthquakes",
+            filter_radius=filter_radius,
+            transport=StubServerTransport(self._server.url),
+        )
+
+    def _update(self, feed_manager) -> float:
+        """Update a feed manager and return how long it took."""
+        start = time.perf_counter()
+        feed_manager.update()
+        return time.perf_counter() - start
+
+    def run(self, rounds: int = 10, interval: float = 0.0) -> LoadReport:
+        """Run the rounds and return the report."""
+        if self._trace_memory:
+            tracemalloc.start()
+        latencies = []
+        start = time.perf_counter()
+        try:
+            with ThreadPoolExecutor(max_workers=self._concurrency) as executor:
+                for round_number in range(rounds):
+                    if round_number:
+                        self._server.scenario.advance()
+                        if interval:
+                            time.sleep(interval)
+                    latencies.extend(executor.map(self._update, self._managers))
+            duration = time.perf_counter() - start
+            peak_memory = (
+                tracemalloc.get_traced_memory()[1] if self._trace_memory else 0
+            )
+        finally:
+            if self._trace_memory:
+                tracemalloc.stop()
+        return LoadReport(
+            len(self._managers),
+            rounds,
+            duration,
+            latencies,
+            self._callbacks,
+            self._server.statuses,
+            self._server.bytes_sent,
+            peak_memory,
+        )
+
+
+def main(args=None):
+    """Run a load test from the command line."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--kind", choices=[KIND_USGS, KIND_GENERIC], default=KIND_USGS)
+    parser.add_argument("--managers", type=int, default=10)
+    parser.add_argument("--rounds", type=int, default=10)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--interval", type=float, default=0.0)
+    parser.add_argument("--radius", type=float, default=None)
+    parser.add_argument("--events", type=int, default=100)
+    parser.add_argument("--arrivals", type=int, default=5)
+    parser.add_argument("--updates", type=int, default=10)
+    parser.add_argument("--removals", type=int, default=5)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--not-modified-rate", type=float, default=0.0)
+    parser.add_argument("--body-size", type=int, default=0)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--trace-memory", action="store_true")
+    parser.add_argument("--verbose", action="store_true")
+    options = parser.parse_args(args)
+    # Injected errors would otherwise log a warning for every update.
+    logging.basicConfig(level=logging.DEBUG if options.verbose else logging.ERROR)
+    scenario = Scenario(
+        events=options.events,
+        arrivals=options.arrivals,
+        updates=options.updates,
+        removals=options.removals,
+        latency=options.latency,
+        jitter=options.jitter,
+        error_rate=options.error_rate,
+        not_modified_rate=options.not_modified_rate,
+        body_size=options.body_size,
+        seed=options.seed,
+    )
+    with StubFeedServer(scenario) as server:
+        driver = LoadDriver(
+            server,
+            managers=options.managers,
+            kind=options.kind,
+            concurrency=options.concurrency,
+            filter_radius=options.radius,
+            trace_memory=options.trace_memory,
+        )
+        report = driver.run(options.rounds, options.interval)
+    print(report.format())
+    return report
+
+
+if __name__ == "__main__":
+    main()
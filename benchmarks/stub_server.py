@@ -0,0 +1,284 @@
+"""
+USGS stub server.
+
+Local HTTP server serving USGS-shaped GeoJSON feeds that evolve according to
+a scenario, for load and soak tests without any external traffic.
+"""
+import gzip
+import json
+import random
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+
+# Area in which events are placed, around the default home coordinates of
+# the load driver.
+DEFAULT_BOUNDS = (-40.0, 140.0, -20.0, 160.0)
+
+
+class Scenario:
+    """Evolving set of earthquake events.
+
+    Every call to `advance` adds `arrivals` new events, updates `updates`
+    existing ones and removes the `removals` oldest ones. Responses are
+    delayed by `latency` seconds plus up to `jitter` seconds, fail with 503
+    at `error_rate` and claim to be unmodified (304) at `not_modified_rate`.
+    Each body is padded to at least `body_size` bytes.
+    """
+
+    def __init__(
+        self,
+        events: int = 100,
+        arrivals: int = 5,
+        updates: int = 10,
+        removals: int = 5,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        error_rate: float = 0.0,
+        not_modified_rate: float = 0.0,
+        body_size: int = 0,
+        bounds=DEFAULT_BOUNDS,
+        seed: Optional[int] = None,
+    ):
+        """Initialise this scenario."""
+        self.arrivals = arrivals
+        self.updates = updates
+        self.removals = removals
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.not_modified_rate = not_modified_rate
+        self.body_size = body_size
+        self._bounds = bounds
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._next_id = 0
+        self._events = {}
+        self._generation = 0
+        self._generated = int(time.time() * 1000)
+        self._body = None
+        for _ in range(events):
+            self._add_event()
+
+    def __repr__(self):
+        """Return string representation of this scenario."""
+        return "<{}(generation={}, events={})>".format(
+            self.__class__.__name__, self._generation, len(self._events)
+        )
+
+    @property
+    def generation(self) -> int:
+        """Return the number of times this scenario has advanced."""
+        return self._generation
+
+    @property
+    def events(self) -> int:
+        """Return the current number of events."""
+        return len(self._events)
+
+    def advance(self):
+        """Add, update and remove events."""
+        with self._lock:
+            now = int(time.time() * 1000)
+            for _ in range(min(self.removals, len(self._events))):
+                # Events are kept in the order they were added.
+                del self._events[next(iter(self._events))]
+            for external_id in self._random.sample(
+                list(self._events), min(self.updates, len(self._events))
+            ):
+                event = self._events[external_id]
+                event["mag"] = round(self._random.uniform(1.0, 7.0), 1)
+                event["updated"] = now
+            for _ in range(self.arrivals):
+                self._add_event()
+            self._generation += 1
+            self._generated = max(now, self._generated + 1)
+            self._body = None
+
+    def body(self):
+        """Return the generation and the encoded body of the feed."""
+        with self._lock:
+            if self._body is None:
+                self._body = self._render()
+            return self._generation, self._body
+
+    def _add_event(self):
+        """Add a new event."""
+        self._next_id += 1
+        external_id = "stub{:08d}".format(self._next_id)
+        now = int(time.time() * 1000)
+        south, west, north, east = self._bounds
+        self._events[external_id] = {
+            "mag": round(self._random.uniform(1.0, 7.0), 1),
+            "time": now,
+            "updated": now,
+            "latitude": round(self._random.uniform(south, north), 4),
+            "longitude": round(self._random.uniform(west, east), 4),
+        }
+
+    def _render(self) -> bytes:
+        """Encode the events as a USGS feed."""
+        features = []
+        for external_id, event in self._events.items():
+            place = "Stub location {}".format(external_id)
+            features.append(
+                {
+                    "type": "Feature",
+                    "properties": {
+                        "mag": event["mag"],
+                        "place": place,
+                        "time": event["time"],
+                        "updated": event["updated"],
+                        "status": "automatic",
+                        "type": "earthquake",
+                        "title": "M {} - {}".format(event["mag"], place),
+                    },
+                    "geometry": {
+                        "type": "Point",
+                        "coordinates": [event["longitude"], event["latitude"], 10.0],
+                    },
+                    "id": external_id,
+                }
+            )
+        feed = {
+            "type": "FeatureCollection",
+            "metadata": {
+                "generated": self._generated,
+                "title": "USGS Stub Feed",
+                "status": 200,
+                "count": len(features),
+            },
+            "features": features,
+        }
+        body = json.dumps(feed).encode("utf-8")
+        if len(body) < self.body_size:
+            feed["metadata"]["padding"] = "x" * (self.body_size - len(body))
+            body = json.dumps(feed).encode("utf-8")
+        return body
+
+    def response_delay(self) -> float:
+        """Return the delay of the next response."""
+        return self.latency + self._random.uniform(0.0, self.jitter)
+
+    def inject(self, rate: float) -> bool:
+        """Return True at the given rate."""
+        return rate > 0 and self._random.random() < rate
+
+
+class _StubRequestHandler(BaseHTTPRequestHandler):
+    """Serve the scenario's feed for any path."""
+
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        """Respond to a GET request."""
+        server = self.server
+        scenario = server.scenario
+        delay = scenario.response_delay()
+        if delay:
+            time.sleep(delay)
+        if scenario.inject(scenario.error_rate):
+            self._respond(503)
+            return
+        if scenario.inject(scenario.not_modified_rate):
+            self._respond(304)
+            return
+        generation, body = scenario.body()
+        etag = '"{}"'.format(generation)
+        if self.headers.get("If-None-Match") == etag:
+            self._respond(304, headers={"ETag": etag})
+            return
+        headers = {"ETag": etag, "Content-Type": "application/json"}
+        if server.compress and "gzip" in self.headers.get("Accept-Encoding", ""):
+            body = gzip.compress(body, compresslevel=1)
+            headers["Content-Encoding"] = "gzip"
+        self._respond(200, body, headers)
+
+    def _respond(self, status: int, body: bytes = b"", headers: Dict = None):
+        """Send a response and count it."""
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if body:
+            self.wfile.write(body)
+        self.server.record(status, len(body))
+
+    def log_message(self, format, *args):
+        """Do not log every request."""
+
+
+class StubFeedServer:
+    """HTTP server for a scenario, listening on a free local port."""
+
+    def __init__(self, scenario: Scenario, port: int = 0, compress: bool = True):
+        """Initialise this server."""
+        self._server = ThreadingHTTPServer(("127.0.0.1", port), _StubRequestHandler)
+        self._server.daemon_threads = True
+        self._server.scenario = scenario
+        self._server.compress = compress
+        self._server.record = self._record
+        self._lock = threading.Lock()
+        self._statuses = Counter()
+        self._bytes_sent = 0
+        self._thread = None
+
+    def __repr__(self):
+        """Return string representation of this server."""
+        return "<{}(url={}, requests={})>".format(
+            self.__class__.__name__, self.url, sum(self._statuses.values())
+        )
+
+    def __enter__(self):
+        """Start serving."""
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        """Stop serving."""
+        self.stop()
+
+    @property
+    def url(self) -> str:
+        """Return the URL of the feed."""
+        host, port = self._server.server_address[:2]
+        return "http://{}:{}/feed.geojson".format(host, port)
+
+    @property
+    def scenario(self) -> Scenario:
+        """Return the scenario of this server."""
+        return self._server.scenario
+
+    @property
+    def statuses(self) -> Dict[int, int]:
+        """Return the number of responses by status code."""
+        with self._lock:
+            return dict(self._statuses)
+
+    @property
+    def bytes_sent(self) -> int:
+        """Return the number of body bytes sent."""
+        return self._bytes_sent
+
+    def start(self):
+        """Serve requests on a background thread."""
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, name="stub-feed-server", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        """Stop serving requests."""
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread:
+            self._thread.join()
+
+    def _record(self, status: int, size: int):
+        """Count a response."""
+        with self._lock:
+            self._statuses[status] += 1
+            self._bytes_sent += size
@@ -6,14 +6,24 @@ Fetches GeoJSON feed from URL to be defined by sub-class.
 import logging
 from datetime import datetime
 from json import JSONDecodeError
-from typing import Callable, Dict, List, Optional, Tuple
-
-import geojson
-import requests
-from geojson import GeometryCollection, Point, Polygon
-from haversine import haversine
-
-from geojson_client.consts import FILTER_RADIUS, HTTP_ACCEPT_ENCODING_HEADER
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional, Tuple
+
+from geojson_client import geometry as geometry_engine
+from geojson_client.consts import FILTER_RADIUS
+from geojson_client.distance import DISTANCE_HAVERSINE, DISTANCE_MODELS
+from geojson_client.exceptions import GeoJsonException
+from geojson_client.fetch_policy import (
+    CACHE_HIT,
+    CACHE_MISS,
+    CACHE_REVALIDATED,
+    FetchPolicy,
+    FetchStatus,
+)
+from geojson_client.local_source import LocalSource, StreamError, local_path
+from geojson_client.transport import RequestsTransport, Transport
+
+if TYPE_CHECKING:
+    from geojson_client.http_cache import HttpCache
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -25,15 +35,51 @@ UPDATE_ERROR = "ERROR"
 class GeoJsonFeed:
     """Geo JSON feed base class."""
 
-    def __init__(self, home_coordinates, url, filter_radius=None):
+    def __init__(
+        self,
+        home_coordinates,
+        url,
+        filter_radius=None,
+        fetch_policy: FetchPolicy = None,
+        http_cache: "HttpCache" = None,
+        skip_unchanged: bool = False,
+        distance_model: str = DISTANCE_HAVERSINE,
+        transport: Transport = None,
+        keep_last_data: bool = False,
+    ):
         """Initialise this service."""
+        if distance_model not in DISTANCE_MODELS:
+            raise GeoJsonException(
+                "Distance model must be one of %s" % DISTANCE_MODELS.keys()
+            )
+        self._distance_model = distance_model
         self._home_coordinates = home_coordinates
         self._filter_radius = filter_radius
         self._url = url
-        self._request = requests.Request(
-            method="GET", url=url, headers=HTTP_ACCEPT_ENCODING_HEADER
-        ).prepare()
+        path = local_path(url)
+        self._local_source = LocalSource(path) if path else None
+        self._transport = transport or RequestsTransport()
+        self._request = None
+        if not self._local_source:
+            import requests  # pylint: disable=import-outside-toplevel
+
+            self._request = requests.Request(
+                method="GET",
+                url=url,
+                headers={"Accept-Encoding": self._transport.accept_encoding()},
+            ).prepare()
+        self._fetch_policy = fetch_policy or FetchPolicy()
+        self._last_fetch_status = None
+        self._http_cache = http_cache
+        self._last_cached_version = None
+        self._skip_unchanged = skip_unchanged
+        self._last_fingerprint = None
+        self._requested_filter_overrides = None
+        self._applied_filter_overrides = None
+        self._keep_last_data = keep_last_data
+        self._last_data = None
         self._last_timestamp = None
+        self._last_generated = None
 
     def __repr__(self):
         """Return string representation of this feed."""
@@ -49,22 +95,25 @@ class GeoJsonFeed:
         pass
 
     def _update_internal(
-        self, filter_function: Callable[[List], List]
+        self, filter_function: Callable[[List], List], filter_overrides: Dict = None
     ) -> Tuple[str, Optional[List]]:
         """Update from external source and return filtered entries."""
+        self._requested_filter_overrides = filter_overrides or None
         status, data = self._fetch()
         if status == UPDATE_OK:
             if data:
-                entries = []
-                global_data = self._extract_from_feed(data)
-                # Extract data from feed entries.
-                for feature in data.features:
-                    entries.append(
-                        self._new_entry(self._home_coordinates, feature, global_data)
+                try:
+                    entries = self._filter_feed(data, filter_function)
+                except StreamError as stream_ex:
+                    _LOGGER.warning(
+                        "Reading data from %s failed with %s", self._url, stream_ex
                     )
-                filtered_entries = filter_function(entries)
-                self._last_timestamp = self._extract_last_timestamp(filtered_entries)
-                return UPDATE_OK, filtered_entries
+                    self._forget_versions()
+                    return UPDATE_ERROR, None
+                if self._keep_last_data:
+                    self._last_data = data
+                self._last_generated = self._extract_generated(data)
+                return UPDATE_OK, entries
             else:
                 # Should not happen.
                 return UPDATE_OK, None
@@ -72,9 +121,29 @@ class GeoJsonFeed:
             # Happens for example if the server returns 304
             return UPDATE_OK_NO_DATA, None
         else:
-            # Error happened while fetching the feed.
+            # Error happened while fetching the feed. The last data is kept,
+            # so that stale entries can still be reevaluated.
+            self._forget_versions()
             return UPDATE_ERROR, None
 
+    def _filter_feed(self, data, filter_function: Callable[[List], List]) -> List:
+        """Build the entries of the feed and return the filtered ones."""
+        filtered_entries = filter_function(self._build_entries(data))
+        self._last_timestamp = self._extract_last_timestamp(filtered_entries)
+        self._applied_filter_overrides = self._requested_filter_overrides
+        return filtered_entries
+
+    def _build_entries(self, data) -> List:
+        """Build the entries of all features of the feed."""
+        entries = []
+        global_data = self._extract_from_feed(data)
+        # Extract data from feed entries.
+        for feature in data.features:
+            entry = self._new_entry(self._home_coordinates, feature, global_data)
+            entry.distance_model = self._distance_model
+            entries.append(entry)
+        return entries
+
     def update(self) -> Tuple[str, Optional[List]]:
         """Update from external source and return filtered entries."""
         return self._update_internal(lambda entries: self._filter_entries(entries))
@@ -87,17 +156,66 @@ class GeoJsonFeed:
         return self._update_internal(
             lambda entries: self._filter_entries_override(
                 entries, filter_overrides=filter_overrides
-            )
+            ),
+            filter_overrides=filter_overrides,
+        )
+
+    def reevaluate(
+        self, home_coordinates=None, filter_overrides: Dict = None
+    ) -> Tuple[str, Optional[List]]:
+        """Return filtered entries of the last fetched feed without fetching it
+        again, optionally for new home coordinates and filter overrides.
+
+        Requires `keep_last_data`, otherwise the feed is only filtered again
+        on the next update.
+        """
+        if home_coordinates is not None:
+            self._home_coordinates = home_coordinates
+        if self._last_data is None:
+            # Nothing has been fetched since the last error, or the last data
+            # is not kept. The next update has to filter all entries again.
+            self._forget_versions()
+            return UPDATE_OK_NO_DATA, None
+        self._requested_filter_overrides = filter_overrides or None
+        return UPDATE_OK, self._filter_feed(
+            self._last_data,
+            lambda entries: self._filter_entries_override(
+                entries, filter_overrides=filter_overrides
+            ),
         )
 
+    def invalidate(self):
+        """Forget the last response, so that the next update returns all
+        entries even if the external source has not changed."""
+        self._forget_versions()
+        self._last_data = None
+
+    def _forget_versions(self):
+        """Forget the version of the last response, so that the next update
+        returns all entries even if the external source has not changed."""
+        self._last_cached_version = None
+        self._last_fingerprint = None
+
     def _fetch(self):
         """Fetch GeoJSON data from external source."""
+        self._last_fetch_status = FetchStatus()
+        if self._local_source:
+            return self._fetch_local()
+        import requests  # pylint: disable=import-outside-toplevel
+
         try:
-            with requests.Session() as session:
-                response = session.send(self._request, timeout=10)
+            response = self._fetch_response()
+            if response is None:
+                # The cached response has not changed since the last update.
+                return UPDATE_OK_NO_DATA, None
             if response.ok:
-                feature_collection = geojson.loads(response.text)
-                return UPDATE_OK, feature_collection
+                if self._skip_unchanged:
+                    fingerprint = self._fingerprint(response.content)
+                    if fingerprint == self._last_fingerprint and self._same_filters():
+                        # Same body as last time, no need to decode it again.
+                        return UPDATE_OK_NO_DATA, None
+                    self._last_fingerprint = fingerprint
+                return UPDATE_OK, self._decode(response.text)
             else:
                 _LOGGER.warning(
                     "Fetching data from %s failed with status %s",
@@ -116,6 +234,91 @@ class GeoJsonFeed:
             )
             return UPDATE_ERROR, None
 
+    def _decode(self, text: str):
+        """Decode the GeoJSON response body."""
+        import geojson  # pylint: disable=import-outside-toplevel
+
+        return geojson.loads(text)
+
+    def _fetch_local(self):
+        """Read GeoJSON data from a local file."""
+        try:
+            if self._skip_unchanged:
+                version = self._local_source.version()
+                if version == self._last_fingerprint and self._same_filters():
+                    # Same file as last time, no need to read it again.
+                    return UPDATE_OK_NO_DATA, None
+                self._last_fingerprint = version
+            if self._keep_last_data:
+                # The kept features are filtered again without reading the
+                # file, which may have changed since.
+                return UPDATE_OK, self._local_source.read()
+            return UPDATE_OK, self._local_source.stream()
+        except OSError as os_ex:
+            _LOGGER.warning("Reading data from %s failed with %s", self._url, os_ex)
+            return UPDATE_ERROR, None
+        except ValueError as decode_ex:
+            _LOGGER.warning("Unable to parse JSON from %s: %s", self._url, decode_ex)
+            return UPDATE_ERROR, None
+        except ValueError as decode_ex:
+            _LOGGER.warning("Unable to parse JSON from %s: %s", self._url, decode_ex)
+            return UPDATE_ERROR, None
+
+    def _fetch_response(self):
+        """Fetch the response from the cache or the external source.
+
+        Returns None if the response is served from the cache and has not
+        changed since the last update.
+        """
+        if self._http_cache is None:
+            return self._fetch_policy.execute(
+                self._send_request, self._last_fetch_status
+            )
+        cached = self._http_cache.get(self._url)
+        if cached and cached.is_fresh():
+            self._last_fetch_status.cache_status = CACHE_HIT
+            response = cached
+        else:
+            request = self._request
+            if cached:
+                request = request.copy()
+                request.headers.update(cached.validators())
+            response = self._fetch_policy.execute(
+                lambda timeout: self._send_request(timeout, request),
+                self._last_fetch_status,
+            )
+            if cached and response.status_code == 304:
+                self._last_fetch_status.cache_status = CACHE_REVALIDATED
+                response = self._http_cache.revalidate(cached, response)
+            elif response.ok:
+                self._last_fetch_status.cache_status = CACHE_MISS
+                cached = self._http_cache.store(self._url, response)
+                if not cached:
+                    self._last_cached_version = None
+                    return response
+                response = cached
+            else:
+                return response
+        self._last_fetch_status.expires_at = response.expires_at
+        if response.version == self._last_cached_version and self._same_filters():
+            return None
+        self._last_cached_version = response.version
+        return response
+
+    def _fingerprint(self, content: bytes):
+        """Return a value that changes whenever the response body changes."""
+        import hashlib  # pylint: disable=import-outside-toplevel
+
+        return hashlib.blake2b(content, digest_size=16).digest()
+
+    def _same_filters(self) -> bool:
+        """Return True if the last update applied the requested filters."""
+        return self._requested_filter_overrides == self._applied_filter_overrides
+
+    def _send_request(self, timeout, request=None):
+        """Send the request to the external source."""
+        return self._transport.send(request or self._request, timeout)
+
     def _filter_entries(self, entries):
         """Filter the provided entries."""
         return self._filter_entries_override(entries, None)
@@ -134,12 +337,7 @@ class GeoJsonFeed:
             else self._filter_radius
         )
         if filter_radius:
-            filtered_entries = list(
-                filter(
-                    lambda entry: entry.distance_to_home <= filter_radius,
-                    filtered_entries,
-                )
-            )
+            filtered_entries = FeedEntry.within_radius(filtered_entries, filter_radius)
         return filtered_entries
 
     def _extract_from_feed(self, feed):
@@ -150,11 +348,30 @@ class GeoJsonFeed:
         """Determine latest (newest) entry from the filtered feed."""
         return None
 
+    def _extract_generated(self, feed) -> Optional[datetime]:
+        """Determine when the external source generated the feed."""
+        return None
+
+    @property
+    def home_coordinates(self):
+        """Return the home coordinates of this feed."""
+        return self._home_coordinates
+
     @property
     def last_timestamp(self) -> Optional[datetime]:
         """Return the last timestamp extracted from this feed."""
         return self._last_timestamp
 
+    @property
+    def last_generated(self) -> Optional[datetime]:
+        """Return when the external source generated the last fetched feed."""
+        return self._last_generated
+
+    @property
+    def last_fetch_status(self) -> Optional[FetchStatus]:
+        """Return details about the most recent attempt to fetch this feed."""
+        return self._last_fetch_status
+
 
 class FeedEntry:
     """Feed entry base class."""
@@ -163,11 +380,18 @@ class FeedEntry:
         """Initialise this feed entry."""
         self._home_coordinates = home_coordinates
         self._feature = feature
+        self._distance_model = DISTANCE_HAVERSINE
+        self._distance_to_home = None
 
     def __repr__(self):
         """Return string representation of this entry."""
         return "<{}(id={})>".format(self.__class__.__name__, self.external_id)
 
+    @property
+    def feature(self):
+        """Return the GeoJSON feature of this entry."""
+        return self._feature
+
     @property
     def geometry(self):
         """Return all geometry details of this entry."""
@@ -192,17 +416,86 @@ class FeedEntry:
         """Return the external id of this entry."""
         return None
 
+    @property
+    def external_id_from_coordinates(self) -> bool:
+        """Return True if the external id was derived from the coordinates,
+        and changes if the entry moves."""
+        return False
+
     @property
     def attribution(self) -> Optional[str]:
         """Return the attribution of this entry."""
         return None
 
+    @property
+    def distance_model(self) -> str:
+        """Return the name of the model for distances of this entry."""
+        return self._distance_model
+
+    @distance_model.setter
+    def distance_model(self, distance_model: str):
+        """Set the name of the model for distances of this entry."""
+        if distance_model != self._distance_model:
+            self._distance_model = distance_model
+            self._distance_to_home = None
+
     @property
     def distance_to_home(self):
         """Return the distance in km of this entry to the home coordinates."""
-        return GeoJsonDistanceHelper.distance_to_geometry(
-            self._home_coordinates, self.geometry
-        )
+        if self._distance_to_home is None:
+            self._distance_to_home = GeoJsonDistanceHelper.distance_to_geometry(
+                self._home_coordinates, self.geometry, model=self._distance_model
+            )
+        return self._distance_to_home
+
+    def is_within(self, radius: float) -> bool:
+        """Return True if this entry is at most radius km away from home.
+
+        Entries that are certainly further away are ruled out without
+        calculating their exact distance.
+        """
+        if self._distance_to_home is None:
+            distance = GeoJsonDistanceHelper.distance_to_geometry(
+                self._home_coordinates,
+                self.geometry,
+                max_distance=radius,
+                model=self._distance_model,
+            )
+            if distance > radius:
+                return False
+            self._distance_to_home = distance
+        return self._distance_to_home <= radius
+
+    @staticmethod
+    def within_radius(entries: List["FeedEntry"], radius: float) -> List["FeedEntry"]:
+        """Return the entries that are at most radius km away from home.
+
+        The distances of all entries sharing the same home coordinates and
+        distance model are calculated at once, grouped by geometry type.
+        """
+        groups = {}
+        for entry in entries:
+            if entry._distance_to_home is None:
+                groups.setdefault(
+                    (tuple(entry._home_coordinates), entry._distance_model), []
+                ).append(entry)
+        for (home_coordinates, distance_model), group in groups.items():
+            distances = GeoJsonDistanceHelper.distances_to_geometries(
+                home_coordinates,
+                [entry.geometry for entry in group],
+                max_distance=radius,
+                model=distance_model,
+            )
+            for entry, distance in zip(group, distances):
+                if distance <= radius:
+                    # Only exact distances are kept.
+                    entry._distance_to_home = distance
+        # Entries without a distance now are further away than the radius.
+        return [
+            entry
+            for entry in entries
+            if entry._distance_to_home is not None and entry._distance_to_home <= radius
+        ]
 
     def _search_in_feature(self, name):
         """Find an attribute in the feature object."""
@@ -231,90 +524,37 @@ class GeoJsonDistanceHelper:
     @staticmethod
     def extract_coordinates(geometry):
         """Extract the best coordinates from the feature for display."""
-        latitude = longitude = None
-        if isinstance(geometry, Point):
-            # Just extract latitude and longitude directly.
-            latitude, longitude = geometry.coordinates[1], geometry.coordinates[0]
-        elif isinstance(geometry, GeometryCollection):
-            # Go through the collection, and extract the first suitable
-            # geometry.
-            for entry in geometry.geometries:
-                latitude, longitude = GeoJsonDistanceHelper.extract_coordinates(entry)
-                if latitude is not None and longitude is not None:
-                    break
-        elif isinstance(geometry, Polygon):
-            # Find the polygon's centroid as a best approximation for the map.
-            longitudes_list = [point[0] for point in geometry.coordinates[0]]
-            latitudes_list = [point[1] for point in geometry.coordinates[0]]
-            number_of_points = len(geometry.coordinates[0])
-            longitude = sum(longitudes_list) / number_of_points
-            latitude = sum(latitudes_list) / number_of_points
-            _LOGGER.debug(
-                "Centroid of %s is %s", geometry.coordinates[0], (latitude, longitude)
-            )
-        else:
-            _LOGGER.debug("Not implemented: %s", type(geometry))
-        return latitude, longitude
+        coordinates = geometry_engine.centroid(geometry)
+        if coordinates is None:
+            return None, None
+        return coordinates
 
     @staticmethod
-    def distance_to_geometry(home_coordinates, geometry):
-        """Calculate the distance between home coordinates and geometry."""
-        distance = float("inf")
-        if isinstance(geometry, Point):
-            distance = GeoJsonDistanceHelper._distance_to_point(
-                home_coordinates, geometry
-            )
-        elif isinstance(geometry, GeometryCollection):
-            distance = GeoJsonDistanceHelper._distance_to_geometry_collection(
-                home_coordinates, geometry
-            )
-        elif isinstance(geometry, Polygon):
-            distance = GeoJsonDistanceHelper._distance_to_polygon(
-                home_coordinates, geometry.coordinates[0]
-            )
-        else:
-            _LOGGER.debug("Not implemented: %s", type(geometry))
-        return distance
+    def distance_to_geometry(
+        home_coordinates, geometry, max_distance=None, model=DISTANCE_HAVERSINE
+    ):
+        """Calculate the distance between home coordinates and geometry.
 
-    @staticmethod
-    def _distance_to_point(home_coordinates, point):
-        """Calculate the distance between home coordinates and the point."""
-        # Swap coordinates to match: (latitude, longitude).
-        return GeoJsonDistanceHelper._distance_to_coordinates(
-            home_coordinates, (point.coordinates[1], point.coordinates[0])
-        )
-
-    @staticmethod
-    def _distance_to_geometry_collection(home_coordinates, geometry_collection):
-        """Calculate the distance between home coordinates and the geometry
-        collection."""
-        distance = float("inf")
-        for geometry in geometry_collection.geometries:
-            distance = min(
-                distance,
-                GeoJsonDistanceHelper.distance_to_geometry(home_coordinates, geometry),
-            )
-        return distance
+        If the geometry is certainly further away than `max_distance`, a lower
+        bound greater than `max_distance` may be returned instead.
+        """
+        return geometry_engine.distance(home_coordinates, geometry, max_distance, model)
 
     @staticmethod
-    def _distance_to_polygon(home_coordinates, polygon):
-        """Calculate the distance between home coordinates and the polygon."""
-        distance = float("inf")
-        # Calculate distance from polygon by calculating the distance
-        # to each point of the polygon but not to each edge of the
-        # polygon; should be good enough
-        for polygon_point in polygon:
-            distance = min(
-                distance,
-                GeoJsonDistanceHelper._distance_to_coordinates(
-                    home_coordinates, (polygon_point[1], polygon_point[0])
-                ),
-            )
-        return distance
+    def distances_to_geometries(
+        home_coordinates, geometries, max_distance=None, model=DISTANCE_HAVERSINE
+    ):
+        """Calculate the distances between home coordinates and geometries of
+        any types at once."""
+        return geometry_engine.distances(
+            home_coordinates, geometries, max_distance, model
+        )
 
     @staticmethod
     def _distance_to_coordinates(home_coordinates, coordinates):
         """Calculate the distance between home coordinates and the
         coordinates."""
+        from haversine import haversine  # pylint: disable=import-outside-toplevel
+
         # Expecting coordinates in format: (latitude, longitude).
         return haversine(coordinates, home_coordinates)
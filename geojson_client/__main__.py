@@ -0,0 +1,10 @@
+"""
+Command line interface.
+
+Run with python -m geojson_client.
+"""
+import sys
+
+from geojson_client.cli import main
+
+sys.exit(main())
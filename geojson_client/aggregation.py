@@ -0,0 +1,377 @@
+"""
+Grid aggregation.
+
+Per-cell statistics of a feed manager's entries at several resolutions,
+kept up to date incrementally from its change events, for example to render
+map layers.
+"""
+import logging
+import math
+import threading
+from queue import Empty
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from geojson_client.events import BACKPRESSURE_COALESCE, EVENT_REMOVED
+from geojson_client.feed_manager import FeedManagerBase
+
+_LOGGER = logging.getLogger(__name__)
+
+SCHEME_TILE = "tile"
+SCHEME_GEOHASH = "geohash"
+
+DEFAULT_RESOLUTIONS = (3, 6, 9)
+DEFAULT_MAX_PENDING = 100000
+
+_MAX_LATITUDE = 85.0511287798
+_GEOHASH_ALPHABET = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+
+def tile_cell(latitude: float, longitude: float, zoom: int) -> Tuple[int, int, int]:
+    """Return the web map tile (zoom, x, y) containing the coordinates."""
+    latitude = max(-_MAX_LATITUDE, min(_MAX_LATITUDE, latitude))
+    tiles = 1 << zoom
+    x = int((longitude + 180.0) / 360.0 * tiles)
+    sin_latitude = math.sin(math.radians(latitude))
+    y = int(
+        (0.5 - math.log((1 + sin_latitude) / (1 - sin_latitude)) / (4 * math.pi))
+        * tiles
+    )
+    return zoom, min(max(x, 0), tiles - 1), min(max(y, 0), tiles - 1)
+
+
+def geohash_cell(latitude: float, longitude: float, precision: int) -> str:
+    """Return the geohash of the given precision containing the coordinates."""
+    latitude_range = [-90.0, 90.0]
+    longitude_range = [-180.0, 180.0]
+    characters = []
+    bits = 0
+    value = 0
+    even = True
+    while len(characters) < precision:
+        interval, coordinate = (
+            (longitude_range, longitude) if even else (latitude_range, latitude)
+        )
+        middle = (interval[0] + interval[1]) / 2
+        value <<= 1
+        if coordinate >= middle:
+            value |= 1
+            interval[0] = middle
+        else:
+            interval[1] = middle
+        even = not even
+        bits += 1
+        if bits == 5:
+            characters.append(_GEOHASH_ALPHABET[value])
+            bits = 0
+            value = 0
+    return "".join(characters)
+
+
+def default_value(entry) -> Optional[float]:
+    """Return the magnitude of an entry, if it has one."""
+    return getattr(entry, "magnitude", None)
+
+
+def default_timestamp(entry):
+    """Return the time of an entry, if it has one."""
+    timestamp = getattr(entry, "time", None)
+    if timestamp is None:
+        timestamp = getattr(entry, "timestamp", None)
+    return timestamp
+
+
+class CellStatistics:
+    """Statistics of the entries in one grid cell.
+
+    The maximum value and latest time are cached, and only recomputed from
+    the cell's entries after the entry holding them was removed.
+    """
+
+    __slots__ = ("key", "_members", "_max_value", "_latest", "_dirty")
+
+    def __init__(self, key):
+        """Initialise this cell."""
+        self.key = key
+        self._members = {}
+        self._max_value = None
+        self._latest = None
+        self._dirty = False
+
+    def __repr__(self):
+        """Return string representation of this cell."""
+        return "<{}(key={}, count={}, max_value={}, latest={})>".format(
+            self.__class__.__name__,
+            self.key,
+            self.count,
+            self.max_value,
+            self.latest,
+        )
+
+    @property
+    def count(self) -> int:
+        """Return the number of entries in this cell."""
+        return len(self._members)
+
+    @property
+    def max_value(self) -> Optional[float]:
+        """Return the highest value of the entries in this cell."""
+        self._recompute()
+        return self._max_value
+
+    @property
+    def latest(self):
+        """Return the most recent time of the entries in this cell."""
+        self._recompute()
+        return self._latest
+
+    def add(self, external_id, value, timestamp):
+        """Add an entry to this cell."""
+        self._members[external_id] = (value, timestamp)
+        if self._dirty:
+            return
+        if value is not None and (self._max_value is None or value > self._max_value):
+            self._max_value = value
+        if timestamp is not None and (self._latest is None or timestamp > self._latest):
+            self._latest = timestamp
+
+    def remove(self, external_id):
+        """Remove an entry from this cell."""
+        value, timestamp = self._members.pop(external_id)
+        if (value is not None and value == self._max_value) or (
+            timestamp is not None and timestamp == self._latest
+        ):
+            self._dirty = True
+
+    def as_dict(self) -> Dict:
+        """Return the statistics of this cell."""
+        return {
+            "key": self.key,
+            "count": self.count,
+            "max_value": self.max_value,
+            "latest": self.latest,
+        }
+
+    def _recompute(self):
+        """Recompute the cached statistics after a removal."""
+        if not self._dirty:
+            return
+        values = [value for value, _ in self._members.values() if value is not None]
+        timestamps = [
+            timestamp
+            for _, timestamp in self._members.values()
+            if timestamp is not None
+        ]
+        self._max_value = max(values) if values else None
+        self._latest = max(timestamps) if timestamps else None
+        self._dirty = False
+
+
+class GridAggregator:
+    """Per-cell statistics of a feed manager's entries.
+
+    The aggregator subscribes to the feed manager's change events with a
+    coalescing subscription, and applies pending events whenever it is
+    read, so reading costs the number of changed entries plus the number
+    of cells returned. Resolutions are zoom levels of web map tiles, or
+    geohash precisions. If events were dropped, the statistics are rebuilt
+    from the manager's latest snapshot.
+    """
+
+    def __init__(
+        self,
+        feed_manager: FeedManagerBase,
+        resolutions: Iterable[int] = DEFAULT_RESOLUTIONS,
+        scheme: str = SCHEME_TILE,
+        value: Callable = default_value,
+        timestamp: Callable = default_timestamp,
+        max_pending: int = DEFAULT_MAX_PENDING,
+    ):
+        """Initialise this aggregator."""
+        if scheme not in (SCHEME_TILE, SCHEME_GEOHASH):
+            raise ValueError(
+                "Scheme must be one of %s" % ((SCHEME_TILE, SCHEME_GEOHASH),)
+            )
+        self._feed_manager = feed_manager
+        self._resolutions = tuple(resolutions)
+        self._cell = tile_cell if scheme == SCHEME_TILE else geohash_cell
+        self._scheme = scheme
+        self._value = value
+        self._timestamp = timestamp
+        self._grids = {}
+        self._contributions = {}
+        self._dropped = 0
+        self._lock = threading.RLock()
+        # Subscribe first, so no change is missed while building.
+        self._subscription = feed_manager.subscribe(
+            max_size=max_pending, backpressure=BACKPRESSURE_COALESCE
+        )
+        self._rebuild()
+
+    def __repr__(self):
+        """Return string representation of this aggregator."""
+        return "<{}(scheme={}, resolutions={}, entries={})>".format(
+            self.__class__.__name__,
+            self._scheme,
+            list(self._resolutions),
+            len(self._contributions),
+        )
+
+    @property
+    def resolutions(self) -> Tuple[int, ...]:
+        """Return the resolutions of this aggregator."""
+        return self._resolutions
+
+    def refresh(self):
+        """Apply all pending change events."""
+        subscription = self._subscription
+        with self._lock:
+            while True:
+                try:
+                    event = subscription.get(0)
+                except Empty:
+                    break
+                if event.event_type == EVENT_REMOVED:
+                    self._remove(event.external_id)
+                else:
+                    self._replace(event.external_id, event.entry)
+            if subscription.dropped != self._dropped:
+                _LOGGER.debug("Rebuilding %s after dropped events", self)
+                self._dropped = subscription.dropped
+                self._rebuild()
+
+    def cells(
+        self,
+        resolution: int,
+        bounds: Optional[Tuple[float, float, float, float]] = None,
+    ) -> List[CellStatistics]:
+        """Return the non-empty cells at the resolution, optionally only those
+        intersecting the bounds given as (south, west, north, east)."""
+        with self._lock:
+            self.refresh()
+            return self._cells(self._grids[resolution], resolution, bounds)
+
+    def _cells(self, grid: Dict, resolution: int, bounds) -> List[CellStatistics]:
+        """Return the cells of the grid intersecting the bounds."""
+        if bounds is None:
+            return list(grid.values())
+        south, west, north, east = bounds
+        if self._cell is tile_cell and west <= east:
+            _, min_x, min_y = tile_cell(north, west, resolution)
+            _, max_x, max_y = tile_cell(south, east, resolution)
+            if (max_x - min_x + 1) * (max_y - min_y + 1) < len(grid):
+                # Look up the tiles in view.
+                cells = []
+                for x in range(min_x, max_x + 1):
+                    for y in range(min_y, max_y + 1):
+                        cell = grid.get((resolution, x, y))
+                        if cell is not None:
+                            cells.append(cell)
+                return cells
+        return [
+            cell
+            for cell in grid.values()
+            if self._intersects(cell.key, resolution, bounds)
+        ]
+
+    def cell(self, resolution: int, key) -> Optional[CellStatistics]:
+        """Return the cell with the key at the resolution, if not empty."""
+        with self._lock:
+            self.refresh()
+            return self._grids[resolution].get(key)
+
+    def close(self):
+        """Stop following the feed manager's changes."""
+        self._feed_manager.unsubscribe(self._subscription)
+
+    def _rebuild(self):
+        """Rebuild all statistics from the latest snapshot."""
+        self._grids = {resolution: {} for resolution in self._resolutions}
+        self._contributions = {}
+        for external_id, entry in self._feed_manager.snapshot.feed_entries.items():
+            self._add(external_id, entry)
+
+    def _replace(self, external_id, entry):
+        """Replace the contribution of an entry, unless its coordinates,
+        value and time are unchanged."""
+        contribution = self._contributions.get(external_id)
+        if contribution is not None and contribution[1:] == (
+            entry.coordinates,
+            self._value(entry),
+            self._timestamp(entry),
+        ):
+            # Most updated entries have not changed at all.
+            return
+        self._remove(external_id)
+        self._add(external_id, entry)
+
+    def _add(self, external_id, entry):
+        """Add an entry to its cells."""
+        coordinates = entry.coordinates
+        if coordinates is None:
+            return
+        latitude, longitude = coordinates
+        value = self._value(entry)
+        timestamp = self._timestamp(entry)
+        keys = []
+        for resolution in self._resolutions:
+            key = self._cell(latitude, longitude, resolution)
+            grid = self._grids[resolution]
+            cell = grid.get(key)
+            if cell is None:
+                cell = grid[key] = CellStatistics(key)
+            cell.add(external_id, value, timestamp)
+            keys.append(key)
+        self._contributions[external_id] = (keys, coordinates, value, timestamp)
+
+    def _remove(self, external_id):
+        """Remove an entry from its cells."""
+        contribution = self._contributions.pop(external_id, None)
+        if contribution is None:
+            return
+        for resolution, key in zip(self._resolutions, contribution[0]):
+            grid = self._grids[resolution]
+            cell = grid[key]
+            cell.remove(external_id)
+            if not cell.count:
+                del grid[key]
+
+    def _intersects(self, key, resolution: int, bounds) -> bool:
+        """Return True if the cell intersects the bounds."""
+        south, west, north, east = bounds
+        if self._cell is tile_cell:
+            _, x, y = key
+            tiles = 1 << resolution
+            cell_west = x / tiles * 360.0 - 180.0
+            cell_east = (x + 1) / tiles * 360.0 - 180.0
+            cell_north = math.degrees(
+                math.atan(math.sinh(math.pi * (1 - 2 * y / tiles)))
+            )
+            cell_south = math.degrees(
+                math.atan(math.sinh(math.pi * (1 - 2 * (y + 1) / tiles)))
+            )
+        else:
+            cell_south, cell_west, cell_north, cell_east = _geohash_bounds(key)
+        if cell_north < south or cell_south > north:
+            return False
+        if west <= east:
+            return cell_east >= west and cell_west <= east
+        # The bounds cross the antimeridian.
+        return cell_east >= west or cell_west <= east
+
+
+def _geohash_bounds(geohash: str) -> Tuple[float, float, float, float]:
+    """Return the bounds of a geohash as (south, west, north, east)."""
+    latitude_range = [-90.0, 90.0]
+    longitude_range = [-180.0, 180.0]
+    even = True
+    for character in geohash:
+        value = _GEOHASH_ALPHABET.index(character)
+        for bit in range(4, -1, -1):
+            interval = longitude_range if even else latitude_range
+            middle = (interval[0] + interval[1]) / 2
+            if value >> bit & 1:
+                interval[0] = middle
+            else:
+                interval[1] = middle
+            even = not even
+    return latitude_range[0], longitude_range[0], latitude_range[1], longitude_range[1]
@@ -0,0 +1,411 @@
+"""
+Command line interface.
+
+Poll feeds and stream their entries, or the changes between updates, as
+newline-delimited JSON or columnar batches.
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+from geojson_client import UPDATE_OK, GeoJsonFeed
+from geojson_client.events import EVENT_CREATED, EVENT_REMOVED, EVENT_UPDATED
+from geojson_client.exceptions import GeoJsonException
+from geojson_client.feed_manager import FeedManagerBase
+from geojson_client.generic_feed import GenericFeed
+from geojson_client.local_source import local_path
+from geojson_client.usgs_earthquake_hazards_program_feed import (
+    URLS,
+    UsgsEarthquakeHazardsProgramFeed,
+)
+
+_LOGGER = logging.getLogger(__name__)
+
+MODE_ENTRIES = "entries"
+MODE_DIFF = "diff"
+
+EVENT_ENTRY = "entry"
+
+URL_SCHEMES = ("http", "https")
+
+FORMAT_NDJSON = "ndjson"
+FORMAT_ARROW = "arrow"
+FORMAT_PARQUET = "parquet"
+
+DEFAULT_BUFFER_SIZE = 1 << 16
+DEFAULT_BATCH_SIZE = 10000
+
+COLUMNS = (
+    "feed",
+    "event",
+    "external_id",
+    "title",
+    "latitude",
+    "longitude",
+    "distance",
+    "properties",
+)
+
+
+class NdjsonWriter:
+    """Write records as newline-delimited JSON with buffered bulk writes.
+
+    Features are serialised straight from the decoded response, which
+    already consists of plain dictionaries and lists.
+    """
+
+    def __init__(self, stream, buffer_size: int = DEFAULT_BUFFER_SIZE):
+        """Initialise this writer."""
+        self._stream = stream
+        self._buffer_size = buffer_size
+        self._buffer = []
+        self._buffered = 0
+        self._encode = json.JSONEncoder(
+            separators=(",", ":"), ensure_ascii=False, default=str
+        ).encode
+
+    def __repr__(self):
+        """Return string representation of this writer."""
+        return "<{}(buffered={})>".format(self.__class__.__name__, self._buffered)
+
+    def write(self, feed: str, event: str, external_id, entry=None):
+        """Buffer a record."""
+        record = {"feed": feed, "event": event, "id": external_id}
+        if entry is not None:
+            record["distance"] = entry.distance_to_home
+            record["feature"] = entry.feature
+        line = self._encode(record)
+        self._buffer.append(line)
+        self._buffered += len(line) + 1
+        if self._buffered >= self._buffer_size:
+            self.flush()
+
+    def flush(self):
+        """Write all buffered records."""
+        if self._buffer:
+            self._buffer.append("")
+            self._stream.write("\n".join(self._buffer))
+            self._buffer = []
+            self._buffered = 0
+        self._stream.flush()
+
+    def close(self):
+        """Write all buffered records."""
+        self.flush()
+
+
+class ColumnarWriter:
+    """Write records in batches to an Arrow IPC or Parquet file.
+
+    Requires pyarrow. Properties are stored as JSON text, all other
+    columns are typed.
+    """
+
+    def __init__(
+        self, path: str, file_format: str, batch_size: int = DEFAULT_BATCH_SIZE
+    ):
+        """Initialise this writer."""
+        try:
+            import pyarrow  # pylint: disable=import-outside-toplevel
+        except ImportError as error:
+            raise GeoJsonException(
+                "Writing %s requires pyarrow to be installed" % file_format
+            ) from error
+        self._pyarrow = pyarrow
+        self._schema = pyarrow.schema(
+            [
+                ("feed", pyarrow.string()),
+                ("event", pyarrow.string()),
+                ("external_id", pyarrow.string()),
+                ("title", pyarrow.string()),
+                ("latitude", pyarrow.float64()),
+                ("longitude", pyarrow.float64()),
+                ("distance", pyarrow.float64()),
+                ("properties", pyarrow.string()),
+            ]
+        )
+        if file_format == FORMAT_PARQUET:
+            import pyarrow.parquet  # pylint: disable=import-outside-toplevel
+
+            self._writer = pyarrow.parquet.ParquetWriter(path, self._schema)
+        else:
+            import pyarrow.ipc  # pylint: disable=import-outside-toplevel
+
+            self._writer = pyarrow.ipc.new_file(path, self._schema)
+        self._batch_size = batch_size
+        self._columns = {name: [] for name in COLUMNS}
+        self._encode = json.JSONEncoder(
+            separators=(",", ":"), ensure_ascii=False, default=str
+        ).encode
+
+    def __repr__(self):
+        """Return string representation of this writer."""
+        return "<{}(buffered={})>".format(
+            self.__class__.__name__, len(self._columns["feed"])
+        )
+
+    def write(self, feed: str, event: str, external_id, entry=None):
+        """Buffer a record."""
+        columns = self._columns
+        columns["feed"].append(feed)
+        columns["event"].append(event)
+        columns["external_id"].append(str(external_id))
+        if entry is not None:
+            latitude, longitude = entry.coordinates
+            properties = entry.feature.get("properties")
+            columns["title"].append(entry.title)
+            columns["latitude"].append(latitude)
+            columns["longitude"].append(longitude)
+            columns["distance"].append(entry.distance_to_home)
+            columns["properties"].append(
+                self._encode(properties) if properties is not None else None
+            )
+        else:
+            for name in ("title", "latitude", "longitude", "distance", "properties"):
+                columns[name].append(None)
+        if len(columns["feed"]) >= self._batch_size:
+            self.flush()
+
+    def flush(self):
+        """Write all buffered records as one batch."""
+        if self._columns["feed"]:
+            batch = self._pyarrow.RecordBatch.from_arrays(
+                [
+                    self._pyarrow.array(self._columns[name], type=field.type)
+                    for name, field in zip(COLUMNS, self._schema)
+                ],
+                schema=self._schema,
+            )
+            if hasattr(self._writer, "write_batch"):
+                self._writer.write_batch(batch)
+            else:
+                self._writer.write_table(self._pyarrow.Table.from_batches([batch]))
+            self._columns = {name: [] for name in COLUMNS}
+
+    def close(self):
+        """Write all buffered records and close the file."""
+        self.flush()
+        self._writer.close()
+
+
+def parse_coordinates(value: str) -> Tuple[float, float]:
+    """Parse coordinates given as latitude,longitude."""
+    try:
+        latitude, longitude = (float(part) for part in value.split(","))
+    except ValueError as error:
+        raise argparse.ArgumentTypeError(
+            "expected latitude,longitude, got %r" % value
+        ) from error
+    return latitude, longitude
+
+
+def create_feed(
+    source: str,
+    home_coordinates: Tuple[float, float],
+    filter_radius: Optional[float] = None,
+    filter_minimum_magnitude: Optional[float] = None,
+    skip_unchanged: bool = False,
+) -> GeoJsonFeed:
+    """Return the USGS feed of the given type, or a generic feed for a URL
+    or path.
+
+    Raises GeoJsonException if the source is neither a USGS feed type, an
+    HTTP URL nor an existing file.
+    """
+    if source in URLS:
+        return UsgsEarthquakeHazardsProgramFeed(
+            home_coordinates,
+            source,
+            filter_radius=filter_radius,
+            filter_minimum_magnitude=filter_minimum_magnitude,
+            skip_unchanged=skip_unchanged,
+        )
+    if os.path.exists(source):
+        # Local files need an absolute path.
+        source = os.path.abspath(source)
+    elif urlparse(source).scheme not in URL_SCHEMES:
+        path = local_path(source)
+        if path is None:
+            raise GeoJsonException(
+                "%s is neither a USGS feed type, a URL nor an existing file" % source
+            )
+        if not os.path.exists(path):
+            raise GeoJsonException("%s does not exist" % path)
+    return GenericFeed(
+        home_coordinates,
+        source,
+        filter_radius=filter_radius,
+        skip_unchanged=skip_unchanged,
+    )
+
+
+class _DiffRecorder:
+    """Write the changes of a feed manager as records."""
+
+    def __init__(self, name: str, writer):
+        """Initialise this recorder."""
+        self._name = name
+        self._writer = writer
+        self.feed_manager = None
+
+    def created(self, external_id):
+        """Write a new entry."""
+        self._writer.write(
+            self._name,
+            EVENT_CREATED,
+            external_id,
+            self.feed_manager.feed_entries[external_id],
+        )
+
+    def updated(self, external_id):
+        """Write an updated entry."""
+        self._writer.write(
+            self._name,
+            EVENT_UPDATED,
+            external_id,
+            self.feed_manager.feed_entries[external_id],
+        )
+
+    def removed(self, external_id):
+        """Write a removed entry."""
+        self._writer.write(self._name, EVENT_REMOVED, external_id)
+
+
+class Poller:
+    """Poll feeds and write their entries or changes."""
+
+    def __init__(self, feeds: Dict[str, GeoJsonFeed], writer, mode: str = MODE_ENTRIES):
+        """Initialise this poller."""
+        self._writer = writer
+        self._mode = mode
+        self._feeds = feeds
+        self._feed_managers = {}
+        if mode == MODE_DIFF:
+            for name, feed in feeds.items():
+                recorder = _DiffRecorder(name, writer)
+                recorder.feed_manager = FeedManagerBase(
+                    feed, recorder.created, recorder.updated, recorder.removed
+                )
+                self._feed_managers[name] = recorder.feed_manager
+
+    def __repr__(self):
+        """Return string representation of this poller."""
+        return "<{}(feeds={}, mode={})>".format(
+            self.__class__.__name__, list(self._feeds), self._mode
+        )
+
+    def poll(self):
+        """Update all feeds once and write the results."""
+        for name, feed in self._feeds.items():
+            if self._mode == MODE_DIFF:
+                self._feed_managers[name].update()
+                continue
+            status, entries = feed.update()
+            if status == UPDATE_OK:
+                for entry in entries:
+                    self._writer.write(name, EVENT_ENTRY, entry.external_id, entry)
+            else:
+                _LOGGER.info("Update of %s returned %s", name, status)
+        self._writer.flush()
+
+    def run(self, polls: Optional[int] = None, interval: float = 60.0):
+        """Poll the feeds `polls` times, or until interrupted."""
+        count = 0
+        while True:
+            started = time.monotonic()
+            self.poll()
+            count += 1
+            if polls is not None and count >= polls:
+                return
+            time.sleep(max(0.0, interval - (time.monotonic() - started)))
+
+
+def _parser() -> argparse.ArgumentParser:
+    """Return the parser of the command line arguments."""
+    parser = argparse.ArgumentParser(
+        prog="geojson-client",
+        description="Poll GeoJSON feeds and write their entries or changes.",
+    )
+    parser.add_argument(
+        "feeds",
+        nargs="+",
+        metavar="FEED",
+        help="USGS feed type (for example past_day_all_earthquakes), URL or path",
+    )
+    parser.add_argument(
+        "--home",
+        type=parse_coordinates,
+        default=(0.0, 0.0),
+        help="home coordinates as latitude,longitude",
+    )
+    parser.add_argument("--radius", type=float, help="filter radius in km")
+    parser.add_argument(
+        "--minimum-magnitude", type=float, help="minimum magnitude of USGS feeds"
+    )
+    parser.add_argument(
+        "--mode",
+        choices=[MODE_ENTRIES, MODE_DIFF],
+        default=MODE_ENTRIES,
+        help="write all entries of each update, or only the changes",
+    )
+    parser.add_argument(
+        "--format",
+        choices=[FORMAT_NDJSON, FORMAT_ARROW, FORMAT_PARQUET],
+        default=FORMAT_NDJSON,
+    )
+    parser.add_argument(
+        "--output", help="output file, required for arrow and parquet (default: stdout)"
+    )
+    parser.add_argument(
+        "--polls", type=int, default=1, help="number of polls, 0 to poll forever"
+    )
+    parser.add_argument(
+        "--interval", type=float, default=60.0, help="seconds between polls"
+    )
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--skip-unchanged", action="store_true")
+    parser.add_argument("--verbose", action="store_true")
+    return parser
+
+
+def main(args: List[str] = None, stdout=None) -> int:
+    """Run the command line interface."""
+    parser = _parser()
+    options = parser.parse_args(args)
+    logging.basicConfig(level=logging.DEBUG if options.verbose else logging.WARNING)
+    if options.format != FORMAT_NDJSON and not options.output:
+        parser.error("--output is required for %s" % options.format)
+    try:
+        feeds = {
+            source: create_feed(
+                source,
+                options.home,
+                filter_radius=options.radius,
+                filter_minimum_magnitude=options.minimum_magnitude,
+                skip_unchanged=options.skip_unchanged,
+            )
+            for source in options.feeds
+        }
+        output = None
+        if options.format == FORMAT_NDJSON:
+            if options.output:
+                output = open(options.output, "a", encoding="utf-8")
+            writer = NdjsonWriter(output or stdout or sys.stdout)
+        else:
+            writer = ColumnarWriter(options.output, options.format, options.batch_size)
+    except GeoJsonException as error:
+        parser.error(str(error))
+    try:
+        Poller(feeds, writer, options.mode).run(options.polls or None, options.interval)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        writer.close()
+        if output:
+            output.close()
+    return 0
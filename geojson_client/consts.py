@@ -7,7 +7,9 @@ Constants for feeds and feed entries.
 ATTR_ALERT = "alert"
 ATTR_ATTRIBUTION = "attribution"
 ATTR_CATEGORY = "category"
+ATTR_COUNT = "count"
 ATTR_DESCRIPTION = "description"
+ATTR_GENERATED = "generated"
 ATTR_ID = "id"
 ATTR_GUID = "guid"
 ATTR_MAG = "mag"
@@ -22,5 +24,3 @@ ATTR_UPDATED = "updated"
 FILTER_CATEGORIES = "categories"
 FILTER_MINIMUM_MAGNITUDE = "minimum_magnitude"
 FILTER_RADIUS = "radius"
-
-HTTP_ACCEPT_ENCODING_HEADER = {"Accept-Encoding": "deflate, gzip"}
@@ -0,0 +1,159 @@
+"""
+Snapshot deltas.
+
+Compact, serialisable differences between snapshots of a feed manager, so
+that downstream clients can patch their copy of the features instead of
+downloading all of them after every update.
+"""
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from geojson_client.feed_manager import FeedManagerBase, FeedManagerSnapshot
+
+TYPE_DELTA = "delta"
+TYPE_SNAPSHOT = "snapshot"
+
+DEFAULT_HISTORY = 16
+
+
+def _feature(external_id, entry) -> Dict:
+    """Return the external id and GeoJSON feature of an entry."""
+    return {"id": external_id, "feature": entry.feature}
+
+
+def _changes(external_id, previous: Dict, current: Dict) -> Optional[Dict]:
+    """Return the changes between two versions of a feature, if any."""
+    if previous is current or previous == current:
+        return None
+    change = {"id": external_id}
+    previous_properties = previous.get("properties") or {}
+    current_properties = current.get("properties") or {}
+    properties = {
+        key: value
+        for key, value in current_properties.items()
+        if key not in previous_properties or previous_properties[key] != value
+    }
+    if properties:
+        change["properties"] = properties
+    removed_properties = [
+        key for key in previous_properties if key not in current_properties
+    ]
+    if removed_properties:
+        change["removed_properties"] = removed_properties
+    if previous.get("geometry") != current.get("geometry"):
+        change["geometry"] = current.get("geometry")
+    return change
+
+
+def snapshot_delta(previous: FeedManagerSnapshot, current: FeedManagerSnapshot) -> Dict:
+    """Return the delta that turns the features of the previous snapshot into
+    those of the current snapshot.
+
+    Added features are complete, changed features only contain the changed
+    and removed properties and a changed geometry, and removed features are
+    listed by their external id. Added and changed features carry their
+    external id in `id`.
+    """
+    previous_entries = previous.feed_entries
+    current_entries = current.feed_entries
+    added = []
+    changed = []
+    for external_id, entry in current_entries.items():
+        previous_entry = previous_entries.get(external_id)
+        if previous_entry is None:
+            added.append(_feature(external_id, entry))
+        elif previous_entry is not entry:
+            change = _changes(external_id, previous_entry.feature, entry.feature)
+            if change:
+                changed.append(change)
+    return {
+        "type": TYPE_DELTA,
+        "from_generation": previous.generation,
+        "generation": current.generation,
+        "added": added,
+        "changed": changed,
+        "removed": [
+            external_id
+            for external_id in previous_entries
+            if external_id not in current_entries
+        ],
+    }
+
+
+def full_snapshot(snapshot: FeedManagerSnapshot) -> Dict:
+    """Return all features of the snapshot, for clients to resync."""
+    return {
+        "type": TYPE_SNAPSHOT,
+        "generation": snapshot.generation,
+        "features": [
+            _feature(external_id, entry)
+            for external_id, entry in snapshot.feed_entries.items()
+        ],
+    }
+
+
+def apply_delta(features: Dict, delta: Dict) -> Dict:
+    """Apply a delta or full snapshot to features by external id, and return
+    the resulting features.
+
+    The given dictionary is not modified.
+    """
+    if delta["type"] == TYPE_SNAPSHOT:
+        return {added["id"]: added["feature"] for added in delta["features"]}
+    features = dict(features)
+    for removed in delta["removed"]:
+        features.pop(removed, None)
+    for change in delta["changed"]:
+        feature = dict(features[change["id"]])
+        properties = dict(feature.get("properties") or {})
+        properties.update(change.get("properties", {}))
+        for key in change.get("removed_properties", ()):
+            properties.pop(key, None)
+        feature["properties"] = properties
+        if "geometry" in change:
+            feature["geometry"] = change["geometry"]
+        features[change["id"]] = feature
+    for added in delta["added"]:
+        features[added["id"]] = added["feature"]
+    return features
+
+
+class DeltaEncoder:
+    """Produce deltas of a feed manager's snapshots for downstream clients.
+
+    Each client passes the generation it last received. The encoder keeps
+    the last `history` snapshots it handed out, and returns a full snapshot
+    for resync if the client's generation is unknown.
+    """
+
+    def __init__(self, feed_manager: FeedManagerBase, history: int = DEFAULT_HISTORY):
+        """Initialise this encoder."""
+        self._feed_manager = feed_manager
+        self._history = history
+        self._snapshots = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        """Return string representation of this encoder."""
+        return "<{}(generations={})>".format(
+            self.__class__.__name__, list(self._snapshots)
+        )
+
+    def delta(self, since_generation: Optional[int] = None) -> Dict:
+        """Return the delta from the given generation to the current one, or a
+        full snapshot if the generation is not known."""
+        current = self._feed_manager.snapshot
+        with self._lock:
+            previous = self._snapshots.get(since_generation)
+            self._snapshots[current.generation] = current
+            self._snapshots.move_to_end(current.generation)
+            while len(self._snapshots) > self._history:
+                self._snapshots.popitem(last=False)
+        if previous is None:
+            return full_snapshot(current)
+        return snapshot_delta(previous, current)
+
+    def snapshot(self) -> Dict:
+        """Return a full snapshot of the current generation."""
+        return self.delta()
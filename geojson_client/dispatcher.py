@@ -0,0 +1,160 @@
+"""
+Callback dispatchers.
+
+Define how the feed manager runs the callbacks for new, updated and removed
+entities.
+"""
+import logging
+import threading
+from collections import deque
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import TYPE_CHECKING, Callable, Optional
+
+if TYPE_CHECKING:
+    import asyncio
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class CallbackDispatcher:
+    """Run callbacks inline on the thread updating the feed manager."""
+
+    def __repr__(self):
+        """Return string representation of this dispatcher."""
+        return "<{}()>".format(self.__class__.__name__)
+
+    def dispatch(self, external_id, callback: Callable):
+        """Run the callback for the external id."""
+        callback(external_id)
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Wait until all dispatched callbacks have completed."""
+        return True
+
+    def shutdown(self):
+        """Release all resources held by this dispatcher."""
+        pass
+
+
+class _OrderedCallbackDispatcher(CallbackDispatcher):
+    """Base class for dispatchers that keep callbacks ordered per id."""
+
+    def __init__(self):
+        """Initialise this dispatcher."""
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        # Callbacks waiting for an earlier callback with the same external id.
+        self._pending = {}
+        self._outstanding = 0
+
+    def __repr__(self):
+        """Return string representation of this dispatcher."""
+        return "<{}(outstanding={})>".format(self.__class__.__name__, self._outstanding)
+
+    def dispatch(self, external_id, callback: Callable):
+        """Schedule the callback for the external id."""
+        with self._lock:
+            self._outstanding += 1
+            if external_id in self._pending:
+                self._pending[external_id].append(callback)
+                return
+            self._pending[external_id] = deque()
+        self._submit(external_id, callback)
+
+    def _submit(self, external_id, callback: Callable):
+        """Submit the callback for execution."""
+        raise NotImplementedError
+
+    def _complete(self, external_id):
+        """Mark a callback as completed and submit the next one, if any."""
+        with self._lock:
+            self._outstanding -= 1
+            queued = self._pending[external_id]
+            if queued:
+                next_callback = queued.popleft()
+            else:
+                del self._pending[external_id]
+                next_callback = None
+                if not self._outstanding:
+                    self._idle.notify_all()
+        if next_callback:
+            self._submit(external_id, next_callback)
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Wait until all dispatched callbacks have completed."""
+        with self._idle:
+            return self._idle.wait_for(lambda: not self._outstanding, timeout)
+
+
+class ExecutorCallbackDispatcher(_OrderedCallbackDispatcher):
+    """Run callbacks concurrently on an executor.
+
+    Callbacks for different external ids run in parallel, while callbacks
+    for the same external id run one after the other in the order in which
+    they were dispatched.
+    """
+
+    def __init__(self, executor: Executor = None, max_workers: int = None):
+        """Initialise this dispatcher."""
+        super().__init__()
+        self._owns_executor = executor is None
+        self._executor = executor or ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="geojson_client"
+        )
+
+    def _submit(self, external_id, callback: Callable):
+        """Submit the callback to the executor."""
+        self._executor.submit(self._run, external_id, callback)
+
+    def _run(self, external_id, callback: Callable):
+        """Run the callback and then schedule the next one for the same id."""
+        try:
+            callback(external_id)
+        except Exception:  # pylint: disable=broad-except
+            _LOGGER.exception("Callback for %s failed", external_id)
+        self._complete(external_id)
+
+    def shutdown(self):
+        """Shut down the executor if it was created by this dispatcher."""
+        if self._owns_executor:
+            self._executor.shutdown(wait=True)
+
+
+class AsyncioCallbackDispatcher(_OrderedCallbackDispatcher):
+    """Run callbacks on an asyncio event loop.
+
+    Coroutine functions are awaited on the loop, all other callbacks are run
+    in the given executor, or the loop's default executor. Ordering per
+    external id is the same as for the executor dispatcher. When updating
+    the feed manager from within the event loop, the manager must not wait
+    for the callbacks to complete.
+    """
+
+    def __init__(
+        self, loop: "asyncio.AbstractEventLoop", executor: Optional[Executor] = None
+    ):
+        """Initialise this dispatcher."""
+        super().__init__()
+        self._loop = loop
+        self._executor = executor
+
+    def _submit(self, external_id, callback: Callable):
+        """Schedule the callback on the event loop."""
+        import asyncio  # pylint: disable=import-outside-toplevel
+
+        asyncio.run_coroutine_threadsafe(
+            self._run_async(external_id, callback), self._loop
+        )
+
+    async def _run_async(self, external_id, callback: Callable):
+        """Run the callback and then schedule the next one for the same id."""
+        import asyncio  # pylint: disable=import-outside-toplevel
+
+        try:
+            if asyncio.iscoroutinefunction(callback):
+                await callback(external_id)
+            else:
+                await self._loop.run_in_executor(self._executor, callback, external_id)
+        except Exception:  # pylint: disable=broad-except
+            _LOGGER.exception("Callback for %s failed", external_id)
+        self._complete(external_id)
@@ -0,0 +1,272 @@
+"""
+Distance models.
+
+Calculate distances between coordinates with different trade-offs between
+speed and accuracy.
+"""
+import math
+from typing import List, Optional, Sequence, Tuple
+
+EARTH_RADIUS = 6371.0088
+
+# WGS-84 ellipsoid.
+WGS84_SEMI_MAJOR_AXIS = 6378.137
+WGS84_FLATTENING = 1 / 298.257223563
+
+DISTANCE_EQUIRECTANGULAR = "equirectangular"
+DISTANCE_HAVERSINE = "haversine"
+DISTANCE_VINCENTY = "vincenty"
+
+
+def haversine_distance(latitude1, longitude1, latitude2, longitude2) -> float:
+    """Return the great-circle distance in km between two coordinates."""
+    latitude1, longitude1 = math.radians(latitude1), math.radians(longitude1)
+    latitude2, longitude2 = math.radians(latitude2), math.radians(longitude2)
+    d = (
+        math.sin((latitude2 - latitude1) * 0.5) ** 2
+        + math.cos(latitude1)
+        * math.cos(latitude2)
+        * math.sin((longitude2 - longitude1) * 0.5) ** 2
+    )
+    return 2 * EARTH_RADIUS * math.asin(math.sqrt(d))
+
+
+class DistanceModel:
+    """Model for distances in km between coordinates."""
+
+    name = None
+    # Factor for lower bounds of great-circle distances to apply to this model.
+    lower_bound_scale = 1.0
+
+    def __repr__(self):
+        """Return string representation of this model."""
+        return "<{}(name={})>".format(self.__class__.__name__, self.name)
+
+    def estimate(
+        self, latitude1, longitude1, latitude2, longitude2
+    ) -> Tuple[float, float]:
+        """Return the distance and the maximum error of the distance."""
+        raise NotImplementedError
+
+    def distance(
+        self,
+        latitude1,
+        longitude1,
+        latitude2,
+        longitude2,
+        max_distance: Optional[float] = None,
+    ) -> float:
+        """Return the distance between the coordinates.
+
+        If the distance may be on the other side of `max_distance` because of
+        the model's error, the exact great-circle distance is returned instead.
+        """
+        distance, error = self.estimate(latitude1, longitude1, latitude2, longitude2)
+        if error and max_distance is not None and abs(distance - max_distance) <= error:
+            return haversine_distance(latitude1, longitude1, latitude2, longitude2)
+        return distance
+
+    def distances(
+        self,
+        latitude,
+        longitude,
+        positions: Sequence[Sequence[float]],
+        max_distance: Optional[float] = None,
+    ) -> List[float]:
+        """Return the distances between the coordinates and the positions.
+
+        Positions are in GeoJSON order, [longitude, latitude].
+        """
+        return [
+            self.distance(latitude, longitude, position[1], position[0], max_distance)
+            for position in positions
+        ]
+
+
+class HaversineModel(DistanceModel):
+    """Great-circle distance on a sphere with the mean earth radius."""
+
+    name = DISTANCE_HAVERSINE
+
+    def estimate(self, latitude1, longitude1, latitude2, longitude2):
+        """Return the distance and the maximum error of the distance."""
+        return haversine_distance(latitude1, longitude1, latitude2, longitude2), 0.0
+
+    def distance(self, latitude1, longitude1, latitude2, longitude2, max_distance=None):
+        """Return the distance between the coordinates."""
+        return haversine_distance(latitude1, longitude1, latitude2, longitude2)
+
+    def distances(self, latitude, longitude, positions, max_distance=None):
+        """Return the distances between the coordinates and the positions."""
+        latitude = math.radians(latitude)
+        longitude = math.radians(longitude)
+        cos_latitude = math.cos(latitude)
+        radians, sin, cos, asin, sqrt = (
+            math.radians,
+            math.sin,
+            math.cos,
+            math.asin,
+            math.sqrt,
+        )
+        distances = []
+        for position in positions:
+            position_latitude = radians(position[1])
+            d = (
+                sin((position_latitude - latitude) * 0.5) ** 2
+                + cos_latitude
+                * cos(position_latitude)
+                * sin((radians(position[0]) - longitude) * 0.5) ** 2
+            )
+            distances.append(2 * EARTH_RADIUS * asin(sqrt(d)))
+        return distances
+
+
+class EquirectangularModel(DistanceModel):
+    """Flat-earth approximation of the great-circle distance.
+
+    The longitude difference is scaled by the cosine of the mean latitude.
+    Compared with the haversine distance, the error of a distance d between
+    coordinates with a maximum absolute latitude phi is below
+    d * (d / R)^2 / (8 * cos(phi)^2), where R is the earth radius, for example
+    6 m for 100 km at 45 degrees. Where this bound exceeds `max_relative_error`
+    of the distance, the haversine distance is used instead.
+    """
+
+    name = DISTANCE_EQUIRECTANGULAR
+
+    def __init__(self, max_relative_error: float = 0.01):
+        """Initialise this model."""
+        self._max_relative_error = max_relative_error
+
+    def estimate(self, latitude1, longitude1, latitude2, longitude2):
+        """Return the distance and the maximum error of the distance."""
+        x = math.radians((longitude2 - longitude1 + 180.0) % 360.0 - 180.0) * math.cos(
+            math.radians((latitude1 + latitude2) * 0.5)
+        )
+        y = math.radians(latitude2 - latitude1)
+        angle_squared = x * x + y * y
+        cos_latitude = math.cos(math.radians(max(abs(latitude1), abs(latitude2))))
+        relative_error = angle_squared / (8 * cos_latitude * cos_latitude + 1e-300)
+        if relative_error > self._max_relative_error:
+            return haversine_distance(latitude1, longitude1, latitude2, longitude2), 0.0
+        distance = EARTH_RADIUS * math.sqrt(angle_squared)
+        # Allow for rounding errors of very short distances.
+        return distance, distance * relative_error + 1e-9
+
+    def distances(self, latitude, longitude, positions, max_distance=None):
+        """Return the distances between the coordinates and the positions."""
+        radians, cos, sqrt = math.radians, math.cos, math.sqrt
+        cos_home = cos(radians(latitude))
+        distances = []
+        for position in positions:
+            position_latitude, position_longitude = position[1], position[0]
+            x = radians((position_longitude - longitude + 180.0) % 360.0 - 180.0) * cos(
+                radians((latitude + position_latitude) * 0.5)
+            )
+            y = radians(position_latitude - latitude)
+            angle_squared = x * x + y * y
+            cos_latitude = min(cos_home, cos(radians(position_latitude)))
+            relative_error = angle_squared / (8 * cos_latitude * cos_latitude + 1e-300)
+            distance = EARTH_RADIUS * sqrt(angle_squared)
+            if relative_error > self._max_relative_error or (
+                max_distance is not None
+                and abs(distance - max_distance) <= distance * relative_error + 1e-9
+            ):
+                distance = haversine_distance(
+                    latitude, longitude, position_latitude, position_longitude
+                )
+            distances.append(distance)
+        return distances
+
+
+class VincentyModel(DistanceModel):
+    """Geodesic distance on the WGS-84 ellipsoid (Vincenty's formulae).
+
+    More accurate than the great-circle distance, at a higher cost. Falls
+    back to the haversine distance for nearly antipodal coordinates where
+    the iteration does not converge.
+    """
+
+    name = DISTANCE_VINCENTY
+    # The ellipsoid's smallest radius of curvature relative to the mean radius.
+    lower_bound_scale = 6335.439 / EARTH_RADIUS
+
+    def estimate(self, latitude1, longitude1, latitude2, longitude2):
+        """Return the distance and the maximum error of the distance."""
+        return self.distance(latitude1, longitude1, latitude2, longitude2), 0.0
+
+    def distance(self, latitude1, longitude1, latitude2, longitude2, max_distance=None):
+        """Return the distance between the coordinates."""
+        a = WGS84_SEMI_MAJOR_AXIS
+        f = WGS84_FLATTENING
+        b = (1 - f) * a
+        u1 = math.atan((1 - f) * math.tan(math.radians(latitude1)))
+        u2 = math.atan((1 - f) * math.tan(math.radians(latitude2)))
+        sin_u1, cos_u1 = math.sin(u1), math.cos(u1)
+        sin_u2, cos_u2 = math.sin(u2), math.cos(u2)
+        longitude_difference = math.radians(longitude2 - longitude1)
+        lambda_ = longitude_difference
+        for _ in range(200):
+            sin_lambda, cos_lambda = math.sin(lambda_), math.cos(lambda_)
+            sin_sigma = math.hypot(
+                cos_u2 * sin_lambda, cos_u1 * sin_u2 - sin_u1 * cos_u2 * cos_lambda
+            )
+            if sin_sigma == 0:
+                # Coincident coordinates.
+                return 0.0
+            cos_sigma = sin_u1 * sin_u2 + cos_u1 * cos_u2 * cos_lambda
+            sigma = math.atan2(sin_sigma, cos_sigma)
+            sin_alpha = cos_u1 * cos_u2 * sin_lambda / sin_sigma
+            cos_squared_alpha = 1 - sin_alpha**2
+            cos_2_sigma_m = (
+                cos_sigma - 2 * sin_u1 * sin_u2 / cos_squared_alpha
+                if cos_squared_alpha
+                # Both coordinates on the equator.
+                else 0.0
+            )
+            c = f / 16 * cos_squared_alpha * (4 + f * (4 - 3 * cos_squared_alpha))
+            previous_lambda = lambda_
+            lambda_ = longitude_difference + (1 - c) * f * sin_alpha * (
+                sigma
+                + c
+                * sin_sigma
+                * (cos_2_sigma_m + c * cos_sigma * (-1 + 2 * cos_2_sigma_m**2))
+            )
+            if abs(lambda_ - previous_lambda) < 1e-12:
+                break
+        else:
+            return haversine_distance(latitude1, longitude1, latitude2, longitude2)
+        u_squared = cos_squared_alpha * (a**2 - b**2) / b**2
+        big_a = 1 + u_squared / 16384 * (
+            4096 + u_squared * (-768 + u_squared * (320 - 175 * u_squared))
+        )
+        big_b = (
+            u_squared
+            / 1024
+            * (256 + u_squared * (-128 + u_squared * (74 - 47 * u_squared)))
+        )
+        delta_sigma = (
+            big_b
+            * sin_sigma
+            * (
+                cos_2_sigma_m
+                + big_b
+                / 4
+                * (
+                    cos_sigma * (-1 + 2 * cos_2_sigma_m**2)
+                    - big_b
+                    / 6
+                    * cos_2_sigma_m
+                    * (-3 + 4 * sin_sigma**2)
+                    * (-3 + 4 * cos_2_sigma_m**2)
+                )
+            )
+        )
+        return b * big_a * (sigma - delta_sigma)
+
+
+DISTANCE_MODELS = {
+    DISTANCE_HAVERSINE: HaversineModel(),
+    DISTANCE_VINCENTY: VincentyModel(),
+    DISTANCE_EQUIRECTANGULAR: EquirectangularModel(),
+}
@@ -0,0 +1,125 @@
+"""
+Error handling policies.
+
+Define how the feed manager reacts to failed updates.
+"""
+import logging
+import time
+from datetime import datetime
+from typing import Optional
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class StaleWhileErrorPolicy:
+    """Keep the last good state of a feed manager while updates fail.
+
+    The last good state is kept until more than `max_failures` consecutive
+    updates have failed, or until the last successful update is more than
+    `max_stale_seconds` ago, whichever comes first. Without any limit the
+    last good state is kept indefinitely.
+    """
+
+    def __init__(
+        self,
+        max_failures: Optional[int] = None,
+        max_stale_seconds: Optional[float] = None,
+    ):
+        """Initialise this policy."""
+        self._max_failures = max_failures
+        self._max_stale_seconds = max_stale_seconds
+
+    def __repr__(self):
+        """Return string representation of this policy."""
+        return "<{}(max_failures={}, max_stale_seconds={})>".format(
+            self.__class__.__name__, self._max_failures, self._max_stale_seconds
+        )
+
+    def keep_stale(
+        self, consecutive_failures: int, last_update: Optional[datetime]
+    ) -> bool:
+        """Return True if the last good state should be kept."""
+        if last_update is None:
+            return False
+        if self._max_failures is not None and consecutive_failures > self._max_failures:
+            return False
+        if (
+            self._max_stale_seconds is not None
+            and (datetime.now() - last_update).total_seconds() > self._max_stale_seconds
+        ):
+            return False
+        return True
+
+
+class CircuitBreaker:
+    """Back off from fetching a feed during repeated failures.
+
+    After `failure_threshold` consecutive failures the circuit opens, and no
+    requests are made for `backoff` seconds. Once that time has passed, a
+    single request is allowed through; if it fails again, the circuit opens
+    for `multiplier` times as long as before, up to `max_backoff` seconds. A
+    successful request closes the circuit.
+    """
+
+    def __init__(
+        self,
+        failure_threshold: int = 3,
+        backoff: float = 30.0,
+        max_backoff: float = 600.0,
+        multiplier: float = 2.0,
+    ):
+        """Initialise this circuit breaker."""
+        self._failure_threshold = failure_threshold
+        self._backoff = backoff
+        self._max_backoff = max_backoff
+        self._multiplier = multiplier
+        self._failures = 0
+        self._open_until = None
+
+    def __repr__(self):
+        """Return string representation of this circuit breaker."""
+        return "<{}(failures={}, open={})>".format(
+            self.__class__.__name__, self._failures, self.is_open
+        )
+
+    @property
+    def failures(self) -> int:
+        """Return the number of consecutive failures."""
+        return self._failures
+
+    @property
+    def is_open(self) -> bool:
+        """Return True if requests are currently not allowed."""
+        return self._open_until is not None and time.monotonic() < self._open_until
+
+    @property
+    def retry_in(self) -> float:
+        """Return the number of seconds until the next request is allowed."""
+        if self._open_until is None:
+            return 0.0
+        return max(0.0, self._open_until - time.monotonic())
+
+    def allow_request(self) -> bool:
+        """Return True if a request may be made now."""
+        return not self.is_open
+
+    def record_success(self):
+        """Record a successful request and close the circuit."""
+        self._failures = 0
+        self._open_until = None
+
+    def record_failure(self):
+        """Record a failed request and open the circuit if necessary."""
+        self._failures += 1
+        if self._failures >= self._failure_threshold:
+            backoff = min(
+                self._max_backoff,
+                self._backoff
+                * self._multiplier ** (self._failures - self._failure_threshold),
+            )
+            self._open_until = time.monotonic() + backoff
+            _LOGGER.debug(
+                "Circuit opened for %s seconds after %s failures",
+                backoff,
+                self._failures,
+            )
@@ -0,0 +1,279 @@
+"""
+Feed manager change events.
+
+Streams of created, updated and removed feed entries that can be consumed
+independently of the feed manager's update cycle.
+"""
+import itertools
+import logging
+import threading
+import time
+from collections import OrderedDict
+from queue import Empty
+from typing import Optional
+
+_LOGGER = logging.getLogger(__name__)
+
+EVENT_CREATED = "created"
+EVENT_UPDATED = "updated"
+EVENT_REMOVED = "removed"
+
+BACKPRESSURE_BLOCK = "block"
+BACKPRESSURE_DROP_OLDEST = "drop_oldest"
+BACKPRESSURE_COALESCE = "coalesce"
+
+BACKPRESSURE_POLICIES = (
+    BACKPRESSURE_BLOCK,
+    BACKPRESSURE_DROP_OLDEST,
+    BACKPRESSURE_COALESCE,
+)
+
+DEFAULT_BLOCK_TIMEOUT = 10.0
+
+
+class FeedEvent:
+    """A single change of a feed entry."""
+
+    __slots__ = ("_event_type", "_external_id", "_entry", "_generation")
+
+    def __init__(self, event_type: str, external_id, entry, generation: int):
+        """Initialise this event."""
+        self._event_type = event_type
+        self._external_id = external_id
+        self._entry = entry
+        self._generation = generation
+
+    def __repr__(self):
+        """Return string representation of this event."""
+        return "<{}(type={}, id={}, generation={})>".format(
+            self.__class__.__name__,
+            self._event_type,
+            self._external_id,
+            self._generation,
+        )
+
+    @property
+    def event_type(self) -> str:
+        """Return the type of this event."""
+        return self._event_type
+
+    @property
+    def external_id(self):
+        """Return the external id of the affected entry."""
+        return self._external_id
+
+    @property
+    def entry(self):
+        """Return the affected entry.
+
+        For removed entries this is the last known version of the entry.
+        """
+        return self._entry
+
+    @property
+    def generation(self) -> int:
+        """Return the generation of the update that produced this event."""
+        return self._generation
+
+
+def _coalesce(previous: FeedEvent, event: FeedEvent) -> Optional[FeedEvent]:
+    """Merge two consecutive events for the same entry into one.
+
+    Returns None if both events cancel each other out.
+    """
+    if previous.event_type == EVENT_CREATED:
+        if event.event_type == EVENT_REMOVED:
+            # The consumer has never seen this entry.
+            return None
+        return FeedEvent(
+            EVENT_CREATED, event.external_id, event.entry, event.generation
+        )
+    if previous.event_type == EVENT_REMOVED and event.event_type == EVENT_CREATED:
+        # The consumer still knows this entry from before it was removed.
+        return FeedEvent(
+            EVENT_UPDATED, event.external_id, event.entry, event.generation
+        )
+    return event
+
+
+class FeedEventSubscription:
+    """Bounded queue of feed events for a single consumer.
+
+    Can be consumed with `get`, as an iterator or as an async iterator.
+    The backpressure policy defines what happens if the queue is full:
+
+    * `block`: The feed manager waits until the consumer has caught up, or
+      until `block_timeout` has passed, after which the oldest event is
+      dropped. With a `block_timeout` of None it waits indefinitely.
+    * `drop_oldest` (default): The oldest event is dropped.
+    * `coalesce`: Events for the same entry are merged into one; if the
+      queue is still full the oldest event is dropped.
+    """
+
+    def __init__(
+        self,
+        max_size: int = 1000,
+        backpressure: str = BACKPRESSURE_DROP_OLDEST,
+        block_timeout: Optional[float] = DEFAULT_BLOCK_TIMEOUT,
+    ):
+        """Initialise this subscription."""
+        if backpressure not in BACKPRESSURE_POLICIES:
+            raise ValueError(
+                "Backpressure must be one of %s" % (BACKPRESSURE_POLICIES,)
+            )
+        if max_size < 1:
+            raise ValueError("Maximum size must be at least 1")
+        self._max_size = max_size
+        self._backpressure = backpressure
+        self._block_timeout = block_timeout
+        # Keyed by external id when coalescing, by sequence number otherwise.
+        self._queue = OrderedDict()
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+        self._async_waiters = []
+        self._dropped = 0
+        self._closed = False
+
+    def __repr__(self):
+        """Return string representation of this subscription."""
+        return "<{}(backpressure={}, pending={}, dropped={})>".format(
+            self.__class__.__name__,
+            self._backpressure,
+            len(self._queue),
+            self._dropped,
+        )
+
+    def __len__(self):
+        """Return the number of pending events."""
+        return len(self._queue)
+
+    @property
+    def backpressure(self) -> str:
+        """Return the backpressure policy of this subscription."""
+        return self._backpressure
+
+    @property
+    def dropped(self) -> int:
+        """Return the number of events dropped because the queue was full."""
+        return self._dropped
+
+    @property
+    def closed(self) -> bool:
+        """Return True if this subscription does not accept events anymore."""
+        return self._closed
+
+    def publish(self, event: FeedEvent):
+        """Add an event to this subscription, applying backpressure."""
+        with self._condition:
+            if self._closed:
+                return
+            if self._backpressure == BACKPRESSURE_COALESCE:
+                key = event.external_id
+                if key in self._queue:
+                    merged = _coalesce(self._queue[key], event)
+                    if merged:
+                        self._queue[key] = merged
+                    else:
+                        del self._queue[key]
+                    self._notify()
+                    return
+            else:
+                key = next(self._sequence)
+            if len(self._queue) >= self._max_size:
+                if self._backpressure == BACKPRESSURE_BLOCK:
+                    self._wait_for_space()
+                    if self._closed:
+                        return
+                    if len(self._queue) >= self._max_size:
+                        _LOGGER.warning(
+                            "Consumer of %s did not catch up within %s seconds",
+                            self,
+                            self._block_timeout,
+                        )
+                if len(self._queue) >= self._max_size:
+                    self._queue.popitem(last=False)
+                    self._dropped += 1
+                    _LOGGER.debug("Dropped oldest event from %s", self)
+            self._queue[key] = event
+            self._notify()
+
+    def _wait_for_space(self):
+        """Wait until the consumer has made space in the queue."""
+        deadline = (
+            time.monotonic() + self._block_timeout
+            if self._block_timeout is not None
+            else None
+        )
+        while len(self._queue) >= self._max_size and not self._closed:
+            remaining = deadline - time.monotonic() if deadline is not None else None
+            if remaining is not None and remaining <= 0:
+                break
+            self._condition.wait(remaining)
+
+    def _notify(self):
+        """Wake up all waiting consumers and blocked publishers."""
+        self._condition.notify_all()
+        for loop, future in self._async_waiters:
+            loop.call_soon_threadsafe(_resolve_future, future)
+        self._async_waiters.clear()
+
+    def get(self, timeout: Optional[float] = None) -> FeedEvent:
+        """Remove and return the next event.
+
+        Raises `queue.Empty` if no event arrived within the timeout, or if
+        the subscription was closed and no events are pending.
+        """
+        with self._condition:
+            if not self._condition.wait_for(
+                lambda: self._queue or self._closed, timeout
+            ):
+                raise Empty
+            if not self._queue:
+                raise Empty
+            event = self._queue.popitem(last=False)[1]
+            self._notify()
+            return event
+
+    def close(self):
+        """Stop accepting events; pending events can still be consumed."""
+        with self._condition:
+            self._closed = True
+            self._notify()
+
+    def __iter__(self):
+        """Return iterator over events, ending once closed and drained."""
+        return self
+
+    def __next__(self) -> FeedEvent:
+        """Return the next event, waiting for it if necessary."""
+        try:
+            return self.get()
+        except Empty:
+            raise StopIteration
+
+    def __aiter__(self):
+        """Return async iterator over events, ending once closed and drained."""
+        return self
+
+    async def __anext__(self) -> FeedEvent:
+        """Return the next event, waiting for it without blocking the loop."""
+        import asyncio  # pylint: disable=import-outside-toplevel
+
+        loop = asyncio.get_running_loop()
+        while True:
+            with self._condition:
+                if self._queue:
+                    event = self._queue.popitem(last=False)[1]
+                    self._notify()
+                    return event
+                if self._closed:
+                    raise StopAsyncIteration
+                future = loop.create_future()
+                self._async_waiters.append((loop, future))
+            await future
+
+
+def _resolve_future(future):
+    """Mark a waiting consumer's future as done."""
+    if not future.done():
+        future.set_result(None)
@@ -5,17 +5,131 @@ This allows managing feeds and their entries throughout their life-cycle.
 """
 import logging
 from datetime import datetime
-from typing import Dict, List, Optional
+from types import MappingProxyType
+from typing import Dict, FrozenSet, List, Mapping, Optional
 
-from geojson_client import UPDATE_OK, UPDATE_OK_NO_DATA
+from geojson_client import UPDATE_ERROR, UPDATE_OK, UPDATE_OK_NO_DATA
+from geojson_client.dispatcher import CallbackDispatcher
+from geojson_client.error_policy import CircuitBreaker, StaleWhileErrorPolicy
+from geojson_client.events import (
+    BACKPRESSURE_DROP_OLDEST,
+    DEFAULT_BLOCK_TIMEOUT,
+    EVENT_CREATED,
+    EVENT_REMOVED,
+    EVENT_UPDATED,
+    FeedEvent,
+    FeedEventSubscription,
+)
+from geojson_client.history import REASON_REMOVED, REASON_SUPERSEDED, EntryHistory
 
 _LOGGER = logging.getLogger(__name__)
 
 
+class FeedManagerSnapshot:
+    """Immutable view of the feed manager's state after an update.
+
+    A new snapshot is published atomically at the end of each update, so
+    readers on other threads always see a consistent set of feed entries
+    without having to lock against the updating thread.
+    """
+
+    __slots__ = (
+        "_generation",
+        "_status",
+        "_feed_entries",
+        "_managed_external_ids",
+        "_last_update",
+        "_last_timestamp",
+        "_stale",
+        "_consecutive_failures",
+    )
+
+    def __init__(
+        self,
+        generation: int,
+        status: Optional[str],
+        feed_entries: Dict,
+        managed_external_ids,
+        last_update: Optional[datetime],
+        last_timestamp: Optional[datetime],
+        stale: bool = False,
+        consecutive_failures: int = 0,
+    ):
+        """Initialise this snapshot."""
+        self._generation = generation
+        self._status = status
+        self._feed_entries = MappingProxyType(feed_entries)
+        self._managed_external_ids = frozenset(managed_external_ids)
+        self._last_update = last_update
+        self._last_timestamp = last_timestamp
+        self._stale = stale
+        self._consecutive_failures = consecutive_failures
+
+    def __repr__(self):
+        """Return string representation of this snapshot."""
+        return "<{}(generation={}, status={}, entries={})>".format(
+            self.__class__.__name__,
+            self._generation,
+            self._status,
+            len(self._feed_entries),
+        )
+
+    @property
+    def generation(self) -> int:
+        """Return the generation number, incremented with every update."""
+        return self._generation
+
+    @property
+    def status(self) -> Optional[str]:
+        """Return the status of the update that produced this snapshot."""
+        return self._status
+
+    @property
+    def feed_entries(self) -> Mapping:
+        """Return a read-only mapping of external id to feed entry."""
+        return self._feed_entries
+
+    @property
+    def managed_external_ids(self) -> FrozenSet:
+        """Return the external ids managed at the time of this snapshot."""
+        return self._managed_external_ids
+
+    @property
+    def last_update(self) -> Optional[datetime]:
+        """Return the last successful update at the time of this snapshot."""
+        return self._last_update
+
+    @property
+    def last_timestamp(self) -> Optional[datetime]:
+        """Return the last timestamp extracted from the feed."""
+        return self._last_timestamp
+
+    @property
+    def stale(self) -> bool:
+        """Return True if the entries were kept from an earlier update."""
+        return self._stale
+
+    @property
+    def consecutive_failures(self) -> int:
+        """Return the number of consecutive failed updates."""
+        return self._consecutive_failures
+
+
 class FeedManagerBase:
     """Generic Feed manager."""
 
-    def __init__(self, feed, generate_callback, update_callback, remove_callback):
+    def __init__(
+        self,
+        feed,
+        generate_callback,
+        update_callback,
+        remove_callback,
+        dispatcher: CallbackDispatcher = None,
+        wait_for_callbacks: bool = True,
+        stale_while_error: StaleWhileErrorPolicy = None,
+        circuit_breaker: CircuitBreaker = None,
+        history: EntryHistory = None,
+    ):
         """Initialise feed manager."""
         self._feed = feed
         self.feed_entries = {}
@@ -24,6 +138,19 @@ class FeedManagerBase:
         self._generate_callback = generate_callback
         self._update_callback = update_callback
         self._remove_callback = remove_callback
+        self._dispatcher = dispatcher or CallbackDispatcher()
+        self._wait_for_callbacks = wait_for_callbacks
+        self._stale_while_error = stale_while_error
+        self._circuit_breaker = circuit_breaker
+        self._history = history
+        self._consecutive_failures = 0
+        self._stale = False
+        # The external ids of the current entries, so that the ids of the
+        # next update are the same objects and compare by identity.
+        self._interned_ids = {}
+        self._duplicate_external_ids = frozenset()
+        self._snapshot = FeedManagerSnapshot(0, None, {}, (), None, None)
+        self._subscriptions = []
 
     def __repr__(self):
         """Return string representation of this feed."""
@@ -32,10 +159,15 @@ class FeedManagerBase:
     def _update_internal(self, status: str, feed_entries: Optional[List]):
         """Update the feed and then update connected entities."""
         # status, feed_entries = self._feed.update()
+        previous_feed_entries = self.feed_entries
+        recovered = self._stale or self._consecutive_failures
+        if status != UPDATE_ERROR:
+            self._consecutive_failures = 0
+            self._stale = False
         if status == UPDATE_OK:
             _LOGGER.debug("Data retrieved %s", feed_entries)
             # Keep a copy of all feed entries for future lookups by entities.
-            self.feed_entries = {entry.external_id: entry for entry in feed_entries}
+            self.feed_entries = self._index_entries(feed_entries)
             # Record current time of update.
             self._last_update = datetime.now()
             # For entity management the external ids from the feed are used.
@@ -52,34 +184,278 @@ class FeedManagerBase:
                 self._managed_external_ids
             )
             self._generate_new_entities(create_external_ids)
+            self._report_moved_entries(
+                previous_feed_entries, create_external_ids, remove_external_ids
+            )
+            self._publish_snapshot(status)
+            self._record_history(
+                previous_feed_entries, update_external_ids, remove_external_ids
+            )
+            self._publish_events(
+                previous_feed_entries,
+                create_external_ids,
+                update_external_ids,
+                remove_external_ids,
+            )
         elif status == UPDATE_OK_NO_DATA:
             _LOGGER.debug("Update successful, but no data received from %s", self._feed)
+            if recovered:
+                # The entries are no longer stale.
+                self._publish_snapshot(status)
         else:
             _LOGGER.warning(
                 "Update not successful, no data received from %s", self._feed
             )
+            self._consecutive_failures += 1
+            if self._stale_while_error and self._stale_while_error.keep_stale(
+                self._consecutive_failures, self._last_update
+            ):
+                # Keep all entities until the policy's limits are reached.
+                _LOGGER.debug(
+                    "Keeping stale entries after %s failed updates",
+                    self._consecutive_failures,
+                )
+                self._stale = True
+                self._publish_snapshot(status)
+                return
+            self._stale = False
+            # The next successful update has to provide all entries again.
+            self._feed.invalidate()
             # Remove all entities.
-            self._remove_entities(self._managed_external_ids.copy())
-            # Remove all feed entries and managed external ids.
-            self.feed_entries.clear()
+            remove_external_ids = self._managed_external_ids.copy()
+            self._remove_entities(remove_external_ids)
+            # Remove all feed entries and managed external ids. The previous
+            # dictionary may still be referenced by a published snapshot, so
+            # it must be replaced rather than cleared.
+            self.feed_entries = {}
+            self._interned_ids = {}
             self._managed_external_ids.clear()
+            self._publish_snapshot(status)
+            self._record_history(previous_feed_entries, (), remove_external_ids)
+            self._publish_events(previous_feed_entries, (), (), remove_external_ids)
+
+    def _index_entries(self, feed_entries: List) -> Dict:
+        """Return the entries by interned external id, and report duplicate
+        external ids."""
+        interned_ids = self._interned_ids
+        entries = {}
+        duplicates = set()
+        for entry in feed_entries:
+            external_id = entry.external_id
+            external_id = interned_ids.get(external_id, external_id)
+            if external_id in entries:
+                duplicates.add(external_id)
+            entries[external_id] = entry
+        self._interned_ids = {external_id: external_id for external_id in entries}
+        self._duplicate_external_ids = frozenset(duplicates)
+        if duplicates:
+            # Only the last entry with each of these ids is kept.
+            _LOGGER.warning(
+                "Entries of %s with duplicate external ids: %s",
+                self._feed,
+                ", ".join(sorted(str(external_id) for external_id in duplicates)),
+            )
+        return entries
+
+    def _report_moved_entries(
+        self, previous_feed_entries: Dict, create_external_ids, remove_external_ids
+    ):
+        """Report entries whose external ids were derived from coordinates
+        that have probably moved, which appear as removed and created."""
+        created = sum(
+            1
+            for external_id in create_external_ids
+            if self.feed_entries[external_id].external_id_from_coordinates
+        )
+        if not created:
+            return
+        removed = 0
+        for external_id in remove_external_ids:
+            entry = previous_feed_entries.get(external_id)
+            if entry is not None and entry.external_id_from_coordinates:
+                removed += 1
+        if removed:
+            _LOGGER.warning(
+                "%s entries of %s without an id have probably moved, and were "
+                "removed and created again",
+                min(created, removed),
+                self._feed,
+            )
+
+    def _publish_snapshot(self, status: str):
+        """Publish a new immutable snapshot of the current state."""
+        # Rebinding the attribute is atomic, so readers either see the
+        # previous or the new snapshot, but never a partial update.
+        self._snapshot = FeedManagerSnapshot(
+            self._snapshot.generation + 1,
+            status,
+            self.feed_entries,
+            self._managed_external_ids,
+            self._last_update,
+            self.last_timestamp,
+            stale=self._stale,
+            consecutive_failures=self._consecutive_failures,
+        )
+
+    def _record_history(
+        self, previous_feed_entries: Dict, update_external_ids, remove_external_ids
+    ):
+        """Record removed entries and previous versions of updated entries."""
+        if self._history is None:
+            return
+        generation = self._snapshot.generation
+        for external_id in remove_external_ids:
+            entry = previous_feed_entries.get(external_id)
+            if entry is not None:
+                self._history.record(
+                    entry, REASON_REMOVED, generation, external_id=external_id
+                )
+        for external_id in update_external_ids:
+            entry = previous_feed_entries.get(external_id)
+            current = self.feed_entries[external_id]
+            if (
+                entry is not None
+                and entry is not current
+                and entry.feature != current.feature
+            ):
+                self._history.record(
+                    entry, REASON_SUPERSEDED, generation, external_id=external_id
+                )
+
+    def _publish_events(
+        self,
+        previous_feed_entries: Dict,
+        create_external_ids,
+        update_external_ids,
+        remove_external_ids,
+    ):
+        """Publish change events to all subscriptions."""
+        if not self._subscriptions:
+            return
+        self._subscriptions = [
+            subscription
+            for subscription in self._subscriptions
+            if not subscription.closed
+        ]
+        generation = self._snapshot.generation
+        events = (
+            [
+                FeedEvent(
+                    EVENT_REMOVED,
+                    external_id,
+                    previous_feed_entries.get(external_id),
+                    generation,
+                )
+                for external_id in remove_external_ids
+            ]
+            + [
+                FeedEvent(
+                    EVENT_UPDATED,
+                    external_id,
+                    self.feed_entries[external_id],
+                    generation,
+                )
+                for external_id in update_external_ids
+            ]
+            + [
+                FeedEvent(
+                    EVENT_CREATED,
+                    external_id,
+                    self.feed_entries[external_id],
+                    generation,
+                )
+                for external_id in create_external_ids
+            ]
+        )
+        for subscription in self._subscriptions:
+            for event in events:
+                subscription.publish(event)
+
+    def subscribe(
+        self,
+        max_size: int = 1000,
+        backpressure: str = BACKPRESSURE_DROP_OLDEST,
+        block_timeout: Optional[float] = DEFAULT_BLOCK_TIMEOUT,
+    ) -> FeedEventSubscription:
+        """Subscribe to change events produced by future updates."""
+        subscription = FeedEventSubscription(
+            max_size=max_size, backpressure=backpressure, block_timeout=block_timeout
+        )
+        self._subscriptions = self._subscriptions + [subscription]
+        return subscription
+
+    def unsubscribe(self, subscription: FeedEventSubscription):
+        """Stop delivering change events to the subscription."""
+        subscription.close()
+        self._subscriptions = [
+            existing for existing in self._subscriptions if existing is not subscription
+        ]
 
     def update(self):
         """Update the feed and then update connected entities."""
-        status, feed_entries = self._feed.update()
+        if self._fetch_allowed():
+            status, feed_entries = self._feed.update()
+            self._record_fetch_status(status)
+        else:
+            status, feed_entries = UPDATE_ERROR, None
         self._update_internal(status, feed_entries)
+        if self._wait_for_callbacks:
+            self.wait_for_callbacks()
 
     def update_override(self, filter_overrides: Dict = None):
         """Update the feed and then update connected entities."""
-        status, feed_entries = self._feed.update_override(
-            filter_overrides=filter_overrides
+        if self._fetch_allowed():
+            status, feed_entries = self._feed.update_override(
+                filter_overrides=filter_overrides
+            )
+            self._record_fetch_status(status)
+        else:
+            status, feed_entries = UPDATE_ERROR, None
+        self._update_internal(status, feed_entries)
+        if self._wait_for_callbacks:
+            self.wait_for_callbacks()
+
+    def reevaluate(self, home_coordinates=None, filter_overrides: Dict = None):
+        """Filter the last fetched feed again, optionally for new home
+        coordinates and filter overrides, and then update connected entities.
+
+        The feed is not fetched again, so this can be called as often as the
+        home coordinates change.
+        """
+        status, feed_entries = self._feed.reevaluate(
+            home_coordinates=home_coordinates, filter_overrides=filter_overrides
         )
         self._update_internal(status, feed_entries)
+        if self._wait_for_callbacks:
+            self.wait_for_callbacks()
+
+    def _fetch_allowed(self) -> bool:
+        """Return True unless the circuit breaker prevents fetching the feed."""
+        if self._circuit_breaker and not self._circuit_breaker.allow_request():
+            _LOGGER.debug(
+                "Not fetching %s for another %.1f seconds",
+                self._feed,
+                self._circuit_breaker.retry_in,
+            )
+            return False
+        return True
+
+    def _record_fetch_status(self, status: str):
+        """Record the outcome of fetching the feed with the circuit breaker."""
+        if self._circuit_breaker:
+            if status == UPDATE_ERROR:
+                self._circuit_breaker.record_failure()
+            else:
+                self._circuit_breaker.record_success()
+
+    def wait_for_callbacks(self, timeout: Optional[float] = None) -> bool:
+        """Wait until all dispatched entity callbacks have completed."""
+        return self._dispatcher.wait(timeout)
 
     def _generate_new_entities(self, external_ids):
         """Generate new entities for events."""
         for external_id in external_ids:
-            self._generate_callback(external_id)
+            self._dispatcher.dispatch(external_id, self._generate_callback)
             _LOGGER.debug("New entity added %s", external_id)
             self._managed_external_ids.add(external_id)
 
@@ -87,14 +463,45 @@ class FeedManagerBase:
         """Update entities."""
         for external_id in external_ids:
             _LOGGER.debug("Existing entity found %s", external_id)
-            self._update_callback(external_id)
+            self._dispatcher.dispatch(external_id, self._update_callback)
 
     def _remove_entities(self, external_ids):
         """Remove entities."""
         for external_id in external_ids:
             _LOGGER.debug("Entity not current anymore %s", external_id)
             self._managed_external_ids.remove(external_id)
-            self._remove_callback(external_id)
+            self._dispatcher.dispatch(external_id, self._remove_callback)
+
+    @property
+    def feed(self):
+        """Return the feed managed by this feed manager."""
+        return self._feed
+
+    @property
+    def snapshot(self) -> FeedManagerSnapshot:
+        """Return the most recently published snapshot of this manager."""
+        return self._snapshot
+
+    @property
+    def duplicate_external_ids(self) -> FrozenSet:
+        """Return the external ids shared by several entries in the last
+        update."""
+        return self._duplicate_external_ids
+
+    @property
+    def history(self) -> Optional[EntryHistory]:
+        """Return the history of removed and superseded entries, if any."""
+        return self._history
+
+    @property
+    def stale(self) -> bool:
+        """Return True if the entries were kept from an earlier update."""
+        return self._stale
+
+    @property
+    def consecutive_failures(self) -> int:
+        """Return the number of consecutive failed updates."""
+        return self._consecutive_failures
 
     @property
     def last_timestamp(self) -> Optional[datetime]:
@@ -0,0 +1,201 @@
+"""
+Fetch policy.
+
+Timeouts, retries and hedged requests for fetching feeds.
+"""
+import logging
+import random
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Optional, Tuple
+
+from geojson_client.transport import TransferStats
+
+_LOGGER = logging.getLogger(__name__)
+
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+CACHE_HIT = "hit"
+CACHE_MISS = "miss"
+CACHE_REVALIDATED = "revalidated"
+
+
+class FetchStatus:
+    """Details about the most recent attempt to fetch a feed."""
+
+    def __init__(self):
+        """Initialise this fetch status."""
+        self.attempts = 0
+        self.hedged_requests = 0
+        self.elapsed = 0.0
+        self.status_code = None
+        self.error = None
+        self.cache_status = None
+        self.expires_at = None
+        self.wire_bytes = 0
+        self.decoded_bytes = 0
+        self.decompress_time = 0.0
+
+    def record_transfer(self, transfer):
+        """Add the bytes received and decompressed for a response."""
+        self.wire_bytes += transfer.wire_bytes
+        self.decoded_bytes += transfer.decoded_bytes
+        if transfer.decompress_time:
+            self.decompress_time += transfer.decompress_time
+
+    def __repr__(self):
+        """Return string representation of this fetch status."""
+        return (
+            "<{}(attempts={}, hedged={}, elapsed={:.3f}, status={}, error={})>".format(
+                self.__class__.__name__,
+                self.attempts,
+                self.hedged_requests,
+                self.elapsed,
+                self.status_code,
+                self.error,
+            )
+        )
+
+
+class FetchPolicy:
+    """Define timeouts, retries and hedging for fetching a feed.
+
+    * `connect_timeout` and `read_timeout` are passed on to each request.
+    * `deadline` limits the overall time in seconds spent on all attempts.
+    * `retries` is the number of additional attempts after a connection
+      error, a timeout, or a response with a retryable status code. The
+      wait time before each retry is chosen randomly between zero and an
+      exponentially growing limit, starting at `backoff` seconds and capped
+      at `max_backoff` seconds.
+    * `hedge_after`: If a request has not completed after this many
+      seconds, a second identical request is sent, and whichever response
+      arrives first is used.
+    """
+
+    def __init__(
+        self,
+        connect_timeout: float = 10.0,
+        read_timeout: float = 10.0,
+        deadline: Optional[float] = None,
+        retries: int = 0,
+        backoff: float = 0.5,
+        max_backoff: float = 10.0,
+        hedge_after: Optional[float] = None,
+    ):
+        """Initialise this fetch policy."""
+        self._connect_timeout = connect_timeout
+        self._read_timeout = read_timeout
+        self._deadline = deadline
+        self._retries = retries
+        self._backoff = backoff
+        self._max_backoff = max_backoff
+        self._hedge_after = hedge_after
+
+    def __repr__(self):
+        """Return string representation of this fetch policy."""
+        return (
+            "<{}(connect_timeout={}, read_timeout={}, deadline={}, "
+            "retries={}, hedge_after={})>".format(
+                self.__class__.__name__,
+                self._connect_timeout,
+                self._read_timeout,
+                self._deadline,
+                self._retries,
+                self._hedge_after,
+            )
+        )
+
+    def execute(self, send: Callable, status: FetchStatus):
+        """Send requests according to this policy and return the response.
+
+        The send function is called with the timeout to apply. Raises the
+        last request exception if no attempt produced a response.
+        """
+        import requests  # pylint: disable=import-outside-toplevel
+
+        start = time.monotonic()
+        attempt = 0
+        try:
+            while True:
+                timeout = self._timeout(start)
+                status.attempts += 1
+                try:
+                    response = self._attempt(send, timeout, status)
+                    transfer = getattr(response, "transfer", None)
+                    if isinstance(transfer, TransferStats):
+                        status.record_transfer(transfer)
+                    status.status_code = response.status_code
+                    status.error = None
+                    if response.ok or response.status_code not in RETRY_STATUS_CODES:
+                        return response
+                    error = None
+                except requests.exceptions.RequestException as request_ex:
+                    status.error = str(request_ex) or type(request_ex).__name__
+                    response = None
+                    error = request_ex
+                delay = self._retry_delay(attempt, start)
+                if delay is None:
+                    if error:
+                        raise error
+                    return response
+                _LOGGER.debug(
+                    "Retrying in %.2f seconds after attempt %s", delay, attempt + 1
+                )
+                time.sleep(delay)
+                attempt += 1
+        finally:
+            status.elapsed = time.monotonic() - start
+
+    def _timeout(self, start: float) -> Tuple[float, float]:
+        """Return the connect and read timeout for the next attempt."""
+        connect_timeout, read_timeout = self._connect_timeout, self._read_timeout
+        if self._deadline is not None:
+            remaining = max(0.001, self._deadline - (time.monotonic() - start))
+            connect_timeout = min(connect_timeout, remaining)
+            read_timeout = min(read_timeout, remaining)
+        return connect_timeout, read_timeout
+
+    def _retry_delay(self, attempt: int, start: float) -> Optional[float]:
+        """Return the time to wait before retrying, or None to give up."""
+        if attempt >= self._retries:
+            return None
+        delay = random.uniform(0, min(self._max_backoff, self._backoff * 2**attempt))
+        if (
+            self._deadline is not None
+            and time.monotonic() - start + delay >= self._deadline
+        ):
+            return None
+        return delay
+
+    def _attempt(self, send: Callable, timeout, status: FetchStatus):
+        """Send a request, and a hedged request if the first one is slow.
+
+        The response of the slower request is ignored, so it is not recorded
+        in the fetch status either.
+        """
+        if self._hedge_after is None:
+            return send(timeout)
+        import requests  # pylint: disable=import-outside-toplevel
+
+        executor = ThreadPoolExecutor(max_workers=2)
+        try:
+            futures = {executor.submit(send, timeout)}
+            done, _ = wait(futures, timeout=self._hedge_after)
+            if not done:
+                _LOGGER.debug(
+                    "Sending hedged request after %s seconds", self._hedge_after
+                )
+                status.hedged_requests += 1
+                futures.add(executor.submit(send, timeout))
+            error = None
+            while futures:
+                done, futures = wait(futures, return_when=FIRST_COMPLETED)
+                for future in done:
+                    try:
+                        return future.result()
+                    except requests.exceptions.RequestException as request_ex:
+                        error = request_ex
+            raise error
+        finally:
+            # Do not wait for the slower request to complete.
+            executor.shutdown(wait=False)
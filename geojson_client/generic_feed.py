@@ -3,9 +3,13 @@ Generic GeoJSON feed.
 
 Support for generic GeoJSON feeds from various sources.
 """
+from datetime import datetime
+from typing import Dict, Optional
+
 from geojson_client import FeedEntry, GeoJsonFeed
-from geojson_client.consts import ATTR_GUID, ATTR_ID, ATTR_TITLE
+from geojson_client.distance import DISTANCE_HAVERSINE
 from geojson_client.feed_manager import FeedManagerBase
+from geojson_client.mapping import DEFAULT_MAPPING, FeedMapping, MappedFields
 
 
 class GenericFeedManager(FeedManagerBase):
@@ -19,48 +23,137 @@ class GenericFeedManager(FeedManagerBase):
         coordinates,
         url,
         filter_radius=None,
+        dispatcher=None,
+        wait_for_callbacks=True,
+        stale_while_error=None,
+        circuit_breaker=None,
+        history=None,
+        fetch_policy=None,
+        http_cache=None,
+        skip_unchanged=False,
+        distance_model=DISTANCE_HAVERSINE,
+        mapping: FeedMapping = None,
+        transport=None,
+        keep_last_data=False,
     ):
         """Initialize the Generic Feed Manager."""
-        feed = GenericFeed(coordinates, url, filter_radius=filter_radius)
-        super().__init__(feed, generate_callback, update_callback, remove_callback)
+        feed = GenericFeed(
+            coordinates,
+            url,
+            filter_radius=filter_radius,
+            fetch_policy=fetch_policy,
+            http_cache=http_cache,
+            skip_unchanged=skip_unchanged,
+            distance_model=distance_model,
+            mapping=mapping,
+            transport=transport,
+            keep_last_data=keep_last_data,
+        )
+        super().__init__(
+            feed,
+            generate_callback,
+            update_callback,
+            remove_callback,
+            dispatcher=dispatcher,
+            wait_for_callbacks=wait_for_callbacks,
+            stale_while_error=stale_while_error,
+            circuit_breaker=circuit_breaker,
+            history=history,
+        )
 
 
 class GenericFeed(GeoJsonFeed):
     """Generic GeoJSON feed."""
 
-    def __init__(self, home_coordinates, url, filter_radius=None):
+    def __init__(
+        self,
+        home_coordinates,
+        url,
+        filter_radius=None,
+        fetch_policy=None,
+        http_cache=None,
+        skip_unchanged=False,
+        distance_model=DISTANCE_HAVERSINE,
+        mapping: FeedMapping = None,
+        transport=None,
+        keep_last_data=False,
+    ):
         """Initialise this service."""
-        super().__init__(home_coordinates, url, filter_radius=filter_radius)
+        super().__init__(
+            home_coordinates,
+            url,
+            filter_radius=filter_radius,
+            fetch_policy=fetch_policy,
+            http_cache=http_cache,
+            skip_unchanged=skip_unchanged,
+            distance_model=distance_model,
+            transport=transport,
+            keep_last_data=keep_last_data,
+        )
+        self._mapping = mapping or DEFAULT_MAPPING
 
     def _new_entry(self, home_coordinates, feature, global_data):
         """Generate a new entry."""
-        return GenericFeedEntry(home_coordinates, feature)
+        return GenericFeedEntry(home_coordinates, feature, mapping=self._mapping)
+
+    def _extract_last_timestamp(self, feed_entries):
+        """Determine latest (newest) entry from the filtered feed."""
+        if self._mapping.has_timestamp:
+            timestamps = [entry.timestamp for entry in feed_entries if entry.timestamp]
+            if timestamps:
+                return max(timestamps)
+        return None
+
+    @property
+    def mapping(self) -> FeedMapping:
+        """Return the mapping of features to entry fields of this feed."""
+        return self._mapping
 
 
 class GenericFeedEntry(FeedEntry):
     """Generic feed entry."""
 
-    def __init__(self, home_coordinates, feature):
+    def __init__(self, home_coordinates, feature, mapping: FeedMapping = None):
         """Initialise this service."""
         super().__init__(home_coordinates, feature)
+        self._mapping = mapping or DEFAULT_MAPPING
+        self._fields = None
+
+    @property
+    def fields(self) -> MappedFields:
+        """Return the fields of this entry, extracted on first access."""
+        if self._fields is None:
+            self._fields = self._mapping.extract(
+                self._feature, lambda: self.coordinates
+            )
+        return self._fields
 
     @property
     def title(self) -> str:
         """Return the title of this entry."""
-        return self._search_in_properties(ATTR_TITLE)
+        return self.fields.title
 
     @property
     def external_id(self) -> str:
         """Return the external id of this entry."""
-        """Find a suitable ID for the provided entry."""
-        external_id = self._search_in_feature(ATTR_ID)
-        if not external_id:
-            external_id = self._search_in_properties(ATTR_ID)
-        if not external_id:
-            external_id = self._search_in_properties(ATTR_GUID)
-        if not external_id:
-            external_id = self.title
-        if not external_id:
-            # Use geometry as ID as a fallback.
-            external_id = hash(self.coordinates)
-        return external_id
+        return self.fields.external_id
+
+    @property
+    def external_id_from_coordinates(self) -> bool:
+        """Return True if the external id was derived from the coordinates."""
+        return self.fields.id_from_coordinates
+
+    @property
+    def timestamp(self) -> Optional[datetime]:
+        """Return the timestamp of this entry."""
+        return self.fields.timestamp
+
+    @property
+    def category(self) -> Optional[str]:
+        """Return the category of this entry."""
+        return self.fields.category
+
+    @property
+    def numbers(self) -> Dict[str, Optional[float]]:
+        """Return the numeric fields of this entry by name."""
+        return self.fields.numbers
@@ -0,0 +1,906 @@
+"""
+Geometry engine.
+
+Calculates distances, centroids and bounding boxes of GeoJSON geometries
+with a kernel per geometry type. Polygons are prepared once for fast and
+exact distance calculations, and prepared polygons and calculated distances
+are kept across feed updates.
+"""
+import logging
+import math
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from geojson_client.distance import (
+    DISTANCE_HAVERSINE,
+    DISTANCE_MODELS,
+    EARTH_RADIUS,
+    DistanceModel,
+)
+
+_LOGGER = logging.getLogger(__name__)
+
+DEFAULT_CACHE_SIZE = 1024
+
+GEOMETRY_COLLECTION = "GeometryCollection"
+LINE_STRING = "LineString"
+MULTI_LINE_STRING = "MultiLineString"
+MULTI_POINT = "MultiPoint"
+MULTI_POLYGON = "MultiPolygon"
+POINT = "Point"
+POLYGON = "Polygon"
+
+
+def closest_point(chains, latitude: float, longitude: float) -> Tuple[float, float]:
+    """Return the closest point on any edge of the chains to the coordinates.
+
+    Each chain is a pair of lists of latitudes and longitudes. Edges are
+    great-circle arcs between consecutive positions, and the closest point
+    is found on the sphere.
+    """
+    point = _unit_vector(latitude, longitude)
+    arcs = [_vectors(latitudes, longitudes) for latitudes, longitudes in chains]
+    return _coordinates(_closest_on_arcs(arcs, point))
+
+
+def _unit_vector(latitude: float, longitude: float) -> Tuple[float, float, float]:
+    """Return the position on the unit sphere of the coordinates."""
+    phi, lam = math.radians(latitude), math.radians(longitude)
+    cos_phi = math.cos(phi)
+    return cos_phi * math.cos(lam), cos_phi * math.sin(lam), math.sin(phi)
+
+
+def _vectors(latitudes, longitudes) -> List[Tuple[float, float, float]]:
+    """Return the positions on the unit sphere of the coordinates."""
+    return [
+        _unit_vector(latitude, longitude)
+        for latitude, longitude in zip(latitudes, longitudes)
+    ]
+
+
+def _coordinates(vector) -> Tuple[float, float]:
+    """Return the latitude and longitude of a position on the sphere."""
+    x, y, z = vector
+    return (
+        math.degrees(math.atan2(z, math.hypot(x, y))),
+        math.degrees(math.atan2(y, x)),
+    )
+
+
+def _dot(u, v) -> float:
+    """Return the dot product of two vectors."""
+    return u[0] * v[0] + u[1] * v[1] + u[2] * v[2]
+
+
+def _cross(u, v) -> Tuple[float, float, float]:
+    """Return the cross product of two vectors."""
+    return (
+        u[1] * v[2] - u[2] * v[1],
+        u[2] * v[0] - u[0] * v[2],
+        u[0] * v[1] - u[1] * v[0],
+    )
+
+
+def _closest_on_arcs(arcs, point) -> Tuple[float, float, float]:
+    """Return the position on any arc of the chains closest to the point.
+
+    The closest position has the largest dot product with the point. It is
+    either a vertex, or the projection of the point onto the great circle
+    of an arc, if that falls between the arc's ends.
+    """
+    best = -math.inf
+    closest = point
+    for vertices in arcs:
+        for start, end in zip(vertices, vertices[1:]):
+            normal = _cross(start, end)
+            squared = _dot(normal, normal)
+            if squared < 1e-24:
+                continue
+            factor = _dot(point, normal) / squared
+            projection = tuple(p - factor * n for p, n in zip(point, normal))
+            if (
+                _dot(_cross(start, projection), normal) < 0
+                or _dot(_cross(projection, end), normal) < 0
+            ):
+                # Beyond the ends of the arc.
+                continue
+            # The dot product of the point and the normalised projection.
+            length = math.sqrt(_dot(projection, projection))
+            if length > best:
+                best = length
+                closest = tuple(value / length for value in projection)
+        for vertex in vertices:
+            dot = _dot(point, vertex)
+            if dot > best:
+                best = dot
+                closest = vertex
+    return closest
+
+
+def _chain(positions) -> Tuple[List[float], List[float]]:
+    """Return the latitudes and longitudes of the positions."""
+    return (
+        [float(position[1]) for position in positions],
+        [float(position[0]) for position in positions],
+    )
+
+
+def _lower_bound_angles(home_coordinates, bboxes) -> List[float]:
+    """Return the angles in radians that the bounding boxes are at least
+    away from home."""
+    latitude, longitude = home_coordinates[0], home_coordinates[1]
+    cos_latitude = math.cos(math.radians(latitude))
+    angles = []
+    for min_latitude, min_longitude, max_latitude, max_longitude in bboxes:
+        # Any path to the bounding box crosses its latitudes...
+        latitude_gap = max(0.0, min_latitude - latitude, latitude - max_latitude)
+        angle = math.radians(latitude_gap)
+        if not min_longitude <= longitude <= max_longitude:
+            # ...and reaches one of its bounding meridians.
+            longitude_gap = min(
+                (min_longitude - longitude) % 360.0, (longitude - max_longitude) % 360.0
+            )
+            longitude_gap = math.radians(min(longitude_gap, 90.0))
+            angle = max(
+                angle, math.asin(min(1.0, cos_latitude * math.sin(longitude_gap)))
+            )
+        angles.append(angle)
+    return angles
+
+
+class LruCache:
+    """Thread-safe mapping that keeps the most recently used items."""
+
+    def __init__(self, max_size: int = DEFAULT_CACHE_SIZE):
+        """Initialise this cache."""
+        self._max_size = max_size
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __repr__(self):
+        """Return string representation of this cache."""
+        return "<{}(size={}, max_size={}, hits={}, misses={})>".format(
+            self.__class__.__name__,
+            len(self._items),
+            self._max_size,
+            self.hits,
+            self.misses,
+        )
+
+    def __len__(self):
+        """Return the number of cached items."""
+        return len(self._items)
+
+    def get(self, key):
+        """Return the cached item, or None."""
+        with self._lock:
+            value = self._items.get(key)
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._items.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        """Cache the item, evicting the least recently used ones."""
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self._max_size:
+                self._items.popitem(last=False)
+
+    def clear(self):
+        """Remove all cached items and reset the statistics."""
+        with self._lock:
+            self._items.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+_NORTH_POLE = (0.0, 0.0, 1.0)
+_SOUTH_POLE = (0.0, 0.0, -1.0)
+
+
+class PreparedPolygon:
+    """Polygon with precomputed structures for distance calculations.
+
+    Rings are given in GeoJSON order: the exterior ring first, followed by
+    any holes, each as a list of [longitude, latitude] positions. Edges are
+    great-circle arcs, both for the point-in-polygon test and for the
+    closest point. Polygons must not contain a pole or cross the
+    antimeridian.
+    """
+
+    __slots__ = ("_rings", "_arcs", "_normals", "_bbox", "_bounds", "key")
+
+    def __init__(self, rings: Sequence[Sequence[Sequence[float]]], key: tuple = None):
+        """Initialise this polygon."""
+        self.key = key
+        self._rings = []
+        min_latitude = min_longitude = math.inf
+        max_latitude = max_longitude = -math.inf
+        for ring in rings:
+            latitudes, longitudes = _chain(ring)
+            if not latitudes:
+                continue
+            if (latitudes[0], longitudes[0]) != (latitudes[-1], longitudes[-1]):
+                # Close the ring.
+                latitudes.append(latitudes[0])
+                longitudes.append(longitudes[0])
+            self._rings.append((latitudes, longitudes))
+            if len(self._rings) == 1:
+                # Holes are inside the exterior ring.
+                min_latitude, max_latitude = min(latitudes), max(latitudes)
+                min_longitude, max_longitude = min(longitudes), max(longitudes)
+        self._bbox = (min_latitude, min_longitude, max_latitude, max_longitude)
+        self._arcs = [
+            _vectors(latitudes, longitudes) for latitudes, longitudes in self._rings
+        ]
+        self._normals = [
+            [_cross(start, end) for start, end in zip(vertices, vertices[1:])]
+            for vertices in self._arcs
+        ]
+        self._bounds = self._bbox
+        if self._arcs:
+            # Edges between vertices bulge towards the poles, beyond the
+            # latitudes of their vertices.
+            self._bounds = (
+                min(
+                    min_latitude,
+                    _coordinates(_closest_on_arcs(self._arcs[:1], _SOUTH_POLE))[0],
+                ),
+                min_longitude,
+                max(
+                    max_latitude,
+                    _coordinates(_closest_on_arcs(self._arcs[:1], _NORTH_POLE))[0],
+                ),
+                max_longitude,
+            )
+
+    def __repr__(self):
+        """Return string representation of this polygon."""
+        return "<{}(rings={}, bbox={})>".format(
+            self.__class__.__name__, len(self._rings), self._bbox
+        )
+
+    @property
+    def bbox(self) -> Tuple[float, float, float, float]:
+        """Return (min latitude, min longitude, max latitude, max longitude)
+        of the positions."""
+        return self._bbox
+
+    @property
+    def bounds(self) -> Tuple[float, float, float, float]:
+        """Return the bounding box of the edges, which extends beyond the
+        positions where edges bulge towards the poles."""
+        return self._bounds
+
+    def contains(self, latitude: float, longitude: float) -> bool:
+        """Return True if the coordinates are inside this polygon."""
+        min_latitude, min_longitude, max_latitude, max_longitude = self._bounds
+        if not (
+            min_latitude <= latitude <= max_latitude
+            and min_longitude <= longitude <= max_longitude
+        ):
+            return False
+        phi = math.radians(latitude)
+        cos_lambda = math.cos(math.radians(longitude))
+        sin_lambda = math.sin(math.radians(longitude))
+        inside = False
+        # Even-odd rule across all rings, so that holes are excluded, counting
+        # the edges that cross the meridian north of the coordinates.
+        for (_, longitudes), normals in zip(self._rings, self._normals):
+            offsets = [
+                (value - longitude + 180.0) % 360.0 - 180.0 for value in longitudes
+            ]
+            for index, normal in enumerate(normals):
+                offset1, offset2 = offsets[index], offsets[index + 1]
+                if (
+                    (offset1 > 0) != (offset2 > 0)
+                    and abs(offset1 - offset2) < 180.0
+                    and normal[2]
+                ):
+                    # The latitude where the edge's great circle crosses the
+                    # meridian.
+                    crossing = math.atan(
+                        -(normal[0] * cos_lambda + normal[1] * sin_lambda) / normal[2]
+                    )
+                    if crossing > phi:
+                        inside = not inside
+        return inside
+
+    def lower_bound(self, home_coordinates, model: DistanceModel = None) -> float:
+        """Return a distance in km that the polygon is at least away."""
+        scale = model.lower_bound_scale if model else 1.0
+        return (
+            EARTH_RADIUS
+            * scale
+            * _lower_bound_angles(home_coordinates, [self._bounds])[0]
+        )
+
+    def distance(
+        self,
+        home_coordinates,
+        max_distance: Optional[float] = None,
+        model: DistanceModel = None,
+    ):
+        """Return the distance in km between home coordinates and this polygon.
+
+        The distance is 0 if home is inside the polygon, otherwise the
+        distance to the closest point on any edge. If the polygon is
+        certainly further away than `max_distance`, a lower bound greater
+        than `max_distance` is returned instead.
+        """
+        model = model or DISTANCE_MODELS[DISTANCE_HAVERSINE]
+        if max_distance is not None:
+            bound = self.lower_bound(home_coordinates, model)
+            if bound > max_distance:
+                return bound
+        distance, error = self.estimate(home_coordinates, model)
+        if error and max_distance is not None and abs(distance - max_distance) <= error:
+            return self.estimate(home_coordinates)[0]
+        return distance
+
+    def estimate(self, home_coordinates, model: DistanceModel = None):
+        """Return the distance in km between home coordinates and this polygon,
+        and the maximum error of the distance."""
+        model = model or DISTANCE_MODELS[DISTANCE_HAVERSINE]
+        if not self._rings:
+            return math.inf, 0.0
+        latitude, longitude = home_coordinates[0], home_coordinates[1]
+        if self.contains(latitude, longitude):
+            return 0.0, 0.0
+        closest = _closest_on_arcs(self._arcs, _unit_vector(latitude, longitude))
+        return model.estimate(latitude, longitude, *_coordinates(closest))
+
+
+_PREPARED_POLYGONS = LruCache()
+_POLYGON_DISTANCES = LruCache(8 * DEFAULT_CACHE_SIZE)
+# Prepared polygons by the identity of their rings, so that the key of a
+# feature's polygon is only built once, although its distance, bounding box
+# and distance within the filter radius are looked up separately. The rings
+# are kept to make sure their identity is not reused.
+_PREPARED_BY_RINGS = LruCache()
+
+
+def polygon_key(rings) -> tuple:
+    """Return a hashable key identifying the polygon with these rings."""
+    return tuple(tuple(map(tuple, ring)) for ring in rings)
+
+
+def prepare_polygon(rings, key: tuple = None) -> PreparedPolygon:
+    """Return the prepared polygon, reusing it if prepared before.
+
+    The rings must not be modified after they were prepared.
+    """
+    if key is None:
+        known = _PREPARED_BY_RINGS.get(id(rings))
+        if known is not None and known[0] is rings:
+            return known[1]
+        key = polygon_key(rings)
+    prepared = _PREPARED_POLYGONS.get(key)
+    if prepared is None:
+        prepared = PreparedPolygon(rings, key)
+        _PREPARED_POLYGONS.put(key, prepared)
+    _PREPARED_BY_RINGS.put(id(rings), (rings, prepared))
+    return prepared
+
+
+def distance_to_polygon(
+    home_coordinates,
+    rings,
+    max_distance: Optional[float] = None,
+    model: DistanceModel = None,
+) -> float:
+    """Return the distance in km between home coordinates and the polygon.
+
+    Polygons and their distances to home are cached, so that unchanged
+    polygons are not processed again on the next update. Distances are
+    cached with their maximum error, and checked again with the haversine
+    distance if they are within that error of `max_distance`. If the polygon
+    is certainly further away than `max_distance`, a lower bound greater
+    than `max_distance` may be returned instead.
+    """
+    return _prepared_distance(
+        home_coordinates,
+        prepare_polygon(rings),
+        max_distance,
+        model or DISTANCE_MODELS[DISTANCE_HAVERSINE],
+    )
+
+
+def _prepared_distance(
+    home_coordinates, prepared: PreparedPolygon, max_distance, model, bound=None
+) -> float:
+    """Return the distance in km between home coordinates and the prepared
+    polygon, with its lower bound if already calculated."""
+    distance_key = (prepared.key, tuple(home_coordinates), model.name)
+    estimate = _POLYGON_DISTANCES.get(distance_key)
+    if estimate is None:
+        if max_distance is not None:
+            if bound is None:
+                bound = prepared.lower_bound(home_coordinates, model)
+            if bound > max_distance:
+                # Lower bounds are not cached.
+                return bound
+        estimate = prepared.estimate(home_coordinates, model)
+        _POLYGON_DISTANCES.put(distance_key, estimate)
+    distance, error = estimate
+    if error and max_distance is not None and abs(distance - max_distance) <= error:
+        distance = prepared.estimate(home_coordinates)[0]
+        _POLYGON_DISTANCES.put(distance_key, (distance, 0.0))
+    return distance
+
+
+def clear_caches():
+    """Remove all prepared polygons and cached distances."""
+    _PREPARED_POLYGONS.clear()
+    _POLYGON_DISTANCES.clear()
+    _PREPARED_BY_RINGS.clear()
+
+
+def _member(geometry, name):
+    """Return a member of a GeoJSON object or of a plain dictionary."""
+    value = getattr(geometry, name, None)
+    if value is None and isinstance(geometry, dict):
+        value = geometry.get(name)
+    return value
+
+
+def _bbox_of_positions(positions) -> Optional[Tuple[float, float, float, float]]:
+    """Return the bounding box of the positions."""
+    latitudes, longitudes = _chain(positions)
+    if not latitudes:
+        return None
+    return min(latitudes), min(longitudes), max(latitudes), max(longitudes)
+
+
+def _extent(chains) -> Tuple[Optional[Tuple[float, float, float, float]], float]:
+    """Return the bounding box of the chains' positions, and an angle in
+    radians that no edge is longer than."""
+    if not chains:
+        return None, 0.0
+    span = 0.0
+    for latitudes, longitudes in chains:
+        for index in range(len(latitudes) - 1):
+            longitude_gap = abs(longitudes[index + 1] - longitudes[index]) % 360.0
+            # Along the meridian, then along the parallel.
+            span = max(
+                span,
+                abs(latitudes[index + 1] - latitudes[index])
+                + min(longitude_gap, 360.0 - longitude_gap),
+            )
+    return (
+        (
+            min(min(latitudes) for latitudes, _ in chains),
+            min(min(longitudes) for _, longitudes in chains),
+            max(max(latitudes) for latitudes, _ in chains),
+            max(max(longitudes) for _, longitudes in chains),
+        ),
+        math.radians(span),
+    )
+
+
+def _union(bboxes) -> Optional[Tuple[float, float, float, float]]:
+    """Return the bounding box around all bounding boxes."""
+    bboxes = [bbox for bbox in bboxes if bbox is not None]
+    if not bboxes:
+        return None
+    return (
+        min(bbox[0] for bbox in bboxes),
+        min(bbox[1] for bbox in bboxes),
+        max(bbox[2] for bbox in bboxes),
+        max(bbox[3] for bbox in bboxes),
+    )
+
+
+def _mean(positions) -> Optional[Tuple[float, float]]:
+    """Return the mean latitude and longitude of the positions."""
+    latitudes, longitudes = _chain(positions)
+    if not latitudes:
+        return None
+    return sum(latitudes) / len(latitudes), sum(longitudes) / len(longitudes)
+
+
+class GeometryKernel:
+    """Calculations for one type of GeoJSON geometry.
+
+    Coordinates are (latitude, longitude) tuples, bounding boxes are
+    (min latitude, min longitude, max latitude, max longitude) tuples, and
+    distances are in km, calculated with the given distance model. The
+    batch methods process many geometries of the same type at once; by
+    default they call the single-item methods. The kernels for points,
+    lines and polygons calculate batches of distances at once.
+    """
+
+    def distance(
+        self, home_coordinates, geometry, max_distance=None, model=None
+    ) -> float:
+        """Return the distance between home coordinates and the geometry."""
+        raise NotImplementedError
+
+    def centroid(self, geometry) -> Optional[Tuple[float, float]]:
+        """Return the best coordinates of the geometry for display."""
+        raise NotImplementedError
+
+    def bbox(self, geometry) -> Optional[Tuple[float, float, float, float]]:
+        """Return the bounding box of the geometry."""
+        raise NotImplementedError
+
+    def distances(
+        self, home_coordinates, geometries, max_distance=None, model=None
+    ) -> List:
+        """Return the distances between home coordinates and the geometries."""
+        return [
+            self.distance(home_coordinates, geometry, max_distance, model)
+            for geometry in geometries
+        ]
+
+    def centroids(self, geometries) -> List:
+        """Return the best coordinates of the geometries for display."""
+        return [self.centroid(geometry) for geometry in geometries]
+
+    def bboxes(self, geometries) -> List:
+        """Return the bounding boxes of the geometries."""
+        return [self.bbox(geometry) for geometry in geometries]
+
+
+class PointKernel(GeometryKernel):
+    """Calculations for points."""
+
+    def distance(self, home_coordinates, geometry, max_distance=None, model=None):
+        """Return the distance between home coordinates and the point."""
+        position = _member(geometry, "coordinates")
+        return model.distance(
+            home_coordinates[0],
+            home_coordinates[1],
+            position[1],
+            position[0],
+            max_distance,
+        )
+
+    def centroid(self, geometry):
+        """Return the coordinates of the point."""
+        position = _member(geometry, "coordinates")
+        return position[1], position[0]
+
+    def bbox(self, geometry):
+        """Return the bounding box of the point."""
+        return _bbox_of_positions([_member(geometry, "coordinates")])
+
+    def distances(self, home_coordinates, geometries, max_distance=None, model=None):
+        """Return the distances between home coordinates and the points."""
+        return model.distances(
+            home_coordinates[0],
+            home_coordinates[1],
+            [_member(geometry, "coordinates") for geometry in geometries],
+            max_distance,
+        )
+
+
+class MultiPointKernel(GeometryKernel):
+    """Calculations for multiple points."""
+
+    def distance(self, home_coordinates, geometry, max_distance=None, model=None):
+        """Return the distance between home coordinates and the closest point."""
+        return min(
+            model.distances(
+                home_coordinates[0],
+                home_coordinates[1],
+                _member(geometry, "coordinates"),
+                max_distance,
+            ),
+            default=math.inf,
+        )
+
+    def centroid(self, geometry):
+        """Return the mean coordinates of the points."""
+        return _mean(_member(geometry, "coordinates"))
+
+    def bbox(self, geometry):
+        """Return the bounding box of the points."""
+        return _bbox_of_positions(_member(geometry, "coordinates"))
+
+
+class LineStringKernel(GeometryKernel):
+    """Calculations for lines."""
+
+    def _lines(self, geometry):
+        """Return the positions of all lines of the geometry."""
+        return [_member(geometry, "coordinates")]
+
+    def distance(self, home_coordinates, geometry, max_distance=None, model=None):
+        """Return the distance between home coordinates and the closest line."""
+        chains = [_chain(line) for line in self._lines(geometry) if line]
+        if not chains:
+            return math.inf
+        latitude, longitude = home_coordinates[0], home_coordinates[1]
+        return model.distance(
+            latitude,
+            longitude,
+            *closest_point(chains, latitude, longitude),
+            max_distance,
+        )
+
+    def distances(self, home_coordinates, geometries, max_distance=None, model=None):
+        """Return the distances between home coordinates and the closest lines.
+
+        Lines that are certainly further away than `max_distance` are ruled
+        out in one pass over all bounding boxes before calculating any
+        closest point, and their lower bound is returned instead.
+        """
+        groups = [
+            [_chain(line) for line in self._lines(geometry) if line]
+            for geometry in geometries
+        ]
+        bounds = [None] * len(groups)
+        if max_distance is not None:
+            extents = [_extent(chains) for chains in groups]
+            angles = _lower_bound_angles(
+                home_coordinates,
+                [bbox for bbox, _ in extents if bbox is not None],
+            )
+            scale = EARTH_RADIUS * model.lower_bound_scale
+            angles = iter(angles)
+            for index, (bbox, span) in enumerate(extents):
+                if bbox is not None:
+                    # Every point of an edge is at most half its length away
+                    # from one of its ends.
+                    bounds[index] = scale * max(0.0, next(angles) - span / 2)
+        latitude, longitude = home_coordinates[0], home_coordinates[1]
+        distances = []
+        for chains, bound in zip(groups, bounds):
+            if not chains:
+                distances.append(math.inf)
+            elif bound is not None and bound > max_distance:
+                distances.append(bound)
+            else:
+                distances.append(
+                    model.distance(
+                        latitude,
+                        longitude,
+                        *closest_point(chains, latitude, longitude),
+                        max_distance,
+                    )
+                )
+        return distances
+
+    def centroid(self, geometry):
+        """Return the mean coordinates of the lines' positions."""
+        return _mean([position for line in self._lines(geometry) for position in line])
+
+    def bbox(self, geometry):
+        """Return the bounding box of the lines."""
+        return _bbox_of_positions(
+            [position for line in self._lines(geometry) for position in line]
+        )
+
+
+class MultiLineStringKernel(LineStringKernel):
+    """Calculations for multiple lines."""
+
+    def _lines(self, geometry):
+        """Return the positions of all lines of the geometry."""
+        return _member(geometry, "coordinates")
+
+
+class PolygonKernel(GeometryKernel):
+    """Calculations for polygons with optional holes."""
+
+    def _polygons(self, geometry):
+        """Return the rings of all polygons of the geometry."""
+        return [_member(geometry, "coordinates")]
+
+    def distance(self, home_coordinates, geometry, max_distance=None, model=None):
+        """Return the distance between home coordinates and the polygons."""
+        return min(
+            (
+                distance_to_polygon(home_coordinates, rings, max_distance, model)
+                for rings in self._polygons(geometry)
+                if rings
+            ),
+            default=math.inf,
+        )
+
+    def distances(self, home_coordinates, geometries, max_distance=None, model=None):
+        """Return the distances between home coordinates and the polygons.
+
+        All polygons are prepared first, and those that are certainly
+        further away than `max_distance` are ruled out in one pass over all
+        bounding boxes before calculating any closest point.
+        """
+        groups = [
+            [prepare_polygon(rings) for rings in self._polygons(geometry) if rings]
+            for geometry in geometries
+        ]
+        bounds = None
+        if max_distance is not None:
+            scale = EARTH_RADIUS * model.lower_bound_scale
+            bounds = iter(
+                [
+                    scale * angle
+                    for angle in _lower_bound_angles(
+                        home_coordinates,
+                        [prepared.bounds for group in groups for prepared in group],
+                    )
+                ]
+            )
+        distances = []
+        for group in groups:
+            distance = math.inf
+            for prepared in group:
+                bound = next(bounds) if bounds is not None else None
+                if bound is None or bound <= max_distance:
+                    bound = _prepared_distance(
+                        home_coordinates, prepared, max_distance, model, bound
+                    )
+                distance = min(distance, bound)
+            distances.append(distance)
+        return distances
+
+    def centroid(self, geometry):
+        """Return the mean coordinates of the exterior rings' positions."""
+        return _mean(
+            [
+                position
+                for rings in self._polygons(geometry)
+                if rings
+                for position in rings[0]
+            ]
+        )
+
+    def bbox(self, geometry):
+        """Return the bounding box of the polygons."""
+        return _union(
+            prepare_polygon(rings).bbox
+            for rings in self._polygons(geometry)
+            if rings and rings[0]
+        )
+
+
+class MultiPolygonKernel(PolygonKernel):
+    """Calculations for multiple polygons."""
+
+    def _polygons(self, geometry):
+        """Return the rings of all polygons of the geometry."""
+        return _member(geometry, "coordinates")
+
+
+class GeometryCollectionKernel(GeometryKernel):
+    """Calculations for collections of geometries."""
+
+    def distance(self, home_coordinates, geometry, max_distance=None, model=None):
+        """Return the distance between home coordinates and the closest
+        geometry."""
+        return min(
+            distances(
+                home_coordinates,
+                _member(geometry, "geometries"),
+                max_distance,
+                model.name,
+            ),
+            default=math.inf,
+        )
+
+    def centroid(self, geometry):
+        """Return the coordinates of the first suitable geometry."""
+        for entry in _member(geometry, "geometries"):
+            coordinates = centroid(entry)
+            if coordinates is not None:
+                return coordinates
+        return None
+
+    def bbox(self, geometry):
+        """Return the bounding box of all geometries."""
+        return _union(bboxes(_member(geometry, "geometries")))
+
+
+KERNELS: Dict[str, GeometryKernel] = {
+    POINT: PointKernel(),
+    MULTI_POINT: MultiPointKernel(),
+    LINE_STRING: LineStringKernel(),
+    MULTI_LINE_STRING: MultiLineStringKernel(),
+    POLYGON: PolygonKernel(),
+    MULTI_POLYGON: MultiPolygonKernel(),
+    GEOMETRY_COLLECTION: GeometryCollectionKernel(),
+}
+
+
+def register_kernel(geometry_type: str, kernel: GeometryKernel):
+    """Register the kernel for the GeoJSON geometry type."""
+    KERNELS[geometry_type] = kernel
+
+
+def geometry_type(geometry) -> Optional[str]:
+    """Return the GeoJSON type of the geometry, if a kernel supports it."""
+    # Objects of the geojson library (and mocks of them) are recognised by
+    # their class, plain dictionaries by their "type" member.
+    for cls in geometry.__class__.__mro__:
+        if cls.__name__ in KERNELS:
+            return cls.__name__
+    if isinstance(geometry, dict) and geometry.get("type") in KERNELS:
+        return geometry["type"]
+    return None
+
+
+def _kernel(geometry) -> Optional[GeometryKernel]:
+    """Return the kernel for the geometry."""
+    name = geometry_type(geometry)
+    if name is None:
+        _LOGGER.debug("Not implemented: %s", type(geometry))
+        return None
+    return KERNELS[name]
+
+
+def distance(
+    home_coordinates, geometry, max_distance=None, model: str = DISTANCE_HAVERSINE
+) -> float:
+    """Return the distance in km between home coordinates and the geometry.
+
+    The distance is infinite for unsupported geometries. If the geometry is
+    certainly further away than `max_distance`, a lower bound greater than
+    `max_distance` may be returned instead.
+    """
+    kernel = _kernel(geometry)
+    if kernel is None:
+        return math.inf
+    return kernel.distance(
+        home_coordinates, geometry, max_distance, DISTANCE_MODELS[model]
+    )
+
+
+def centroid(geometry) -> Optional[Tuple[float, float]]:
+    """Return the best (latitude, longitude) of the geometry for display."""
+    kernel = _kernel(geometry)
+    return kernel.centroid(geometry) if kernel else None
+
+
+def bbox(geometry) -> Optional[Tuple[float, float, float, float]]:
+    """Return the bounding box of the geometry."""
+    kernel = _kernel(geometry)
+    return kernel.bbox(geometry) if kernel else None
+
+
+def _batch(geometries, calculate, default) -> List:
+    """Apply the batch calculation to the geometries grouped by type."""
+    results = [default] * len(geometries)
+    groups = {}
+    for index, geometry in enumerate(geometries):
+        name = geometry_type(geometry)
+        if name is None:
+            _LOGGER.debug("Not implemented: %s", type(geometry))
+        else:
+            groups.setdefault(name, []).append(index)
+    for name, indexes in groups.items():
+        group_results = calculate(KERNELS[name], [geometries[i] for i in indexes])
+        for index, result in zip(indexes, group_results):
+            results[index] = result
+    return results
+
+
+def distances(
+    home_coordinates, geometries, max_distance=None, model: str = DISTANCE_HAVERSINE
+) -> List[float]:
+    """Return the distances between home coordinates and the geometries."""
+    distance_model = DISTANCE_MODELS[model]
+    return _batch(
+        geometries,
+        lambda kernel, group: kernel.distances(
+            home_coordinates, group, max_distance, distance_model
+        ),
+        math.inf,
+    )
+
+
+def centroids(geometries) -> List[Optional[Tuple[float, float]]]:
+    """Return the best coordinates of the geometries for display."""
+    return _batch(geometries, lambda kernel, group: kernel.centroids(group), None)
+
+
+def bboxes(geometries) -> List[Optional[Tuple[float, float, float, float]]]:
+    """Return the bounding boxes of the geometries."""
+    return _batch(geometries, lambda kernel, group: kernel.bboxes(group), None)
@@ -0,0 +1,206 @@
+"""
+Entry history.
+
+Bounded in-memory history of entries that were removed from a feed or
+replaced by a newer version, so that short-window feeds can be polled while
+recent history remains queryable.
+"""
+import bisect
+import json
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional
+
+REASON_REMOVED = "removed"
+REASON_SUPERSEDED = "superseded"
+
+_RECORD_OVERHEAD = 200
+
+
+class HistoryRecord:
+    """Compact record of a previous version of an entry.
+
+    The feature is kept as compact JSON and only decoded when requested.
+    """
+
+    __slots__ = (
+        "external_id",
+        "reason",
+        "generation",
+        "recorded",
+        "title",
+        "coordinates",
+        "_encoded",
+    )
+
+    def __init__(
+        self,
+        external_id,
+        reason: str,
+        generation: int,
+        recorded: datetime,
+        title: Optional[str],
+        coordinates,
+        encoded: bytes,
+    ):
+        """Initialise this record."""
+        self.external_id = external_id
+        self.reason = reason
+        self.generation = generation
+        self.recorded = recorded
+        self.title = title
+        self.coordinates = coordinates
+        self._encoded = encoded
+
+    def __repr__(self):
+        """Return string representation of this record."""
+        return "<{}(external_id={}, reason={}, recorded={})>".format(
+            self.__class__.__name__, self.external_id, self.reason, self.recorded
+        )
+
+    @property
+    def feature(self) -> Dict:
+        """Return the GeoJSON feature of this version of the entry."""
+        return json.loads(self._encoded)
+
+    @property
+    def size(self) -> int:
+        """Return the approximate memory used by this record in bytes."""
+        return len(self._encoded) + _RECORD_OVERHEAD
+
+
+class EntryHistory:
+    """Bounded history of removed and superseded entries.
+
+    Records are evicted oldest first once they are older than `max_age`
+    seconds, or once there are more than `max_records` records or they use
+    more than `max_bytes` bytes. Records can be looked up by external id and
+    by the time they were recorded.
+    """
+
+    def __init__(
+        self,
+        max_age: Optional[float] = None,
+        max_records: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+    ):
+        """Initialise this history."""
+        self._max_age = max_age
+        self._max_records = max_records
+        self._max_bytes = max_bytes
+        # Records in the order they were recorded, with their timestamps in
+        # a parallel list for bisecting. Evicted records before `_start` are
+        # dropped in bulk.
+        self._records = []
+        self._times = []
+        self._start = 0
+        self._by_id = {}
+        self._bytes = 0
+        self._encode = json.JSONEncoder(
+            separators=(",", ":"), ensure_ascii=False, default=str
+        ).encode
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        """Return string representation of this history."""
+        return "<{}(records={}, size={})>".format(
+            self.__class__.__name__, len(self), self._bytes
+        )
+
+    def __len__(self) -> int:
+        """Return the number of records."""
+        return len(self._records) - self._start
+
+    @property
+    def size(self) -> int:
+        """Return the approximate memory used by all records in bytes."""
+        return self._bytes
+
+    def record(self, entry, reason: str, generation: int = 0, external_id=None):
+        """Record a previous version of an entry."""
+        external_id = entry.external_id if external_id is None else external_id
+        record = HistoryRecord(
+            external_id,
+            reason,
+            generation,
+            datetime.now(),
+            entry.title,
+            entry.coordinates,
+            self._encode(entry.feature).encode("utf-8"),
+        )
+        with self._lock:
+            if self._times and record.recorded < self._times[-1]:
+                # Keep the time index sorted if the clock went backwards.
+                record.recorded = self._times[-1]
+            self._records.append(record)
+            self._times.append(record.recorded)
+            self._by_id.setdefault(external_id, []).append(record)
+            self._bytes += record.size
+            self._evict(record.recorded)
+        return record
+
+    def for_id(self, external_id) -> List[HistoryRecord]:
+        """Return the records of an entry, oldest first."""
+        with self._lock:
+            self._evict(datetime.now())
+            return list(self._by_id.get(external_id, ()))
+
+    def between(
+        self, start: Optional[datetime] = None, end: Optional[datetime] = None
+    ) -> List[HistoryRecord]:
+        """Return the records recorded from `start` up to `end`, oldest
+        first."""
+        with self._lock:
+            self._evict(datetime.now())
+            low = self._start
+            if start is not None:
+                low = bisect.bisect_left(self._times, start, low)
+            high = len(self._records)
+            if end is not None:
+                high = bisect.bisect_right(self._times, end, low)
+            return self._records[low:high]
+
+    def clear(self):
+        """Remove all records."""
+        with self._lock:
+            self._records = []
+            self._times = []
+            self._start = 0
+            self._by_id = {}
+            self._bytes = 0
+
+    def _evict(self, now: datetime):
+        """Evict the oldest records that exceed any of the limits."""
+        records = self._records
+        start = self._start
+        end = len(records)
+        if self._max_age is not None:
+            while (
+                start < end
+                and (now - records[start].recorded).total_seconds() > self._max_age
+            ):
+                start = self._drop(start)
+        if self._max_records is not None:
+            while end - start > self._max_records:
+                start = self._drop(start)
+        if self._max_bytes is not None:
+            while start < end and self._bytes > self._max_bytes:
+                start = self._drop(start)
+        if start > 1024 and start * 2 > end:
+            del records[:start]
+            del self._times[:start]
+            start = 0
+        self._start = start
+
+    def _drop(self, index: int) -> int:
+        """Drop the record at the index from the indexes, and return the
+        index of the next record."""
+        record = self._records[index]
+        self._records[index] = None
+        self._bytes -= record.size
+        records = self._by_id[record.external_id]
+        # Records of an entry are evicted in the order they were recorded.
+        del records[0]
+        if not records:
+            del self._by_id[record.external_id]
+        return index + 1
@@ -0,0 +1,273 @@
+"""
+HTTP cache.
+
+Keeps responses from feeds for as long as the server allows, so that polls
+can be served without any network traffic.
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+_LOGGER = logging.getLogger(__name__)
+
+HEADER_AGE = "age"
+HEADER_CACHE_CONTROL = "cache-control"
+HEADER_DATE = "date"
+HEADER_ETAG = "etag"
+HEADER_EXPIRES = "expires"
+HEADER_LAST_MODIFIED = "last-modified"
+
+
+def _parse_cache_control(value: Optional[str]) -> Dict[str, Optional[str]]:
+    """Parse the directives of a Cache-Control header."""
+    directives = {}
+    if value:
+        for directive in value.split(","):
+            name, _, argument = directive.strip().partition("=")
+            if name:
+                directives[name.lower()] = argument.strip('"') or None
+    return directives
+
+
+def _parse_http_date(value: Optional[str]) -> Optional[float]:
+    """Parse an HTTP date into seconds since the epoch."""
+    if value:
+        from email.utils import (  # pylint: disable=import-outside-toplevel
+            parsedate_to_datetime,
+        )
+
+        try:
+            return parsedate_to_datetime(value).timestamp()
+        except (TypeError, ValueError, IndexError):
+            _LOGGER.debug("Unable to parse date %s", value)
+    return None
+
+
+def freshness_lifetime(headers: Dict[str, str]) -> float:
+    """Return the number of seconds a response with these headers is fresh."""
+    cache_control = _parse_cache_control(headers.get(HEADER_CACHE_CONTROL))
+    if "no-cache" in cache_control:
+        return 0.0
+    lifetime = None
+    if cache_control.get("max-age"):
+        try:
+            lifetime = float(cache_control["max-age"])
+        except ValueError:
+            lifetime = 0.0
+    else:
+        expires = _parse_http_date(headers.get(HEADER_EXPIRES))
+        if expires is not None:
+            date = _parse_http_date(headers.get(HEADER_DATE)) or time.time()
+            lifetime = expires - date
+    if lifetime is None:
+        return 0.0
+    try:
+        age = float(headers.get(HEADER_AGE) or 0)
+    except ValueError:
+        age = 0.0
+    return max(0.0, lifetime - age)
+
+
+class CachedResponse:
+    """A response kept in the HTTP cache."""
+
+    ok = True
+    status_code = 200
+
+    def __init__(self, url: str, text: str, headers: Dict[str, str], expires_at):
+        """Initialise this cached response."""
+        self.url = url
+        self.text = text
+        self.headers = headers
+        self.expires_at = expires_at
+        self.version = hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+    def __repr__(self):
+        """Return string representation of this cached response."""
+        return "<{}(url={}, version={}, fresh={})>".format(
+            self.__class__.__name__, self.url, self.version, self.is_fresh()
+        )
+
+    @property
+    def content(self) -> bytes:
+        """Return the body of this response."""
+        return self.text.encode("utf-8")
+
+    @property
+    def size(self) -> int:
+        """Return the approximate size of this response in bytes."""
+        return len(self.text)
+
+    def is_fresh(self) -> bool:
+        """Return True if this response can be used without revalidation."""
+        return time.time() < self.expires_at
+
+    def validators(self) -> Dict[str, str]:
+        """Return the headers for revalidating this response."""
+        validators = {}
+        if self.headers.get(HEADER_ETAG):
+            validators["If-None-Match"] = self.headers[HEADER_ETAG]
+        if self.headers.get(HEADER_LAST_MODIFIED):
+            validators["If-Modified-Since"] = self.headers[HEADER_LAST_MODIFIED]
+        return validators
+
+
+class HttpCache:
+    """Bounded in-memory HTTP cache, optionally backed by a directory.
+
+    Responses are evicted in least recently used order once more than
+    `max_entries` responses or more than `max_bytes` of response bodies are
+    kept. A cache can be shared by multiple feeds.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 100,
+        max_bytes: int = 64 * 1024 * 1024,
+        directory: Optional[str] = None,
+    ):
+        """Initialise this HTTP cache."""
+        self._max_entries = max_entries
+        self._max_bytes = max_bytes
+        self._directory = directory
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def __repr__(self):
+        """Return string representation of this HTTP cache."""
+        return "<{}(entries={}, bytes={}, directory={})>".format(
+            self.__class__.__name__, len(self._entries), self._size, self._directory
+        )
+
+    def __len__(self):
+        """Return the number of cached responses."""
+        return len(self._entries)
+
+    def get(self, url: str) -> Optional[CachedResponse]:
+        """Return the cached response for the URL, if any."""
+        with self._lock:
+            entry = self._entries.get(url)
+            if entry:
+                self._entries.move_to_end(url)
+                return entry
+        entry = self._load(url)
+        if entry:
+            self._add(entry)
+        return entry
+
+    def store(self, url: str, response) -> Optional[CachedResponse]:
+        """Store a response, unless the server does not allow it."""
+        headers = {name.lower(): value for name, value in response.headers.items()}
+        if "no-store" in _parse_cache_control(headers.get(HEADER_CACHE_CONTROL)):
+            self.remove(url)
+            return None
+        entry = CachedResponse(
+            url, response.text, headers, time.time() + freshness_lifetime(headers)
+        )
+        self._add(entry)
+        self._save(entry)
+        return entry
+
+    def revalidate(self, entry: CachedResponse, response) -> CachedResponse:
+        """Refresh a cached response after the server confirmed it (304)."""
+        headers = dict(entry.headers)
+        headers.update(
+            {name.lower(): value for name, value in response.headers.items()}
+        )
+        refreshed = CachedResponse(
+            entry.url, entry.text, headers, time.time() + freshness_lifetime(headers)
+        )
+        self._add(refreshed)
+        self._save(refreshed)
+        return refreshed
+
+    def remove(self, url: str):
+        """Remove the cached response for the URL."""
+        with self._lock:
+            entry = self._entries.pop(url, None)
+            if entry:
+                self._size -= entry.size
+        self._delete(url)
+
+    def _add(self, entry: CachedResponse):
+        """Add the entry and evict the least recently used ones if necessary."""
+        evicted = []
+        with self._lock:
+            previous = self._entries.pop(entry.url, None)
+            if previous:
+                self._size -= previous.size
+            self._entries[entry.url] = entry
+            self._size += entry.size
+            while len(self._entries) > 1 and (
+                len(self._entries) > self._max_entries or self._size > self._max_bytes
+            ):
+                url, evicted_entry = self._entries.popitem(last=False)
+                self._size -= evicted_entry.size
+                evicted.append(url)
+        for url in evicted:
+            _LOGGER.debug("Evicted %s from cache", url)
+            self._delete(url)
+
+    def _path(self, url: str) -> str:
+        """Return the path of the file for the URL."""
+        return os.path.join(
+            self._directory, hashlib.sha256(url.encode("utf-8")).hexdigest() + ".json"
+        )
+
+    def _load(self, url: str) -> Optional[CachedResponse]:
+        """Load the cached response for the URL from the directory."""
+        if not self._directory:
+            return None
+        try:
+            with open(self._path(url), encoding="utf-8") as cache_file:
+                data = json.load(cache_file)
+            return CachedResponse(
+                url, data["text"], data["headers"], data["expires_at"]
+            )
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError) as load_ex:
+            _LOGGER.warning("Unable to load cached response for %s: %s", url, load_ex)
+            return None
+
+    def _save(self, entry: CachedResponse):
+        """Save the cached response to the directory."""
+        if not self._directory:
+            return
+        path = self._path(entry.url)
+        try:
+            with open(path + ".tmp", "w", encoding="utf-8") as cache_file:
+                json.dump(
+                    {
+                        "text": entry.text,
+                        "headers": entry.headers,
+                        "expires_at": entry.expires_at,
+                    },
+                    cache_file,
+                )
+            os.replace(path + ".tmp", path)
+        except OSError as save_ex:
+            _LOGGER.warning(
+                "Unable to save cached response for %s: %s", entry.url, save_ex
+            )
+
+    def _delete(self, url: str):
+        """Delete the cached response for the URL from the directory."""
+        if not self._directory:
+            return
+        try:
+            os.remove(self._path(url))
+        except FileNotFoundError:
+            pass
+        except OSError as delete_ex:
+            _LOGGER.warning(
+                "Unable to delete cached response for %s: %s", url, delete_ex
+            )
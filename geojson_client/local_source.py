@@ -0,0 +1,211 @@
+"""
+Local sources.
+
+Read GeoJSON feeds from local files, for example to replay archived
+incidents, instead of fetching them over HTTP.
+"""
+import mmap
+import os
+import re
+from json import JSONDecodeError
+from typing import Iterator, Optional, Tuple
+from urllib.parse import urlparse
+
+SCHEME_FILE = "file"
+
+_NON_WHITESPACE = re.compile(rb"\S")
+
+
+def local_path(url) -> Optional[str]:
+    """Return the local path of a file:// URL, a path object or an absolute
+    path, None for other URLs."""
+    if url is None:
+        return None
+    if isinstance(url, os.PathLike):
+        return os.fspath(url)
+    parsed = urlparse(url)
+    if parsed.scheme == SCHEME_FILE:
+        from urllib.request import (  # pylint: disable=import-outside-toplevel
+            url2pathname,
+        )
+
+        return url2pathname(parsed.path)
+    if os.path.isabs(url):
+        return url
+    return None
+
+
+class LocalSource:
+    """GeoJSON file on local disk.
+
+    The file is memory-mapped, so that the operating system pages it in as
+    it is read. It either contains a single FeatureCollection, or one feature
+    (or feature collection) per line (newline-delimited GeoJSON). The json
+    module needs the whole document in memory to decode a FeatureCollection,
+    while newline-delimited files are decoded line by line, slicing each line
+    straight from the mapping.
+    """
+
+    def __init__(self, path: str):
+        """Initialise this source."""
+        self._path = path
+
+    def __repr__(self):
+        """Return string representation of this source."""
+        return "<{}(path={})>".format(self.__class__.__name__, self._path)
+
+    @property
+    def path(self) -> str:
+        """Return the path of this source."""
+        return self._path
+
+    def version(self) -> Tuple[int, int, int]:
+        """Return a value that changes whenever the file changes."""
+        stat = os.stat(self._path)
+        return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+    def read(self):
+        """Return all features of the file as a FeatureCollection."""
+        import geojson  # pylint: disable=import-outside-toplevel
+
+        with self._map() as data:
+            items = list(self._items(data))
+        if len(items) == 1 and items[0].get("type") == "FeatureCollection":
+            # Keep the metadata of a single document.
+            return items[0]
+        return geojson.FeatureCollection(list(_flatten(items)))
+
+    def stream(self):
+        """Return the features of the file without decoding them all at once.
+
+        A single document is decoded and returned as it is. The features of a
+        newline-delimited file are returned as a `FeatureStream` instead,
+        which decodes them line by line whenever it is iterated.
+        """
+        with self._map() as data:
+            document = self._document(data)
+        if document is not None:
+            return document
+        return FeatureStream(self)
+
+    def features(self) -> Iterator:
+        """Decode the features of the file one by one.
+
+        Newline-delimited files are never decoded as a whole, so they can be
+        larger than the available memory.
+        """
+        with self._map() as data:
+            yield from _flatten(self._items(data))
+
+    @staticmethod
+    def _document(data):
+        """Decode the mapped file if it is a single document, return None if
+        it is newline-delimited."""
+        import geojson  # pylint: disable=import-outside-toplevel
+
+        end = data.find(b"\n")
+        if end == -1 or not _NON_WHITESPACE.search(data, end):
+            # A single line.
+            if _NON_WHITESPACE.search(data):
+                return geojson.loads(data[:])
+            return geojson.FeatureCollection([])
+        try:
+            geojson.loads(data[:end])
+        except (JSONDecodeError, ValueError):
+            # The first line is only part of a single document.
+            return geojson.loads(data[:])
+        return None
+
+    @staticmethod
+    def _items(data) -> Iterator:
+        """Decode the documents of the mapped file."""
+        import geojson  # pylint: disable=import-outside-toplevel
+
+        size = len(data)
+        end = data.find(b"\n")
+        if end == -1 or not _NON_WHITESPACE.search(data, end):
+            # A single line.
+            if _NON_WHITESPACE.search(data):
+                yield geojson.loads(data[:])
+            return
+        try:
+            first = geojson.loads(data[:end])
+        except (JSONDecodeError, ValueError):
+            # The first line is only part of a single document.
+            yield geojson.loads(data[:])
+            return
+        yield first
+        position = end + 1
+        while position < size:
+            end = data.find(b"\n", position)
+            if end == -1:
+                end = size
+            line = data[position:end]
+            position = end + 1
+            if line.strip():
+                yield geojson.loads(line)
+
+    def _map(self):
+        """Return the memory-mapped file, or empty bytes for empty files."""
+        with open(self._path, "rb") as file:
+            if os.fstat(file.fileno()).st_size == 0:
+                # Empty files cannot be mapped.
+                return _EmptyMap()
+            return mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+class StreamError(Exception):
+    """Reading or decoding a feature stream failed."""
+
+
+class FeatureStream:
+    """Features of a newline-delimited file, decoded line by line each time
+    they are iterated.
+
+    Only the source is kept, so holding on to the stream does not keep any
+    of the features in memory.
+    """
+
+    def __init__(self, source: LocalSource):
+        """Initialise this stream."""
+        self._source = source
+
+    def __repr__(self):
+        """Return string representation of this stream."""
+        return "<{}(path={})>".format(self.__class__.__name__, self._source.path)
+
+    def __contains__(self, name) -> bool:
+        """Return False, newline-delimited files have no feed metadata."""
+        return False
+
+    def get(self, name, default=None):
+        """Return the default, newline-delimited files have no feed
+        metadata."""
+        return default
+
+    @property
+    def features(self) -> Iterator:
+        """Decode the features of the file one by one."""
+        try:
+            yield from self._source.features()
+        except (OSError, ValueError) as error:
+            raise StreamError(error) from error
+
+
+class _EmptyMap(bytes):
+    """Empty content of a file that cannot be mapped."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+
+def _flatten(items) -> Iterator:
+    """Return the features of features and feature collections."""
+    for item in items:
+        if item.get("type") == "FeatureCollection":
+            yield from item.features
+        else:
+            yield item
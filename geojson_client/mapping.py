@@ -0,0 +1,237 @@
+"""
+Field mapping.
+
+Declarative mapping of GeoJSON features to typed entry fields, compiled once
+into extractors.
+"""
+import datetime
+from typing import Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+from geojson_client.consts import ATTR_GUID, ATTR_ID, ATTR_TITLE
+
+# A path is either the name of a property, or a sequence of keys starting at
+# the feature, for example ("properties", "guid").
+Path = Union[str, Sequence[str]]
+
+# The feature's id, then the id, guid and title properties.
+DEFAULT_EXTERNAL_ID_PATHS = [(ATTR_ID,), ATTR_ID, ATTR_GUID, ATTR_TITLE]
+
+TIMESTAMP_EPOCH_MILLISECONDS = "epoch_ms"
+TIMESTAMP_EPOCH_SECONDS = "epoch"
+TIMESTAMP_ISO_8601 = "iso8601"
+
+
+def _compile_path(path: Path) -> Callable:
+    """Return a function that looks up the path in a feature."""
+    if isinstance(path, str):
+        path = ("properties", path)
+    path = tuple(path)
+    if len(path) == 1:
+        (key,) = path
+
+        def extract(feature):
+            return feature.get(key)
+
+    elif len(path) == 2 and path[0] == "properties":
+        key = path[1]
+
+        def extract(feature):
+            properties = feature.get("properties")
+            return properties.get(key) if properties else None
+
+    else:
+
+        def extract(feature):
+            value = feature
+            for key in path:
+                if not isinstance(value, dict):
+                    return None
+                value = value.get(key)
+            return value
+
+    return extract
+
+
+def _compile_timestamp(path: Path, timestamp_format: str, tzinfo) -> Callable:
+    """Return a function that parses the timestamp at the path."""
+    extract = _compile_path(path)
+
+    if timestamp_format == TIMESTAMP_EPOCH_MILLISECONDS:
+
+        def parse(value):
+            return datetime.datetime.fromtimestamp(
+                value / 1000, tz=tzinfo or datetime.timezone.utc
+            )
+
+    elif timestamp_format == TIMESTAMP_EPOCH_SECONDS:
+
+        def parse(value):
+            return datetime.datetime.fromtimestamp(
+                value, tz=tzinfo or datetime.timezone.utc
+            )
+
+    elif timestamp_format == TIMESTAMP_ISO_8601:
+
+        def parse(value):
+            # Python 3.7 does not accept a trailing "Z".
+            if value.endswith("Z"):
+                value = value[:-1] + "+00:00"
+            return datetime.datetime.fromisoformat(value)
+
+    else:
+
+        def parse(value):
+            return datetime.datetime.strptime(value, timestamp_format)
+
+    def extract_timestamp(feature):
+        value = extract(feature)
+        if value is None or value == "":
+            return None
+        try:
+            timestamp = parse(value)
+        except (TypeError, ValueError, OverflowError, OSError):
+            return None
+        if tzinfo and timestamp.tzinfo is None:
+            timestamp = timestamp.replace(tzinfo=tzinfo)
+        return timestamp
+
+    return extract_timestamp
+
+
+def _compile_number(path: Path) -> Callable:
+    """Return a function that converts the value at the path to a number."""
+    extract = _compile_path(path)
+
+    def extract_number(feature):
+        value = extract(feature)
+        if value is None or isinstance(value, bool):
+            return None
+        if isinstance(value, (int, float)):
+            return value
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            return None
+
+    return extract_number
+
+
+class MappedFields:
+    """Fields of a feature extracted with a mapping."""
+
+    __slots__ = (
+        "external_id",
+        "title",
+        "timestamp",
+        "category",
+        "numbers",
+        "id_from_coordinates",
+    )
+
+    def __init__(
+        self,
+        external_id,
+        title,
+        timestamp,
+        category,
+        numbers,
+        id_from_coordinates: bool = False,
+    ):
+        """Initialise these fields."""
+        self.external_id = external_id
+        self.id_from_coordinates = id_from_coordinates
+        self.title = title
+        self.timestamp = timestamp
+        self.category = category
+        self.numbers = numbers
+
+    def __repr__(self):
+        """Return string representation of these fields."""
+        return "<{}(external_id={}, title={})>".format(
+            self.__class__.__name__, self.external_id, self.title
+        )
+
+
+class FeedMapping:
+    """Mapping of GeoJSON features to entry fields.
+
+    Each field is given as a path into the feature, and all paths are
+    compiled once into extractors. The external id is the first non-empty
+    value of `external_id`, which is a single path or a list of paths tried
+    in order, falling back to a hash of the entry's coordinates.
+    """
+
+    def __init__(
+        self,
+        external_id: Union[Path, List[Path], None] = None,
+        title: Optional[Path] = ATTR_TITLE,
+        timestamp: Optional[Path] = None,
+        timestamp_format: str = TIMESTAMP_ISO_8601,
+        timestamp_tzinfo: Optional[datetime.tzinfo] = None,
+        numeric_fields: Optional[Dict[str, Path]] = None,
+        category: Optional[Path] = None,
+    ):
+        """Initialise this mapping."""
+        if external_id is None:
+            external_id = DEFAULT_EXTERNAL_ID_PATHS
+        elif not isinstance(external_id, list):
+            external_id = [external_id]
+        self._external_id = [_compile_path(path) for path in external_id]
+        self._title = _compile_path(title) if title else None
+        self._timestamp = (
+            _compile_timestamp(timestamp, timestamp_format, timestamp_tzinfo)
+            if timestamp
+            else None
+        )
+        self._category = _compile_path(category) if category else None
+        self._numeric_fields = tuple(
+            (name, _compile_number(path))
+            for name, path in (numeric_fields or {}).items()
+        )
+
+    def __repr__(self):
+        """Return string representation of this mapping."""
+        return "<{}(numeric_fields={})>".format(
+            self.__class__.__name__, list(self.numeric_field_names)
+        )
+
+    @property
+    def numeric_field_names(self) -> Tuple[str, ...]:
+        """Return the names of the numeric fields of this mapping."""
+        return tuple(name for name, _ in self._numeric_fields)
+
+    @property
+    def has_timestamp(self) -> bool:
+        """Return True if this mapping extracts timestamps."""
+        return self._timestamp is not None
+
+    def extract(self, feature, coordinates: Callable = None) -> MappedFields:
+        """Extract all fields of the feature at once.
+
+        `coordinates` returns the coordinates used as the external id if the
+        feature does not have any other.
+        """
+        if feature is None:
+            feature = {}
+        title = self._title(feature) if self._title else None
+        external_id = None
+        id_from_coordinates = False
+        for extract in self._external_id:
+            external_id = extract(feature)
+            if external_id:
+                break
+        if not external_id and coordinates:
+            # Use geometry as ID as a fallback.
+            external_id = hash(coordinates())
+            id_from_coordinates = True
+        return MappedFields(
+            external_id,
+            title,
+            self._timestamp(feature) if self._timestamp else None,
+            self._category(feature) if self._category else None,
+            {name: extract(feature) for name, extract in self._numeric_fields},
+            id_from_coordinates,
+        )
+
+
+DEFAULT_MAPPING = FeedMapping()
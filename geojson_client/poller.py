@@ -0,0 +1,191 @@
+"""
+Adaptive poller.
+
+Schedules feed manager updates based on how often the feed changes.
+"""
+import logging
+import math
+import threading
+import time
+from typing import Optional
+
+from geojson_client import UPDATE_OK
+from geojson_client.feed_manager import FeedManagerBase, FeedManagerSnapshot
+
+_LOGGER = logging.getLogger(__name__)
+
+
+def expected_staleness(interval: float, change_rate: float) -> float:
+    """Return the expected staleness when polling at the interval.
+
+    Staleness at any point in time is the age of the oldest change that has
+    not been seen yet, or zero if there is none. Changes are assumed to
+    arrive independently at the given rate per second.
+    """
+    rate_interval = change_rate * interval
+    if rate_interval < 1e-3:
+        # Series expansion, avoiding cancellation for rare changes.
+        return change_rate * interval**2 / 6 - change_rate**2 * interval**3 / 24
+    return (
+        interval / 2
+        - 1 / change_rate
+        + (1 - math.exp(-rate_interval)) / (change_rate**2 * interval)
+    )
+
+
+class AdaptivePoller:
+    """Update a feed manager at an interval adapted to the feed.
+
+    The polling interval is chosen so that the expected staleness of the
+    managed entries is `freshness_sla` seconds, based on the rate at which
+    the feed has been observed to change. A feed that rarely changes is
+    therefore polled much less often than a busy one. In addition, the next
+    poll is delayed until the server can have produced new data, based on
+    when the feed was generated (USGS `metadata.generated`) and the observed
+    interval between generations, and based on the expiry of a cached
+    response. The interval is always kept between `min_interval` and
+    `max_interval` seconds.
+    """
+
+    def __init__(
+        self,
+        feed_manager: FeedManagerBase,
+        freshness_sla: float = 60.0,
+        min_interval: float = 5.0,
+        max_interval: float = 3600.0,
+        margin: float = 1.0,
+        decay: float = 0.9,
+    ):
+        """Initialise this poller."""
+        self._feed_manager = feed_manager
+        self._freshness_sla = freshness_sla
+        self._min_interval = min_interval
+        self._max_interval = max_interval
+        self._margin = margin
+        self._decay = decay
+        # Start with the assumption of one change per SLA period.
+        self._changes = 1.0
+        self._observed_time = freshness_sla
+        self._generated = None
+        self._regeneration_interval = None
+        self._last_poll = None
+        self._next_poll_delay = min_interval
+
+    def __repr__(self):
+        """Return string representation of this poller."""
+        return "<{}(feed_manager={}, sla={}, next_poll_delay={:.1f})>".format(
+            self.__class__.__name__,
+            self._feed_manager,
+            self._freshness_sla,
+            self._next_poll_delay,
+        )
+
+    @property
+    def change_rate(self) -> float:
+        """Return the estimated number of changes per second."""
+        return self._changes / self._observed_time
+
+    @property
+    def regeneration_interval(self) -> Optional[float]:
+        """Return the observed interval in seconds between feed generations."""
+        return self._regeneration_interval
+
+    @property
+    def next_poll_delay(self) -> float:
+        """Return the number of seconds until the next poll."""
+        return self._next_poll_delay
+
+    def poll(self) -> float:
+        """Update the feed manager, and return the seconds until the next poll."""
+        now = time.time()
+        before = self._feed_manager.snapshot
+        self._feed_manager.update()
+        after = self._feed_manager.snapshot
+        if after.generation != before.generation and after.status != UPDATE_OK:
+            # Nothing can be learned from a failed update; the next successful
+            # one covers the time since the last observation.
+            _LOGGER.debug("Update of %s failed", self._feed_manager)
+        else:
+            if self._last_poll is not None:
+                self._observe(now - self._last_poll, self._changed(before, after))
+            self._last_poll = now
+        self._observe_generated(self._feed_manager.feed.last_generated)
+        self._next_poll_delay = self._schedule(time.time())
+        _LOGGER.debug(
+            "Next poll of %s in %.1f seconds", self._feed_manager, self._next_poll_delay
+        )
+        return self._next_poll_delay
+
+    def run(self, stop_event: threading.Event = None):
+        """Poll until the stop event is set."""
+        stop_event = stop_event or threading.Event()
+        while not stop_event.is_set():
+            stop_event.wait(self.poll())
+
+    @staticmethod
+    def _changed(before: FeedManagerSnapshot, after: FeedManagerSnapshot) -> bool:
+        """Return True if any entry was added, removed or modified."""
+        if before.generation == after.generation:
+            return False
+        if before.feed_entries.keys() != after.feed_entries.keys():
+            return True
+        return any(
+            entry.feature != before.feed_entries[external_id].feature
+            for external_id, entry in after.feed_entries.items()
+        )
+
+    def _observe(self, elapsed: float, changed: bool):
+        """Record whether the feed changed within the elapsed time."""
+        self._changes = self._changes * self._decay + (1.0 if changed else 0.0)
+        self._observed_time = self._observed_time * self._decay + elapsed
+
+    def _observe_generated(self, generated):
+        """Record when the external source generated the feed."""
+        if generated is None:
+            return
+        generated = generated.timestamp()
+        if self._generated is not None and generated > self._generated:
+            interval = generated - self._generated
+            self._regeneration_interval = (
+                interval
+                if self._regeneration_interval is None
+                else 0.5 * self._regeneration_interval + 0.5 * interval
+            )
+        self._generated = generated
+
+    def _interval_for_rate(self, change_rate: float) -> float:
+        """Return the longest interval that keeps within the freshness SLA."""
+        if change_rate <= 0:
+            return self._max_interval
+        low, high = self._min_interval, self._max_interval
+        if expected_staleness(high, change_rate) <= self._freshness_sla:
+            return high
+        if expected_staleness(low, change_rate) >= self._freshness_sla:
+            return low
+        for _ in range(50):
+            middle = (low + high) / 2
+            if expected_staleness(middle, change_rate) > self._freshness_sla:
+                high = middle
+            else:
+                low = middle
+        return low
+
+    def _schedule(self, now: float) -> float:
+        """Return the number of seconds until the next poll."""
+        delay = self._interval_for_rate(self.change_rate)
+        earliest = now
+        if self._generated is not None and self._regeneration_interval:
+            # No new data can be available before the next generation.
+            next_generation = self._generated + self._regeneration_interval
+            if next_generation + self._margin < now:
+                # Skip generations that have already happened.
+                next_generation += self._regeneration_interval * math.ceil(
+                    (now - self._margin - next_generation) / self._regeneration_interval
+                )
+            earliest = max(earliest, next_generation + self._margin)
+        fetch_status = self._feed_manager.feed.last_fetch_status
+        if fetch_status and fetch_status.expires_at:
+            # The cached response would be returned until it expires.
+            earliest = max(earliest, fetch_status.expires_at)
+        delay = max(delay, earliest - now)
+        return min(self._max_interval, max(self._min_interval, delay))
@@ -0,0 +1,343 @@
+"""
+Update profiling.
+
+Capture CPU profiles and memory allocations of each stage of feed updates,
+switched on at runtime for a single feed or feed manager.
+"""
+import cProfile
+import json
+import logging
+import os
+import pstats
+import time
+import tracemalloc
+from datetime import datetime
+from typing import Dict, List, Optional
+
+_LOGGER = logging.getLogger(__name__)
+
+STAGE_FETCH = "fetch"
+STAGE_DECODE = "decode"
+STAGE_BUILD = "build"
+STAGE_FILTER = "filter"
+STAGE_DIFF = "diff"
+STAGE_CALLBACKS = "callbacks"
+
+# Methods of feeds and feed managers by the stage they belong to.
+FEED_STAGES = {
+    "_fetch_response": STAGE_FETCH,
+    "_fetch_local": STAGE_FETCH,
+    "_decode": STAGE_DECODE,
+    "_build_entries": STAGE_BUILD,
+    "_filter_entries_override": STAGE_FILTER,
+}
+FEED_MANAGER_STAGES = {
+    "_update_internal": STAGE_DIFF,
+    "_record_history": STAGE_DIFF,
+    "_index_entries": STAGE_DIFF,
+    "_remove_entities": STAGE_CALLBACKS,
+    "_update_entities": STAGE_CALLBACKS,
+    "_generate_new_entities": STAGE_CALLBACKS,
+    "_publish_events": STAGE_CALLBACKS,
+    "wait_for_callbacks": STAGE_CALLBACKS,
+}
+UPDATE_METHODS = ("update", "update_override", "reevaluate")
+
+DEFAULT_TOP = 20
+
+
+class StageProfile:
+    """Profile of one stage of an update.
+
+    Nested stages are excluded, so the time and allocations of the diff
+    stage do not include the callbacks.
+    """
+
+    def __init__(self, name: str, cpu: bool, memory: bool):
+        """Initialise this stage profile."""
+        self.name = name
+        self.calls = 0
+        self.duration = 0.0
+        self.profile = cProfile.Profile() if cpu else None
+        self._memory = memory
+        self._allocations = {}
+        self._started = None
+        self._snapshot = None
+
+    def __repr__(self):
+        """Return string representation of this stage profile."""
+        return "<{}(name={}, calls={}, duration={:.6f})>".format(
+            self.__class__.__name__, self.name, self.calls, self.duration
+        )
+
+    def resume(self):
+        """Start measuring this stage."""
+        if self._memory:
+            self._snapshot = tracemalloc.take_snapshot()
+        self._started = time.perf_counter()
+        if self.profile:
+            self.profile.enable()
+
+    def pause(self):
+        """Stop measuring this stage."""
+        if self.profile:
+            self.profile.disable()
+        self.duration += time.perf_counter() - self._started
+        if self._memory:
+            for statistic in tracemalloc.take_snapshot().compare_to(
+                self._snapshot, "lineno"
+            ):
+                if statistic.size_diff or statistic.count_diff:
+                    location = str(statistic.traceback)
+                    size, count = self._allocations.get(location, (0, 0))
+                    self._allocations[location] = (
+                        size + statistic.size_diff,
+                        count + statistic.count_diff,
+                    )
+            self._snapshot = None
+
+    @property
+    def allocated(self) -> int:
+        """Return the net number of bytes allocated in this stage."""
+        return sum(size for size, _ in self._allocations.values())
+
+    def allocations(self, top: int = DEFAULT_TOP) -> List[Dict]:
+        """Return the locations that allocated the most memory."""
+        return [
+            {"location": location, "size": size, "count": count}
+            for location, (size, count) in sorted(
+                self._allocations.items(), key=lambda item: -abs(item[1][0])
+            )[:top]
+        ]
+
+    def functions(self, top: int = DEFAULT_TOP) -> List[Dict]:
+        """Return the functions with the highest cumulative time."""
+        if not self.profile:
+            return []
+        stats = pstats.Stats(self.profile)
+        functions = sorted(
+            stats.stats.items(), key=lambda item: item[1][3], reverse=True
+        )[:top]
+        return [
+            {
+                "function": "{}:{}({})".format(*function),
+                "calls": calls,
+                "total_time": total_time,
+                "cumulative_time": cumulative_time,
+            }
+            for function, (_, calls, total_time, cumulative_time, _) in functions
+        ]
+
+    def as_dict(self, top: int = DEFAULT_TOP) -> Dict:
+        """Return this stage profile as structured data."""
+        return {
+            "calls": self.calls,
+            "duration": self.duration,
+            "allocated": self.allocated,
+            "functions": self.functions(top),
+            "allocations": self.allocations(top),
+        }
+
+
+class UpdateProfile:
+    """Profiles of all stages of one update."""
+
+    def __init__(self, number: int, target: str, cpu: bool, memory: bool):
+        """Initialise this update profile."""
+        self.number = number
+        self.target = target
+        self.started = datetime.now()
+        self.duration = 0.0
+        self.stages = {}
+        self._cpu = cpu
+        self._memory = memory
+
+    def __repr__(self):
+        """Return string representation of this update profile."""
+        return "<{}(number={}, stages={})>".format(
+            self.__class__.__name__, self.number, list(self.stages)
+        )
+
+    def stage(self, name: str) -> StageProfile:
+        """Return the profile of the stage, created on first use."""
+        stage = self.stages.get(name)
+        if stage is None:
+            stage = self.stages[name] = StageProfile(name, self._cpu, self._memory)
+        return stage
+
+    def as_dict(self, top: int = DEFAULT_TOP) -> Dict:
+        """Return this update profile as structured data."""
+        return {
+            "number": self.number,
+            "target": self.target,
+            "started": self.started.isoformat(),
+            "duration": self.duration,
+            "stages": {name: stage.as_dict(top) for name, stage in self.stages.items()},
+        }
+
+
+class UpdateProfiler:
+    """Profile the stages of updates of a feed or feed manager.
+
+    Attaching the profiler wraps the methods of each stage on the instance
+    itself, and detaching removes the wrappers again, so there is no
+    overhead at all while no profiler is attached. After `updates` updates
+    the profiler detaches itself. Updates of an attached instance must not
+    run concurrently.
+    """
+
+    def __init__(
+        self, updates: Optional[int] = None, cpu: bool = True, memory: bool = False
+    ):
+        """Initialise this profiler."""
+        self._updates = updates
+        self._cpu = cpu
+        self._memory = memory
+        self._results = []
+        self._wrapped = []
+        self._depth = 0
+        self._current = None
+        self._active = []
+        self._started_tracing = False
+
+    def __repr__(self):
+        """Return string representation of this profiler."""
+        return "<{}(attached={}, updates={}, results={})>".format(
+            self.__class__.__name__,
+            self.attached,
+            self._updates,
+            len(self._results),
+        )
+
+    @property
+    def attached(self) -> bool:
+        """Return True if this profiler is attached."""
+        return bool(self._wrapped)
+
+    @property
+    def results(self) -> List[UpdateProfile]:
+        """Return the profiles of all completed updates."""
+        return list(self._results)
+
+    def attach(self, target):
+        """Start profiling the updates of a feed or feed manager."""
+        if self.attached:
+            self.detach()
+        feed = getattr(target, "feed", None)
+        if feed is not None:
+            # A feed manager, which also profiles the stages of its feed.
+            self._wrap(target, FEED_MANAGER_STAGES)
+        else:
+            feed = target
+        self._wrap(feed, FEED_STAGES)
+        delta_feed = getattr(feed, "_delta_feed", None)
+        if delta_feed is not None:
+            # The tiered USGS feed fetches and decodes most updates with its
+            # delta feed.
+            self._wrap(delta_feed, FEED_STAGES)
+        for name in UPDATE_METHODS:
+            self._wrap_update(target, name)
+        if self._memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+        _LOGGER.debug("Profiling updates of %s", target)
+
+    def detach(self):
+        """Stop profiling and remove all wrappers."""
+        for instance, name in self._wrapped:
+            instance.__dict__.pop(name, None)
+        self._wrapped = []
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+
+    def as_dicts(self, top: int = DEFAULT_TOP) -> List[Dict]:
+        """Return the profiles of all completed updates as structured data."""
+        return [result.as_dict(top) for result in self._results]
+
+    def dump(self, directory: str, top: int = DEFAULT_TOP) -> List[str]:
+        """Write the profiles to a directory and return the written paths.
+
+        Each stage's CPU profile is written in the format of the pstats
+        module, and all profiles as structured data to profiles.json.
+        """
+        os.makedirs(directory, exist_ok=True)
+        paths = []
+        for result in self._results:
+            for name, stage in result.stages.items():
+                if stage.profile:
+                    path = os.path.join(
+                        directory, "update-{}-{}.prof".format(result.number, name)
+                    )
+                    stage.profile.dump_stats(path)
+                    paths.append(path)
+        path = os.path.join(directory, "profiles.json")
+        with open(path, "w") as file:
+            json.dump(self.as_dicts(top), file, indent=2)
+        paths.append(path)
+        return paths
+
+    def _wrap(self, instance, stages: Dict[str, str]):
+        """Wrap the methods of the instance to measure their stages."""
+        for name, stage in stages.items():
+            method = getattr(instance, name, None)
+            if method is not None:
+                self._set(instance, name, self._stage_wrapper(method, stage))
+
+    def _wrap_update(self, instance, name: str):
+        """Wrap an update method to record a profile of each update."""
+        method = getattr(instance, name, None)
+        if method is None:
+            return
+        target = repr(instance)
+
+        def wrapper(*args, **kwargs):
+            if self._depth == 0:
+                self._current = UpdateProfile(
+                    len(self._results) + 1, target, self._cpu, self._memory
+                )
+                started = time.perf_counter()
+            self._depth += 1
+            try:
+                return method(*args, **kwargs)
+            finally:
+                self._depth -= 1
+                if self._depth == 0:
+                    self._current.duration = time.perf_counter() - started
+                    self._results.append(self._current)
+                    self._current = None
+                    if self._updates and len(self._results) >= self._updates:
+                        self.detach()
+
+        self._set(instance, name, wrapper)
+
+    def _stage_wrapper(self, method, name: str):
+        """Return a wrapper that measures the method as part of a stage."""
+
+        def wrapper(*args, **kwargs):
+            if self._current is None:
+                # Called outside of an update.
+                return method(*args, **kwargs)
+            stage = self._current.stage(name)
+            if self._active and self._active[-1] is stage:
+                # Already measured as part of the same stage.
+                return method(*args, **kwargs)
+            stage.calls += 1
+            if self._active:
+                self._active[-1].pause()
+            self._active.append(stage)
+            stage.resume()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                stage.pause()
+                self._active.pop()
+                if self._active:
+                    self._active[-1].resume()
+
+        return wrapper
+
+    def _set(self, instance, name: str, wrapper):
+        """Set the wrapper as an attribute of the instance."""
+        setattr(instance, name, wrapper)
+        self._wrapped.append((instance, name))
@@ -0,0 +1,722 @@
+"""
+Sharded feed runtime.
+
+Spread feed managers across worker processes, so that many feeds are not
+limited by a single interpreter. Each feed is assigned to a worker by its
+URL, and workers publish compact snapshots of the entries in shared memory.
+"""
+import logging
+import math
+import multiprocessing
+import os
+import queue
+import struct
+import sys
+import threading
+import time
+from collections import namedtuple
+from collections.abc import Sequence
+from typing import Callable, List, Optional
+
+from geojson_client.exceptions import GeoJsonException
+from geojson_client.feed_manager import FeedManagerBase
+
+try:
+    from multiprocessing import shared_memory
+except ImportError:  # pragma: no cover
+    # Python 3.7, snapshots are sent to the parent process instead.
+    shared_memory = None
+
+_LOGGER = logging.getLogger(__name__)
+
+SHARED_MEMORY_AVAILABLE = shared_memory is not None
+
+DEFAULT_WORKERS = 4
+DEFAULT_INTERVAL = 60.0
+DEFAULT_CHECK_INTERVAL = 1.0
+DEFAULT_READ_TIMEOUT = 1.0
+
+_COMMAND_ADD = "add"
+_COMMAND_REMOVE = "remove"
+_COMMAND_STOP = "stop"
+
+_RESULT_SEGMENT = "segment"
+_RESULT_PAYLOAD = "payload"
+
+# Sequence number, payload length and whether the snapshot has moved to a
+# larger segment.
+_HEADER = struct.Struct("<QQQ")
+_MINIMUM_SEGMENT_SIZE = 4096
+_READ_ATTEMPTS = 100
+
+# Generation, number of entries, and the offset and length of the status in
+# the string table.
+_SNAPSHOT_HEADER = struct.Struct("<qIII")
+# Offsets and lengths of the external id and the title in the string table,
+# latitude, longitude and distance.
+_ENTRY = struct.Struct("<IIIIddd")
+# Length of strings that are None.
+_NO_STRING = 0xFFFFFFFF
+
+SharedEntry = namedtuple(
+    "SharedEntry", ["external_id", "title", "latitude", "longitude", "distance"]
+)
+
+
+class SharedEntries(Sequence):
+    """Entries of an encoded snapshot.
+
+    Entries are fixed-size records, so each one is unpacked only when it is
+    accessed, without decoding the others.
+    """
+
+    __slots__ = ("_payload", "_count", "_strings")
+
+    def __init__(self, payload: bytes, count: int):
+        """Initialise these entries."""
+        self._payload = payload
+        self._count = count
+        self._strings = _SNAPSHOT_HEADER.size + count * _ENTRY.size
+        if self._strings > len(payload):
+            raise ValueError("Snapshot is truncated")
+
+    def __repr__(self):
+        """Return string representation of these entries."""
+        return "<{}(count={})>".format(self.__class__.__name__, self._count)
+
+    def __len__(self) -> int:
+        """Return the number of entries."""
+        return self._count
+
+    def __getitem__(self, index):
+        """Return the entry at the index, or a list of entries for a slice."""
+        if isinstance(index, slice):
+            return [self[item] for item in range(*index.indices(self._count))]
+        if index < 0:
+            index += self._count
+        if not 0 <= index < self._count:
+            raise IndexError("Entry index out of range")
+        (
+            id_offset,
+            id_length,
+            title_offset,
+            title_length,
+            latitude,
+            longitude,
+            distance,
+        ) = _ENTRY.unpack_from(
+            self._payload, _SNAPSHOT_HEADER.size + index * _ENTRY.size
+        )
+        return SharedEntry(
+            self.string(id_offset, id_length),
+            self.string(title_offset, title_length),
+            _optional(latitude),
+            _optional(longitude),
+            _optional(distance),
+        )
+
+    def string(self, offset: int, length: int) -> Optional[str]:
+        """Return a string of the string table."""
+        if length == _NO_STRING:
+            return None
+        start = self._strings + offset
+        return self._payload[start : start + length].decode("utf-8")
+
+
+class SharedSnapshot:
+    """Compact snapshot of a feed manager published by a worker."""
+
+    __slots__ = ("generation", "status", "entries")
+
+    def __init__(self, generation: int, status: Optional[str], entries: Sequence):
+        """Initialise this snapshot."""
+        self.generation = generation
+        self.status = status
+        self.entries = entries
+
+    def __repr__(self):
+        """Return string representation of this snapshot."""
+        return "<{}(generation={}, status={}, entries={})>".format(
+            self.__class__.__name__, self.generation, self.status, len(self.entries)
+        )
+
+
+def rendezvous_shard(key: str, shards):
+    """Return the shard with the highest hash for the key.
+
+    Removing a shard only moves the keys that were assigned to it, and
+    adding one only moves the keys that it now wins.
+    """
+    import hashlib  # pylint: disable=import-outside-toplevel
+
+    best = None
+    best_score = None
+    for shard in shards:
+        score = hashlib.blake2b(
+            "{}\0{}".format(shard, key).encode("utf-8"), digest_size=8
+        ).digest()
+        if best_score is None or score > best_score:
+            best, best_score = shard, score
+    if best is None:
+        raise GeoJsonException("No shard available for %s" % key)
+    return best
+
+
+def encode_snapshot(snapshot) -> bytes:
+    """Return the compact encoding of a feed manager snapshot.
+
+    A header is followed by a fixed-size record per entry and a table of
+    the UTF-8 strings the records refer to, so that readers can access any
+    entry directly. External ids are encoded as strings.
+    """
+    strings = bytearray()
+
+    def _string(value):
+        """Add the value to the string table, and return its offset and
+        length."""
+        if value is None:
+            return 0, _NO_STRING
+        encoded = str(value).encode("utf-8")
+        offset = len(strings)
+        strings.extend(encoded)
+        return offset, len(encoded)
+
+    records = []
+    for external_id, entry in snapshot.feed_entries.items():
+        latitude, longitude = entry.coordinates or (None, None)
+        records.append(
+            _ENTRY.pack(
+                *_string(external_id),
+                *_string(entry.title),
+                _number(latitude),
+                _number(longitude),
+                _number(entry.distance_to_home),
+            )
+        )
+    header = _SNAPSHOT_HEADER.pack(
+        snapshot.generation, len(records), *_string(snapshot.status)
+    )
+    return b"".join([header] + records + [bytes(strings)])
+
+
+def decode_snapshot(payload: bytes) -> SharedSnapshot:
+    """Return the snapshot of a compact encoding.
+
+    Only the header is decoded; entries are unpacked when they are accessed.
+    """
+    try:
+        generation, count, status_offset, status_length = _SNAPSHOT_HEADER.unpack_from(
+            payload
+        )
+    except struct.error as error:
+        raise ValueError("Snapshot is truncated") from error
+    entries = SharedEntries(payload, count)
+    return SharedSnapshot(
+        generation, entries.string(status_offset, status_length), entries
+    )
+
+
+def _number(value) -> float:
+    """Return the value as a float, NaN for None."""
+    return math.nan if value is None else float(value)
+
+
+def _optional(value: float) -> Optional[float]:
+    """Return the float, None for NaN."""
+    return None if math.isnan(value) else value
+
+
+class SharedSnapshotWriter:
+    """Publish snapshots of one feed into shared memory.
+
+    Writes are guarded by a sequence number that is odd while a write is in
+    progress, so readers in other processes never see a partial snapshot.
+    If a snapshot does not fit, it moves to a new, larger segment and the
+    old one is marked as moved.
+    """
+
+    def __init__(self):
+        """Initialise this writer."""
+        self._segment = None
+        self._sequence = 0
+
+    def __repr__(self):
+        """Return string representation of this writer."""
+        return "<{}(name={})>".format(self.__class__.__name__, self.name)
+
+    @property
+    def name(self) -> Optional[str]:
+        """Return the name of the current segment."""
+        return self._segment.name if self._segment else None
+
+    def publish(self, payload: bytes) -> Optional[str]:
+        """Write the payload, and return the name of the segment if it is
+        new."""
+        new_name = None
+        if self._segment is None or self._segment.size < _HEADER.size + len(payload):
+            previous = self._segment
+            self._segment = shared_memory.SharedMemory(
+                create=True,
+                size=max(_MINIMUM_SEGMENT_SIZE, 2 * (_HEADER.size + len(payload))),
+            )
+            new_name = self._segment.name
+            if previous is not None:
+                self._write(previous, b"", moved=True)
+                self._release(previous)
+        self._write(self._segment, payload)
+        return new_name
+
+    def close(self):
+        """Remove the segment."""
+        if self._segment is not None:
+            self._write(self._segment, b"", moved=True)
+            self._release(self._segment)
+            self._segment = None
+
+    def _write(self, segment, payload: bytes, moved: bool = False):
+        """Write the payload into the segment."""
+        buffer = segment.buf
+        self._sequence += 1
+        _HEADER.pack_into(buffer, 0, self._sequence, 0, 0)
+        buffer[_HEADER.size : _HEADER.size + len(payload)] = payload
+        self._sequence += 1
+        _HEADER.pack_into(buffer, 0, self._sequence, len(payload), int(moved))
+
+    @staticmethod
+    def _release(segment):
+        """Close and unlink a segment."""
+        segment.close()
+        try:
+            segment.unlink()
+        except FileNotFoundError:
+            pass
+
+
+class SnapshotMoved(GeoJsonException):
+    """The snapshot has moved to another segment."""
+
+
+class SharedSnapshotReader:
+    """Read the snapshots of one feed from a shared memory segment.
+
+    The last snapshot is kept, and only read and decoded again once the
+    writer has published a new one, so reading an unchanged snapshot only
+    costs reading the header.
+    """
+
+    def __init__(self, segment):
+        """Initialise this reader."""
+        self._segment = segment
+        self._sequence = None
+        self._snapshot = None
+
+    def __repr__(self):
+        """Return string representation of this reader."""
+        return "<{}(name={})>".format(self.__class__.__name__, self.name)
+
+    @property
+    def name(self) -> str:
+        """Return the name of the segment."""
+        return self._segment.name
+
+    def read(self) -> Optional[SharedSnapshot]:
+        """Return the latest snapshot in the segment.
+
+        Raises SnapshotMoved if the segment is no longer written to.
+        """
+        buffer = self._segment.buf
+        for _ in range(_READ_ATTEMPTS):
+            sequence, length, moved = _HEADER.unpack_from(buffer, 0)
+            if moved:
+                raise SnapshotMoved(self.name)
+            if sequence == self._sequence:
+                return self._snapshot
+            if sequence % 2 == 0:
+                payload = bytes(buffer[_HEADER.size : _HEADER.size + length])
+                if _HEADER.unpack_from(buffer, 0)[0] == sequence:
+                    try:
+                        snapshot = decode_snapshot(payload) if sequence else None
+                    except ValueError:
+                        # A torn read that the sequence number did not catch.
+                        _LOGGER.debug("Unable to decode snapshot in %s", self.name)
+                    else:
+                        self._sequence, self._snapshot = sequence, snapshot
+                        return snapshot
+            time.sleep(0)
+        raise GeoJsonException("Snapshot in %s is written to continuously" % self.name)
+
+    def close(self):
+        """Detach from the segment."""
+        self._segment.close()
+
+
+def read_shared_snapshot(segment) -> Optional[SharedSnapshot]:
+    """Return the snapshot in a shared memory segment.
+
+    Raises SnapshotMoved if the segment is no longer written to.
+    """
+    return SharedSnapshotReader(segment).read()
+
+
+def attach_segment(name: str):
+    """Attach to a shared memory segment created by a worker from another
+    process than the one running the workers."""
+    segment = _attach_segment(name)
+    if sys.version_info < (3, 13):
+        # Attaching registered the segment with this process's resource
+        # tracker, which would remove it when this process exits. The
+        # worker owns the segment.
+        from multiprocessing import (  # pylint: disable=import-outside-toplevel
+            resource_tracker,
+        )
+
+        resource_tracker.unregister(
+            segment._name, "shared_memory"  # pylint: disable=protected-access
+        )
+    return segment
+
+
+def _attach_segment(name: str):
+    """Attach to a shared memory segment without removing it on exit, from a
+    process that shares its resource tracker with the workers."""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Before Python 3.13 attaching registers the segment with the
+        # resource tracker, which already tracks it for the worker.
+        return shared_memory.SharedMemory(name=name)
+
+
+def _ignore(external_id):
+    """Ignore an entity callback."""
+
+
+def _worker(
+    worker_id: int, commands, results, interval: float
+):  # pragma: no cover - runs in worker processes
+    """Update the feed managers assigned to a worker process."""
+    # Results are tagged with the process id, so that late results of a
+    # worker that died are not mistaken for those of its replacement.
+    pid = os.getpid()
+    managers = {}
+    writers = {}
+    due = {}
+    while True:
+        now = time.monotonic()
+        timeout = max(0.0, min(due.values()) - now) if due else None
+        try:
+            command, url, factory, args, kwargs = commands.get(timeout=timeout)
+        except queue.Empty:
+            command = None
+        if command == _COMMAND_STOP:
+            break
+        if command == _COMMAND_ADD and url not in managers:
+            try:
+                feed = factory(url, *args, **kwargs)
+            except Exception:  # pylint: disable=broad-except
+                _LOGGER.exception("Unable to create feed for %s", url)
+                continue
+            managers[url] = FeedManagerBase(feed, _ignore, _ignore, _ignore)
+            if SHARED_MEMORY_AVAILABLE:
+                writers[url] = SharedSnapshotWriter()
+            due[url] = now
+        elif command == _COMMAND_REMOVE and url in managers:
+            del managers[url], due[url]
+            if url in writers:
+                writers.pop(url).close()
+        now = time.monotonic()
+        for url, next_update in list(due.items()):
+            if next_update > now:
+                continue
+            due[url] = now + interval
+            try:
+                managers[url].update()
+            except Exception:  # pylint: disable=broad-except
+                _LOGGER.exception("Update of %s failed", url)
+                continue
+            payload = encode_snapshot(managers[url].snapshot)
+            if url in writers:
+                name = writers[url].publish(payload)
+                if name:
+                    results.put((_RESULT_SEGMENT, worker_id, pid, url, name))
+            else:
+                results.put((_RESULT_PAYLOAD, worker_id, pid, url, payload))
+    for writer in writers.values():
+        writer.close()
+
+
+class ShardedFeedRuntime:
+    """Run feed managers in worker processes.
+
+    Feeds are assigned to workers by rendezvous hashing of their URL, so a
+    URL is only ever fetched by one worker. Feeds are created in the worker
+    by calling `factory(url, *args, **kwargs)`, so the factory and its
+    arguments must be picklable. If a worker dies, it is restarted with
+    the same feeds; only if it cannot be restarted are its feeds moved to
+    the remaining workers.
+    """
+
+    def __init__(
+        self,
+        workers: int = DEFAULT_WORKERS,
+        interval: float = DEFAULT_INTERVAL,
+        check_interval: float = DEFAULT_CHECK_INTERVAL,
+        context=None,
+    ):
+        """Initialise this runtime."""
+        self._context = context or multiprocessing.get_context()
+        self._worker_count = workers
+        self._interval = interval
+        self._check_interval = check_interval
+        self._results = None
+        self._workers = {}
+        self._feeds = {}
+        self._assignment = {}
+        self._segments = {}
+        self._payloads = {}
+        self._decoded = {}
+        self._attached = {}
+        self._lock = threading.RLock()
+        self._monitor = None
+        self._stopping = threading.Event()
+
+    def __repr__(self):
+        """Return string representation of this runtime."""
+        return "<{}(workers={}, feeds={})>".format(
+            self.__class__.__name__, list(self._workers), len(self._feeds)
+        )
+
+    def __enter__(self):
+        """Start the workers."""
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        """Stop the workers."""
+        self.stop()
+
+    @property
+    def workers(self) -> List[int]:
+        """Return the ids of the live workers."""
+        return list(self._workers)
+
+    def assignment(self, url: str) -> Optional[int]:
+        """Return the worker the feed is assigned to."""
+        return self._assignment.get(url)
+
+    def start(self):
+        """Start the worker processes."""
+        self._results = self._context.Queue()
+        if SHARED_MEMORY_AVAILABLE:
+            from multiprocessing import (  # pylint: disable=import-outside-toplevel
+                resource_tracker,
+            )
+
+            # Workers share the resource tracker of this process, so that
+            # attaching to their segments here does not remove them on exit.
+            resource_tracker.ensure_running()
+        for worker_id in range(self._worker_count):
+            self._spawn(worker_id)
+        self._stopping.clear()
+        self._monitor = threading.Thread(
+            target=self._run_monitor, name="geojson-client-shard-monitor", daemon=True
+        )
+        self._monitor.start()
+
+    def stop(self, timeout: float = 5.0):
+        """Stop the worker processes and remove their snapshots."""
+        self._stopping.set()
+        with self._lock:
+            for process, commands in self._workers.values():
+                commands.put((_COMMAND_STOP, None, None, (), {}))
+            for process, _ in self._workers.values():
+                process.join(timeout)
+                if process.is_alive():
+                    process.terminate()
+            self._workers = {}
+            for reader in self._attached.values():
+                reader.close()
+            self._attached = {}
+            for name in self._segments.values():
+                self._unlink(name)
+            self._segments = {}
+        if self._monitor is not None:
+            self._monitor.join(timeout)
+            self._monitor = None
+
+    def add_feed(self, url: str, factory: Callable, *args, **kwargs) -> int:
+        """Start managing the feed and return the worker it is assigned to."""
+        with self._lock:
+            if url not in self._feeds:
+                self._feeds[url] = (factory, args, kwargs)
+                self._assign(url)
+            return self._assignment[url]
+
+    def remove_feed(self, url: str):
+        """Stop managing the feed."""
+        with self._lock:
+            if self._feeds.pop(url, None) is None:
+                return
+            worker_id = self._assignment.pop(url)
+            self._workers[worker_id][1].put((_COMMAND_REMOVE, url, None, (), {}))
+            self._forget(url)
+
+    def snapshot(
+        self, url: str, timeout: float = DEFAULT_READ_TIMEOUT
+    ) -> Optional[SharedSnapshot]:
+        """Return the latest snapshot of the feed, if one was published.
+
+        If the snapshot has just moved to another segment, this waits up to
+        `timeout` seconds for the worker to announce it. Snapshots are only
+        decoded once, so callers share them and must not modify them.
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            self._drain()
+            with self._lock:
+                if url in self._payloads:
+                    snapshot = self._decoded.get(url)
+                    if snapshot is None:
+                        snapshot = self._decoded[url] = decode_snapshot(
+                            self._payloads[url]
+                        )
+                    return snapshot
+                name = self._segments.get(url)
+                if name is None:
+                    return None
+                reader = self._attached.get(name)
+                if reader is None:
+                    try:
+                        reader = self._attached[name] = SharedSnapshotReader(
+                            _attach_segment(name)
+                        )
+                    except FileNotFoundError:
+                        reader = None
+                if reader is not None:
+                    try:
+                        return reader.read()
+                    except GeoJsonException as read_ex:
+                        _LOGGER.debug("Unable to read %s: %s", url, read_ex)
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            # Wait for the worker to announce the new segment.
+            time.sleep(min(remaining, self._check_interval / 10))
+
+    def segment(self, url: str) -> Optional[str]:
+        """Return the name of the shared memory segment of the feed, which
+        other processes can read with `attach_segment` and a
+        `SharedSnapshotReader`."""
+        self._drain()
+        return self._segments.get(url)
+
+    def _spawn(self, worker_id: int):
+        """Start the worker process with the id."""
+        commands = self._context.Queue()
+        process = self._context.Process(
+            target=_worker,
+            args=(worker_id, commands, self._results, self._interval),
+            name="geojson-client-shard-{}".format(worker_id),
+            daemon=True,
+        )
+        process.start()
+        self._workers[worker_id] = (process, commands)
+
+    def _assign(self, url: str):
+        """Send the feed to the worker it belongs to."""
+        worker_id = rendezvous_shard(url, self._workers)
+        factory, args, kwargs = self._feeds[url]
+        self._assignment[url] = worker_id
+        self._workers[worker_id][1].put((_COMMAND_ADD, url, factory, args, kwargs))
+        _LOGGER.debug("Assigned %s to worker %s", url, worker_id)
+
+    def _forget(self, url: str):
+        """Forget the published snapshot of a feed."""
+        self._payloads.pop(url, None)
+        self._decoded.pop(url, None)
+        name = self._segments.pop(url, None)
+        if name is not None:
+            reader = self._attached.pop(name, None)
+            if reader is not None:
+                reader.close()
+
+    def _drain(self, timeout: Optional[float] = None):
+        """Process the results published by the workers."""
+        block = timeout is not None
+        while True:
+            try:
+                kind, worker_id, pid, url, value = self._results.get(block, timeout)
+            except queue.Empty:
+                return
+            block = False
+            with self._lock:
+                worker = self._workers.get(worker_id)
+                if worker is None or worker[0].pid != pid:
+                    # A late result of a worker that died.
+                    if kind == _RESULT_SEGMENT:
+                        self._unlink(value)
+                    continue
+                if self._assignment.get(url) != worker_id:
+                    # A result of a feed that was removed or has moved.
+                    continue
+                if kind == _RESULT_SEGMENT:
+                    previous = self._segments.get(url)
+                    if previous is not None and previous in self._attached:
+                        self._attached.pop(previous).close()
+                    self._segments[url] = value
+                else:
+                    self._payloads[url] = value
+                    self._decoded.pop(url, None)
+
+    def _run_monitor(self):
+        """Process results and rebalance the feeds of dead workers."""
+        while not self._stopping.is_set():
+            self._drain(self._check_interval)
+            self._rebalance()
+
+    def _rebalance(self):
+        """Restart dead workers, or move their feeds to the remaining
+        workers if they cannot be restarted."""
+        with self._lock:
+            if self._stopping.is_set():
+                return
+            dead = [
+                worker_id
+                for worker_id, (process, _) in self._workers.items()
+                if not process.is_alive()
+            ]
+            if not dead:
+                return
+            for worker_id in dead:
+                _LOGGER.warning("Worker %s died, restarting it", worker_id)
+                try:
+                    self._spawn(worker_id)
+                except OSError as spawn_ex:
+                    _LOGGER.error(
+                        "Unable to restart worker %s, moving its feeds: %s",
+                        worker_id,
+                        spawn_ex,
+                    )
+                    del self._workers[worker_id]
+            if not self._workers:
+                _LOGGER.error("No workers left")
+                return
+            for url, worker_id in list(self._assignment.items()):
+                if worker_id in dead:
+                    name = self._segments.get(url)
+                    self._forget(url)
+                    if name is not None:
+                        self._unlink(name)
+                    self._assign(url)
+
+    @staticmethod
+    def _unlink(name: str):
+        """Remove a segment left behind by a worker."""
+        if not SHARED_MEMORY_AVAILABLE:
+            return
+        try:
+            segment = shared_memory.SharedMemory(name=name)
+        except FileNotFoundError:
+            return
+        segment.close()
+        segment.unlink()
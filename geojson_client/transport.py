@@ -0,0 +1,465 @@
+"""
+HTTP transports.
+
+Send the requests of a feed with requests, a pooled urllib3 or httpx client,
+or a stub for tests, and decompress response bodies as they arrive.
+"""
+import functools
+import importlib.util
+import threading
+import time
+import zlib
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+from geojson_client.exceptions import GeoJsonException
+
+ENCODING_GZIP = "gzip"
+ENCODING_DEFLATE = "deflate"
+ENCODING_BROTLI = "br"
+ENCODING_ZSTD = "zstd"
+ENCODING_IDENTITY = "identity"
+
+DEFAULT_CHUNK_SIZE = 1 << 16
+
+
+def _installed(*modules: str) -> bool:
+    """Return True if any of the modules is installed, without importing it."""
+    return any(importlib.util.find_spec(module) is not None for module in modules)
+
+
+@functools.lru_cache(maxsize=None)
+def available_encodings() -> Tuple[str, ...]:
+    """Return the content encodings that can be decompressed."""
+    encodings = [ENCODING_DEFLATE, ENCODING_GZIP]
+    if _installed("brotli", "brotlicffi"):
+        encodings.append(ENCODING_BROTLI)
+    if _installed("zstandard"):
+        encodings.append(ENCODING_ZSTD)
+    return tuple(encodings)
+
+
+class TransferStats:
+    """Bytes received on the wire and after decompression for a response."""
+
+    __slots__ = ("wire_bytes", "decoded_bytes", "decompress_time")
+
+    def __init__(
+        self,
+        wire_bytes: int,
+        decoded_bytes: int,
+        decompress_time: Optional[float] = None,
+    ):
+        """Initialise these statistics."""
+        self.wire_bytes = wire_bytes
+        self.decoded_bytes = decoded_bytes
+        self.decompress_time = decompress_time
+
+    def __repr__(self):
+        """Return string representation of these statistics."""
+        return "<{}(wire_bytes={}, decoded_bytes={})>".format(
+            self.__class__.__name__, self.wire_bytes, self.decoded_bytes
+        )
+
+
+class ContentDecoder:
+    """Incrementally decompress a body with the given content encodings."""
+
+    def __init__(self, content_encoding: Optional[str]):
+        """Initialise this decoder."""
+        encodings = [
+            encoding.strip().lower()
+            for encoding in (content_encoding or "").split(",")
+            if encoding.strip() and encoding.strip().lower() != ENCODING_IDENTITY
+        ]
+        # Encodings are listed in the order they were applied.
+        self._decompressors = [
+            self._decompressor(encoding) for encoding in reversed(encodings)
+        ]
+
+    def __repr__(self):
+        """Return string representation of this decoder."""
+        return "<{}(stages={})>".format(
+            self.__class__.__name__, len(self._decompressors)
+        )
+
+    def decompress(self, chunk: bytes) -> bytes:
+        """Return the decompressed data of the next chunk of the body."""
+        try:
+            for decompress, _ in self._decompressors:
+                chunk = decompress(chunk)
+        except Exception as error:  # pylint: disable=broad-except
+            _raise_decoding_error(error)
+        return chunk
+
+    def flush(self) -> bytes:
+        """Return the remaining decompressed data at the end of the body."""
+        data = b""
+        try:
+            for decompress, flush in self._decompressors:
+                data = decompress(data) + flush() if data else flush()
+        except Exception as error:  # pylint: disable=broad-except
+            _raise_decoding_error(error)
+        return data
+
+    @staticmethod
+    def _decompressor(encoding: str) -> Tuple[Callable, Callable]:
+        """Return the decompress and flush functions of an encoding."""
+        if encoding in (ENCODING_GZIP, "x-gzip"):
+            decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+            return decompressor.decompress, decompressor.flush
+        if encoding == ENCODING_DEFLATE:
+            return _DeflateDecompressor().decompress, lambda: b""
+        if encoding == ENCODING_BROTLI and ENCODING_BROTLI in available_encodings():
+            try:
+                import brotli  # pylint: disable=import-outside-toplevel
+            except ImportError:
+                import brotlicffi as brotli  # pylint: disable=import-outside-toplevel
+            decompressor = brotli.Decompressor()
+            process = getattr(decompressor, "process", None) or decompressor.decompress
+            return process, lambda: b""
+        if encoding == ENCODING_ZSTD and ENCODING_ZSTD in available_encodings():
+            import zstandard  # pylint: disable=import-outside-toplevel
+
+            decompressor = zstandard.ZstdDecompressor().decompressobj()
+            return decompressor.decompress, lambda: b""
+        raise GeoJsonException("Unsupported content encoding %s" % encoding)
+
+
+def _raise_decoding_error(error: Exception):
+    """Raise the error of requests for a body that cannot be decompressed."""
+    import requests  # pylint: disable=import-outside-toplevel
+
+    raise requests.exceptions.ContentDecodingError(error) from error
+
+
+class _DeflateDecompressor:
+    """Decompress deflate bodies, with or without the zlib header."""
+
+    def __init__(self):
+        """Initialise this decompressor."""
+        self._decompressor = None
+
+    def decompress(self, chunk: bytes) -> bytes:
+        """Return the decompressed data of the next chunk."""
+        if self._decompressor is None:
+            if not chunk:
+                return b""
+            self._decompressor = zlib.decompressobj()
+            try:
+                return self._decompressor.decompress(chunk)
+            except zlib.error:
+                # Some servers send raw deflate data.
+                self._decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+        return self._decompressor.decompress(chunk)
+
+
+def read_body(
+    chunks: Iterable[bytes], content_encoding: Optional[str]
+) -> Tuple[bytes, TransferStats]:
+    """Decompress the chunks of a body as they arrive, and return the body
+    and the transfer statistics."""
+    try:
+        decoder = ContentDecoder(content_encoding)
+    except GeoJsonException as error:
+        _raise_decoding_error(error)
+    parts = []
+    wire_bytes = 0
+    decompress_time = 0.0
+    for chunk in chunks:
+        wire_bytes += len(chunk)
+        start = time.perf_counter()
+        parts.append(decoder.decompress(chunk))
+        decompress_time += time.perf_counter() - start
+    start = time.perf_counter()
+    parts.append(decoder.flush())
+    decompress_time += time.perf_counter() - start
+    body = b"".join(parts)
+    return body, TransferStats(wire_bytes, len(body), decompress_time)
+
+
+def _split_timeout(timeout) -> Tuple[Optional[float], Optional[float]]:
+    """Return the connect and read timeout."""
+    if isinstance(timeout, tuple):
+        return timeout
+    return timeout, timeout
+
+
+class TransportResponse:
+    """Response received by a transport other than requests."""
+
+    def __init__(
+        self,
+        url: str,
+        status_code: int,
+        headers: Dict[str, str],
+        content: bytes,
+        transfer: TransferStats,
+    ):
+        """Initialise this response."""
+        self.url = url
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+        self.transfer = transfer
+        self._text = None
+
+    def __repr__(self):
+        """Return string representation of this response."""
+        return "<{}(url={}, status_code={})>".format(
+            self.__class__.__name__, self.url, self.status_code
+        )
+
+    @property
+    def ok(self) -> bool:
+        """Return True unless the status code is an error."""
+        return self.status_code < 400
+
+    @property
+    def text(self) -> str:
+        """Return the body decoded with the charset of the content type."""
+        if self._text is None:
+            charset = "utf-8"
+            for name, value in self.headers.items():
+                if name.lower() == "content-type" and "charset=" in value:
+                    charset = value.split("charset=", 1)[1].split(";")[0].strip(' "')
+            try:
+                self._text = self.content.decode(charset, errors="replace")
+            except LookupError:
+                self._text = self.content.decode("utf-8", errors="replace")
+        return self._text
+
+
+class Transport:
+    """Base class of transports that send the requests of feeds.
+
+    `send` is called with a request that has a `method`, `url`, `headers`
+    and `body`, and a timeout that is a number or a tuple of connect and
+    read timeout. It raises the exceptions of requests, so that fetch
+    policies can retry regardless of the transport.
+    """
+
+    def __repr__(self):
+        """Return string representation of this transport."""
+        return "<{}()>".format(self.__class__.__name__)
+
+    def accept_encoding(self) -> str:
+        """Return the value of the Accept-Encoding header to send."""
+        return ", ".join(available_encodings())
+
+    def send(self, request, timeout):
+        """Send the request and return the response."""
+        raise NotImplementedError
+
+    def close(self):
+        """Release the resources of this transport."""
+
+
+class RequestsTransport(Transport):
+    """Send requests with requests, with a new session for every request
+    unless a session is given."""
+
+    def __init__(self, session=None):
+        """Initialise this transport."""
+        self._session = session
+
+    def accept_encoding(self) -> str:
+        """Return the encodings that urllib3 decompresses."""
+        encodings = [ENCODING_DEFLATE, ENCODING_GZIP]
+        available = available_encodings()
+        if ENCODING_BROTLI in available:
+            encodings.append(ENCODING_BROTLI)
+        if ENCODING_ZSTD in available:
+            import urllib3  # pylint: disable=import-outside-toplevel
+
+            if int(urllib3.__version__.split(".")[0]) >= 2:
+                encodings.append(ENCODING_ZSTD)
+        return ", ".join(encodings)
+
+    def send(self, request, timeout):
+        """Send the request and return the response."""
+        if self._session is not None:
+            return self._measure(self._session.send(request, timeout=timeout))
+        import requests  # pylint: disable=import-outside-toplevel
+
+        with requests.Session() as session:
+            return self._measure(session.send(request, timeout=timeout))
+
+    def close(self):
+        """Close the session."""
+        if self._session is not None:
+            self._session.close()
+
+    @staticmethod
+    def _measure(response):
+        """Attach the transfer statistics to the response if known."""
+        raw = getattr(response, "raw", None)
+        tell = getattr(raw, "tell", None)
+        wire_bytes = tell() if tell else None
+        content = getattr(response, "content", None)
+        if isinstance(wire_bytes, int) and isinstance(content, bytes):
+            # requests decompresses the body itself, so the time is unknown.
+            response.transfer = TransferStats(wire_bytes, len(content))
+        return response
+
+
+class Urllib3Transport(Transport):
+    """Send requests with a pooled urllib3 client, and decompress bodies as
+    they arrive."""
+
+    def __init__(
+        self, pool_manager=None, chunk_size: int = DEFAULT_CHUNK_SIZE, **kwargs
+    ):
+        """Initialise this transport.
+
+        Without a pool manager, one is created with the keyword arguments
+        on first use.
+        """
+        self._pool_manager = pool_manager
+        self._pool_kwargs = kwargs
+        self._chunk_size = chunk_size
+        self._lock = threading.Lock()
+
+    def send(self, request, timeout):
+        """Send the request and return the response."""
+        import requests  # pylint: disable=import-outside-toplevel
+        import urllib3  # pylint: disable=import-outside-toplevel
+
+        connect_timeout, read_timeout = _split_timeout(timeout)
+        try:
+            response = self._pool().request(
+                request.method,
+                request.url,
+                body=request.body,
+                headers=dict(request.headers),
+                timeout=urllib3.Timeout(connect=connect_timeout, read=read_timeout),
+                retries=False,
+                redirect=True,
+                preload_content=False,
+                decode_content=False,
+            )
+            try:
+                content, transfer = read_body(
+                    response.stream(self._chunk_size, decode_content=False),
+                    response.headers.get("Content-Encoding"),
+                )
+            finally:
+                response.release_conn()
+        except urllib3.exceptions.TimeoutError as error:
+            raise requests.exceptions.Timeout(error) from error
+        except urllib3.exceptions.HTTPError as error:
+            raise requests.exceptions.ConnectionError(error) from error
+        return TransportResponse(
+            request.url, response.status, dict(response.headers), content, transfer
+        )
+
+    def close(self):
+        """Close all pooled connections."""
+        if self._pool_manager is not None:
+            self._pool_manager.clear()
+
+    def _pool(self):
+        """Return the pool manager, created on first use."""
+        with self._lock:
+            if self._pool_manager is None:
+                import urllib3  # pylint: disable=import-outside-toplevel
+
+                self._pool_manager = urllib3.PoolManager(**self._pool_kwargs)
+            return self._pool_manager
+
+
+class HttpxTransport(Transport):
+    """Send requests with a pooled httpx client, and decompress bodies as
+    they arrive. Requires httpx."""
+
+    def __init__(self, client=None, chunk_size: int = DEFAULT_CHUNK_SIZE):
+        """Initialise this transport."""
+        try:
+            import httpx  # pylint: disable=import-outside-toplevel
+        except ImportError as error:
+            raise GeoJsonException(
+                "The httpx transport requires httpx to be installed"
+            ) from error
+        self._httpx = httpx
+        self._client = client or httpx.Client(follow_redirects=True)
+        self._chunk_size = chunk_size
+
+    def send(self, request, timeout):
+        """Send the request and return the response."""
+        import requests  # pylint: disable=import-outside-toplevel
+
+        httpx = self._httpx
+        connect_timeout, read_timeout = _split_timeout(timeout)
+        try:
+            with self._client.stream(
+                request.method,
+                request.url,
+                content=request.body,
+                headers=dict(request.headers),
+                timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+            ) as response:
+                content, transfer = read_body(
+                    response.iter_raw(self._chunk_size),
+                    response.headers.get("Content-Encoding"),
+                )
+        except httpx.TimeoutException as error:
+            raise requests.exceptions.Timeout(error) from error
+        except httpx.HTTPError as error:
+            raise requests.exceptions.ConnectionError(error) from error
+        return TransportResponse(
+            request.url, response.status_code, dict(response.headers), content, transfer
+        )
+
+    def close(self):
+        """Close the client."""
+        self._client.close()
+
+
+class StubTransport(Transport):
+    """Return canned responses without any network access, for tests.
+
+    Responses are given as tuples of status code, headers and body as sent
+    on the wire, either as a list that is consumed in order (the last one is
+    repeated), or as a function of the request.
+    """
+
+    def __init__(self, responses, chunk_size: int = 1024):
+        """Initialise this transport."""
+        self._responses = responses
+        self._chunk_size = chunk_size
+        self.requests = []
+
+    def send(self, request, timeout):
+        """Return the next canned response."""
+        self.requests.append(request)
+        if callable(self._responses):
+            status_code, headers, body = self._responses(request)
+        else:
+            index = min(len(self.requests), len(self._responses)) - 1
+            status_code, headers, body = self._responses[index]
+        chunks = [
+            body[start : start + self._chunk_size]
+            for start in range(0, len(body), self._chunk_size)
+        ]
+        content, transfer = read_body(chunks, headers.get("Content-Encoding"))
+        return TransportResponse(
+            request.url, status_code, dict(headers), content, transfer
+        )
+
+
+def encode_body(body: bytes, content_encoding: str) -> bytes:
+    """Return the body compressed with the content encoding."""
+    if content_encoding == ENCODING_GZIP:
+        import gzip  # pylint: disable=import-outside-toplevel
+
+        return gzip.compress(body)
+    if content_encoding == ENCODING_DEFLATE:
+        return zlib.compress(body)
+    if content_encoding == ENCODING_BROTLI:
+        import brotli  # pylint: disable=import-outside-toplevel
+
+        return brotli.compress(body)
+    if content_encoding == ENCODING_ZSTD:
+        import zstandard  # pylint: disable=import-outside-toplevel
+
+        return zstandard.ZstdCompressor().compress(body)
+    raise GeoJsonException("Unsupported content encoding %s" % content_encoding)
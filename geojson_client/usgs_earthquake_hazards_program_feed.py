@@ -5,12 +5,16 @@ Fetches GeoJSON feed from U.S. Geological Survey Earthquake Hazards Program.
 """
 import datetime
 import logging
+import re
+import time
 from typing import Dict
 
-from geojson_client import FeedEntry, GeoJsonFeed
+from geojson_client import UPDATE_ERROR, UPDATE_OK, FeedEntry, GeoJsonFeed
 from geojson_client.consts import (
     ATTR_ALERT,
     ATTR_ATTRIBUTION,
+    ATTR_COUNT,
+    ATTR_GENERATED,
     ATTR_ID,
     ATTR_MAG,
     ATTR_PLACE,
@@ -21,6 +25,7 @@ from geojson_client.consts import (
     ATTR_UPDATED,
     FILTER_MINIMUM_MAGNITUDE,
 )
+from geojson_client.distance import DISTANCE_HAVERSINE
 from geojson_client.exceptions import GeoJsonException
 from geojson_client.feed_manager import FeedManagerBase
 
@@ -50,6 +55,18 @@ URLS = {
     "past_month_all_earthquakes": URL_PREFIX + "all_month.geojson",
 }
 
+# Number of seconds covered by the feeds of each period.
+WINDOWS = {
+    "past_hour": 3600,
+    "past_day": 24 * 3600,
+    "past_week": 7 * 24 * 3600,
+    "past_month": 30 * 24 * 3600,
+}
+
+# The generation time is part of the metadata at the start of the feed.
+GENERATED_PATTERN = re.compile(rb'"generated"\s*:\s*(\d+)')
+GENERATED_SEARCH_LENGTH = 1024
+
 
 class UsgsEarthquakeHazardsProgramFeedManager(FeedManagerBase):
     """Feed Manager for USGS Earthquake Hazards Program feed."""
@@ -63,6 +80,17 @@ class UsgsEarthquakeHazardsProgramFeedManager(FeedManagerBase):
         feed_type,
         filter_radius=None,
         filter_minimum_magnitude=None,
+        dispatcher=None,
+        wait_for_callbacks=True,
+        stale_while_error=None,
+        circuit_breaker=None,
+        history=None,
+        fetch_policy=None,
+        http_cache=None,
+        skip_unchanged=False,
+        distance_model=DISTANCE_HAVERSINE,
+        transport=None,
+        keep_last_data=False,
     ):
         """Initialize the USGS Earthquake Hazards Program Feed Manager."""
         feed = UsgsEarthquakeHazardsProgramFeed(
@@ -70,8 +98,24 @@ class UsgsEarthquakeHazardsProgramFeedManager(FeedManagerBase):
             feed_type,
             filter_radius=filter_radius,
             filter_minimum_magnitude=filter_minimum_magnitude,
+            fetch_policy=fetch_policy,
+            http_cache=http_cache,
+            skip_unchanged=skip_unchanged,
+            distance_model=distance_model,
+            transport=transport,
+            keep_last_data=keep_last_data,
+        )
+        super().__init__(
+            feed,
+            generate_callback,
+            update_callback,
+            remove_callback,
+            dispatcher=dispatcher,
+            wait_for_callbacks=wait_for_callbacks,
+            stale_while_error=stale_while_error,
+            circuit_breaker=circuit_breaker,
+            history=history,
         )
-        super().__init__(feed, generate_callback, update_callback, remove_callback)
 
 
 class UsgsEarthquakeHazardsProgramFeed(GeoJsonFeed):
@@ -83,11 +127,25 @@ class UsgsEarthquakeHazardsProgramFeed(GeoJsonFeed):
         feed_type,
         filter_radius=None,
         filter_minimum_magnitude=None,
+        fetch_policy=None,
+        http_cache=None,
+        skip_unchanged=False,
+        distance_model=DISTANCE_HAVERSINE,
+        transport=None,
+        keep_last_data=False,
     ):
         """Initialise this service."""
         if feed_type in URLS:
             super().__init__(
-                home_coordinates, URLS[feed_type], filter_radius=filter_radius
+                home_coordinates,
+                URLS[feed_type],
+                filter_radius=filter_radius,
+                fetch_policy=fetch_policy,
+                http_cache=http_cache,
+                skip_unchanged=skip_unchanged,
+                distance_model=distance_model,
+                transport=transport,
+                keep_last_data=keep_last_data,
             )
         else:
             _LOGGER.error("Unknown feed category %s", feed_type)
@@ -142,6 +200,27 @@ class UsgsEarthquakeHazardsProgramFeed(GeoJsonFeed):
             return dates[0]
         return None
 
+    def _extract_generated(self, feed):
+        """Determine when the external source generated the feed."""
+        generated = self._search_in_metadata(feed, ATTR_GENERATED)
+        if generated:
+            # Timestamp in milliseconds from unix epoch.
+            return datetime.datetime.fromtimestamp(
+                generated / 1000, tz=datetime.timezone.utc
+            )
+        return None
+
+    def _fingerprint(self, content):
+        """Return a value that changes whenever the response body changes.
+
+        The feed is regenerated as a whole, so its generation time identifies
+        the content without having to read the rest of the body.
+        """
+        match = GENERATED_PATTERN.search(content, 0, GENERATED_SEARCH_LENGTH)
+        if match:
+            return match.group(1)
+        return super()._fingerprint(content)
+
     def _extract_from_feed(self, feed):
         """Extract global metadata from feed."""
         global_data = {}
@@ -158,6 +237,166 @@ class UsgsEarthquakeHazardsProgramFeed(GeoJsonFeed):
         return None
 
 
+class UsgsEarthquakeHazardsProgramTieredFeed(UsgsEarthquakeHazardsProgramFeed):
+    """USGS Earthquake Hazards Program feed composed of a long and a short feed.
+
+    The long feed (for example the past month) is only fetched to seed the
+    state and then every `reconcile_interval` seconds. In between, the short
+    delta feed (by default the past hour of the same category) is fetched and
+    merged into the state by id and `updated` time, and events that fall out
+    of the long feed's window are removed locally.
+    """
+
+    def __init__(
+        self,
+        home_coordinates,
+        feed_type,
+        delta_feed_type=None,
+        filter_radius=None,
+        filter_minimum_magnitude=None,
+        reconcile_interval=6 * 3600.0,
+        fetch_policy=None,
+        http_cache=None,
+        skip_unchanged=False,
+        distance_model=DISTANCE_HAVERSINE,
+        transport=None,
+        keep_last_data=False,
+    ):
+        """Initialise this service."""
+        super().__init__(
+            home_coordinates,
+            feed_type,
+            filter_radius=filter_radius,
+            filter_minimum_magnitude=filter_minimum_magnitude,
+            fetch_policy=fetch_policy,
+            http_cache=http_cache,
+            skip_unchanged=skip_unchanged,
+            distance_model=distance_model,
+            transport=transport,
+            keep_last_data=keep_last_data,
+        )
+        period, category = self._split_feed_type(feed_type)
+        if delta_feed_type is None:
+            delta_feed_type = "past_hour_" + category
+        delta_period, delta_category = self._split_feed_type(delta_feed_type)
+        if delta_category != category or WINDOWS[delta_period] >= WINDOWS[period]:
+            raise GeoJsonException(
+                "Delta feed must be a shorter feed of category %s" % category
+            )
+        self._delta_feed = UsgsEarthquakeHazardsProgramFeed(
+            home_coordinates,
+            delta_feed_type,
+            fetch_policy=fetch_policy,
+            http_cache=http_cache,
+            skip_unchanged=skip_unchanged,
+            transport=transport,
+        )
+        self._window = WINDOWS[period]
+        self._delta_window = WINDOWS[delta_period]
+        self._reconcile_interval = reconcile_interval
+        self._features = None
+        self._metadata = None
+        self._last_reconcile = None
+        self._last_delta = None
+
+    def __repr__(self):
+        """Return string representation of this feed."""
+        return "<{}(home={}, url={}, delta_url={}, radius={}, magnitude={})>".format(
+            self.__class__.__name__,
+            self._home_coordinates,
+            self._url,
+            self._delta_feed._url,
+            self._filter_radius,
+            self._filter_minimum_magnitude,
+        )
+
+    @staticmethod
+    def _split_feed_type(feed_type):
+        """Split the feed type into its period and category."""
+        for period in WINDOWS:
+            if feed_type in URLS and feed_type.startswith(period + "_"):
+                return period, feed_type[len(period) + 1 :]
+        raise GeoJsonException("Feed category must be one of %s" % URLS.keys())
+
+    def _fetch(self):
+        """Fetch the long or the delta feed and return the merged state."""
+        now = time.time()
+        reconciled = False
+        if self._reconcile_due(now):
+            status, data = super()._fetch()
+            if status == UPDATE_OK:
+                self._features = {}
+                self._merge(data)
+                # The long feed's title is the attribution of all entries.
+                self._metadata = dict(data.get("metadata") or {})
+            elif self._features is None:
+                return status, data
+            reconciled = status != UPDATE_ERROR
+            if reconciled:
+                self._last_reconcile = self._last_delta = now
+            else:
+                _LOGGER.warning("Reconciling %s failed, applying delta instead", self)
+        if not reconciled:
+            status, data = self._delta_feed._fetch()
+            self._last_fetch_status = self._delta_feed.last_fetch_status
+            if status == UPDATE_ERROR:
+                return status, data
+            self._last_delta = now
+            if status == UPDATE_OK:
+                self._merge(data)
+                generated = self._search_in_metadata(data, ATTR_GENERATED)
+                if generated:
+                    self._metadata = dict(
+                        self._metadata or {}, **{ATTR_GENERATED: generated}
+                    )
+        if not self._age_out(now) and status != UPDATE_OK:
+            # Neither feed provided anything new, and nothing has expired.
+            return status, None
+        import geojson  # pylint: disable=import-outside-toplevel
+
+        return UPDATE_OK, geojson.FeatureCollection(
+            list(self._features.values()),
+            metadata=dict(self._metadata or {}, **{ATTR_COUNT: len(self._features)}),
+        )
+
+    def _reconcile_due(self, now: float) -> bool:
+        """Return True if the long feed needs to be fetched."""
+        return (
+            self._features is None
+            or now - self._last_reconcile >= self._reconcile_interval
+            # Events may have been missed if the delta feed is out of date.
+            or now - self._last_delta >= self._delta_window
+        )
+
+    def _merge(self, data):
+        """Merge the features of a fetched feed into the state."""
+        for feature in data.features:
+            external_id = feature.get(ATTR_ID)
+            existing = self._features.get(external_id)
+            if existing is None or (feature.properties.get(ATTR_UPDATED) or 0) >= (
+                existing.properties.get(ATTR_UPDATED) or 0
+            ):
+                self._features[external_id] = feature
+
+    def _age_out(self, now: float) -> bool:
+        """Remove events older than the window, and return True if any were."""
+        oldest = (now - self._window) * 1000
+        expired = [
+            external_id
+            for external_id, feature in self._features.items()
+            if (feature.properties.get(ATTR_TIME) or oldest) < oldest
+        ]
+        for external_id in expired:
+            del self._features[external_id]
+        return bool(expired)
+
+    def _forget_versions(self):
+        """Forget the version of the last responses, so that the next update
+        returns all entries even if the external source has not changed."""
+        super()._forget_versions()
+        self._delta_feed._forget_versions()
+
+
 class UsgsEarthquakeHazardsProgramFeedEntry(FeedEntry):
     """USGS Earthquake Hazards Program feed entry."""
 
@@ -165,11 +404,12 @@ class UsgsEarthquakeHazardsProgramFeedEntry(FeedEntry):
         """Initialise this service."""
         super().__init__(home_coordinates, feature)
         self._attribution = attribution
+        self._external_id = self._search_in_feature(ATTR_ID)
 
     @property
     def external_id(self) -> str:
         """Return the external id of this entry."""
-        return self._search_in_feature(ATTR_ID)
+        return self._external_id
 
     @property
     def attribution(self) -> str:
@@ -31,7 +31,7 @@ setup(
     long_description=long_description,
     long_description_content_type="text/markdown",
     url=URL,
-    packages=find_packages(exclude=("tests*",)),
+    packages=find_packages(exclude=("tests*", "benchmarks*")),
     classifiers=[
         "Programming Language :: Python :: 3.7",
         "Programming Language :: Python :: 3.8",
@@ -41,4 +41,11 @@ setup(
         "Operating System :: OS Independent",
     ],
     install_requires=REQUIRES,
+    extras_require={
+        "arrow": ["pyarrow>=1.0.0"],
+        "brotli": ["brotli>=1.0.0"],
+        "httpx": ["httpx>=0.20.0"],
+        "zstd": ["zstandard>=0.15.0"],
+    },
+    entry_points={"console_scripts": ["geojson-client=geojson_client.cli:main"]},
 )
@@ -0,0 +1,161 @@
+"""Tests for the grid aggregation."""
+import unittest
+from datetime import datetime
+from unittest import mock
+
+from geojson_client import UPDATE_OK
+from geojson_client.aggregation import (
+    SCHEME_GEOHASH,
+    GridAggregator,
+    geohash_cell,
+    tile_cell,
+)
+from geojson_client.feed_manager import FeedManagerBase
+
+
+def _entry(external_id, latitude, longitude, magnitude, day):
+    """Return a mock earthquake entry."""
+    entry = mock.MagicMock()
+    entry.external_id = external_id
+    entry.coordinates = (latitude, longitude)
+    entry.magnitude = magnitude
+    entry.time = datetime(2020, 1, day)
+    return entry
+
+
+def _feed_manager():
+    """Return a feed manager of a mock feed."""
+    feed = mock.MagicMock()
+    feed.last_timestamp = None
+    return FeedManagerBase(
+        feed,
+        lambda external_id: None,
+        lambda external_id: None,
+        lambda external_id: None,
+    )
+
+
+def _update(feed_manager, entries):
+    """Update the feed manager with the entries."""
+    feed_manager.feed.update.return_value = UPDATE_OK, entries
+    feed_manager.update()
+
+
+class TestCells(unittest.TestCase):
+    """Tests for the grid cells."""
+
+    def test_tile_cell(self):
+        """Test web map tiles."""
+        assert tile_cell(0.0, 0.0, 0) == (0, 0, 0)
+        assert tile_cell(0.1, 0.1, 1) == (1, 1, 0)
+        assert tile_cell(-33.87, 151.21, 10) == (10, 942, 614)
+        assert tile_cell(-90.0, 180.0, 2) == (2, 3, 3)
+
+    def test_geohash_cell(self):
+        """Test geohashes."""
+        assert geohash_cell(57.64911, 10.40744, 11) == "u4pruydqqvj"
+        assert geohash_cell(-33.87, 151.21, 5) == "r3gx2"
+
+
+class TestGridAggregator(unittest.TestCase):
+    """Tests for the grid aggregator."""
+
+    def test_incremental(self):
+        """Test the statistics follow the feed manager's changes."""
+        feed_manager = _feed_manager()
+        _update(
+            feed_manager,
+            [
+                _entry("1", -33.8, 151.2, 4.5, 1),
+                _entry("2", -33.9, 151.1, 5.5, 2),
+                _entry("3", 35.6, 139.7, 6.0, 3),
+            ],
+        )
+        aggregator = GridAggregator(feed_manager, resolutions=(2, 10))
+        assert repr(aggregator) == (
+            "<GridAggregator(scheme=tile, resolutions=[2, 10], entries=3)>"
+        )
+        cell = aggregator.cell(2, tile_cell(-33.8, 151.2, 2))
+        assert cell.count == 2
+        assert cell.max_value == 5.5
+        assert cell.latest == datetime(2020, 1, 2)
+        assert len(aggregator.cells(2)) == 2
+        assert len(aggregator.cells(10)) == 3
+
+        # Remove the strongest entry, update one and add one.
+        _update(
+            feed_manager,
+            [
+                _entry("1", -33.8, 151.2, 4.7, 4),
+                _entry("3", 35.6, 139.7, 6.0, 3),
+                _entry("4", -33.7, 151.3, 3.0, 5),
+            ],
+        )
+        cell = aggregator.cell(2, tile_cell(-33.8, 151.2, 2))
+        assert cell.count == 2
+        assert cell.max_value == 4.7
+        assert cell.latest == datetime(2020, 1, 5)
+        assert cell.as_dict()["count"] == 2
+        assert aggregator.cell(10, tile_cell(-33.9, 151.1, 10)) is None
+
+        # Only cells in view.
+        sydney = (-34.5, 150.5, -33.0, 152.0)
+        assert {cell.count for cell in aggregator.cells(2, sydney)} == {2}
+        assert {cell.key for cell in aggregator.cells(10, sydney)} == {
+            tile_cell(-33.8, 151.2, 10),
+            tile_cell(-33.7, 151.3, 10),
+        }
+        # Bounds crossing the antimeridian.
+        assert len(aggregator.cells(10, (-40.0, 150.0, 40.0, -170.0))) == 2
+
+        _update(feed_manager, [])
+        assert aggregator.cells(2) == []
+        aggregator.close()
+
+    def test_geohash(self):
+        """Test aggregating by geohash."""
+        feed_manager = _feed_manager()
+        aggregator = GridAggregator(
+            feed_manager, resolutions=(1, 4), scheme=SCHEME_GEOHASH
+        )
+        _update(
+            feed_manager,
+            [_entry("1", -33.8, 151.2, 4.5, 1), _entry("2", 35.6, 139.7, 6.0, 3)],
+        )
+        assert aggregator.cell(4, geohash_cell(-33.8, 151.2, 4)).max_value == 4.5
+        cells = aggregator.cells(1, (-40.0, 140.0, -30.0, 160.0))
+        assert [cell.key for cell in cells] == [geohash_cell(-33.8, 151.2, 1)]
+        with self.assertRaises(ValueError):
+            GridAggregator(feed_manager, scheme="hexagon")
+
+    def test_rebuild_after_dropped_events(self):
+        """Test the statistics are rebuilt if events were dropped."""
+        feed_manager = _feed_manager()
+        aggregator = GridAggregator(feed_manager, resolutions=(3,), max_pending=2)
+        _update(
+            feed_manager,
+            [_entry(str(index), 10.0, index, 1.0, 1) for index in range(10)],
+        )
+        cells = aggregator.cells(3)
+        assert sum(cell.count for cell in cells) == 10
+
+    def test_unchanged_entries(self):
+        """Test updates of unchanged entries do not touch their cells."""
+        feed_manager = _feed_manager()
+        aggregator = GridAggregator(feed_manager, resolutions=(2,))
+        _update(
+            feed_manager,
+            [_entry("1", -33.8, 151.2, 4.5, 1), _entry("2", -33.9, 151.1, 5.5, 2)],
+        )
+        cell = aggregator.cell(2, tile_cell(-33.8, 151.2, 2))
+        assert cell.max_value == 5.5
+        # The same entries again, as decoded from the next poll.
+        with mock.patch.object(aggregator, "_remove") as mock_remove:
+            _update(
+                feed_manager,
+                [_entry("1", -33.8, 151.2, 4.5, 1), _entry("2", -33.9, 151.1, 5.5, 2)],
+            )
+            aggregator.refresh()
+            mock_remove.assert_not_called()
+        assert not cell._dirty
+        assert cell.count == 2
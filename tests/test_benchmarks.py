@@ -0,0 +1,63 @@
+"""Tests for the load test harness."""
+import json
+import unittest
+import urllib.error
+import urllib.request
+
+from benchmarks.load_driver import KIND_GENERIC, KIND_USGS, LoadDriver, percentile
+from benchmarks.stub_server import Scenario, StubFeedServer
+
+
+class TestLoadHarness(unittest.TestCase):
+    """Tests for the stub server and the load driver."""
+
+    def test_scenario(self):
+        """Test evolving the events of a scenario."""
+        scenario = Scenario(events=10, arrivals=3, updates=2, removals=1, seed=1)
+        generation, body = scenario.body()
+        assert generation == 0
+        first_ids = [feature["id"] for feature in json.loads(body)["features"]]
+        assert len(first_ids) == 10
+        scenario.advance()
+        generation, body = scenario.body()
+        assert generation == 1
+        ids = [feature["id"] for feature in json.loads(body)["features"]]
+        assert len(ids) == 12
+        assert ids[:9] == first_ids[1:]
+        assert repr(scenario) == "<Scenario(generation=1, events=12)>"
+
+        scenario = Scenario(events=1, body_size=10000)
+        assert len(scenario.body()[1]) >= 10000
+
+    def test_server(self):
+        """Test serving the feed with validators."""
+        with StubFeedServer(Scenario(events=5)) as server:
+            with urllib.request.urlopen(server.url) as response:
+                assert len(json.loads(response.read())["features"]) == 5
+                etag = response.headers["ETag"]
+            request = urllib.request.Request(
+                server.url, headers={"If-None-Match": etag}
+            )
+            with self.assertRaises(urllib.error.HTTPError) as context:
+                urllib.request.urlopen(request)
+            assert context.exception.code == 304
+        assert server.statuses == {200: 1, 304: 1}
+
+    def test_driver(self):
+        """Test running feed managers against the stub server."""
+        for kind in (KIND_GENERIC, KIND_USGS):
+            scenario = Scenario(events=20, arrivals=2, updates=3, removals=1, seed=1)
+            with StubFeedServer(scenario) as server:
+                report = LoadDriver(server, managers=3, kind=kind).run(rounds=2)
+            assert report.updates == 6
+            assert report.callbacks.generated == 3 * 22
+            assert report.callbacks.updated == 3 * 19
+            assert report.callbacks.removed == 3
+            assert report.statuses == {200: 6}
+            assert "managers:        3" in report.format()
+
+    def test_percentile(self):
+        """Test interpolating percentiles."""
+        assert percentile([], 0.5) == 0.0
+        assert percentile([3.0, 1.0, 2.0], 0.5) == 2.0
+        assert percentile([1.0, 2.0], 0.95) == 1.95
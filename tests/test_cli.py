@@ -0,0 +1,126 @@
+"""Tests for the command line interface."""
+import io
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from geojson_client.cli import NdjsonWriter, main, parse_coordinates
+from tests.utils import load_fixture
+
+
+class TestCommandLineInterface(unittest.TestCase):
+    """Tests for the command line interface."""
+
+    @mock.patch("requests.Request")
+    @mock.patch("requests.Session")
+    def test_entries(self, mock_session, mock_request):
+        """Test writing the entries of a USGS feed."""
+        mock_session.return_value.__enter__.return_value.send.return_value.ok = True
+        mock_session.return_value.__enter__.return_value.send.return_value.text = (
+            load_fixture("usgs_earthquake_hazards_program_feed.json")
+        )
+        stdout = io.StringIO()
+        assert (
+            main(
+                ["past_hour_all_earthquakes", "--home=-31.0,151.0", "--radius", "500"],
+                stdout=stdout,
+            )
+            == 0
+        )
+        records = [json.loads(line) for line in stdout.getvalue().splitlines()]
+        assert [record["id"] for record in records] == ["1234", "2345", "3456"]
+        assert records[0]["feed"] == "past_hour_all_earthquakes"
+        assert records[0]["event"] == "entry"
+        assert records[0]["feature"]["properties"]["place"] == "Place 1"
+        self.assertAlmostEqual(records[0]["distance"], 224.5, 1)
+
+    @mock.patch("requests.Request")
+    @mock.patch("requests.Session")
+    def test_diff(self, mock_session, mock_request):
+        """Test writing the changes between polls of a generic feed."""
+        mock_response = mock_session.return_value.__enter__.return_value.send
+        mock_response.return_value.ok = True
+        fixtures = [
+            load_fixture("generic_feed_1.json"),
+            load_fixture("generic_feed_2.json"),
+        ]
+        type(mock_response.return_value).text = mock.PropertyMock(side_effect=fixtures)
+        stdout = io.StringIO()
+        with mock.patch("time.sleep"):
+            main(
+                ["http://example.com/feed.json", "--mode", "diff", "--polls", "2"],
+                stdout=stdout,
+            )
+        records = [json.loads(line) for line in stdout.getvalue().splitlines()]
+        events = [(record["event"], record["id"]) for record in records]
+        created = [external_id for event, external_id in events[:5]]
+        assert events[:5] == [("created", external_id) for external_id in created]
+        assert {"3456", "4567", "Title 3", "7890"} < set(created)
+        assert len(events) == 11
+        assert set(events[5:]) == {
+            ("created", "8901"),
+            ("removed", "7890"),
+            ("removed", "Title 3"),
+            ("removed", (set(created) - {"3456", "4567", "Title 3", "7890"}).pop()),
+            ("updated", "3456"),
+            ("updated", "4567"),
+        }
+        assert all(
+            "feature" not in record
+            for record in records
+            if record["event"] == "removed"
+        )
+        assert records[-1]["feature"]["properties"]["title"] == "Title 6"
+
+    def test_local_file(self):
+        """Test writing the entries of a local file to a file."""
+        with tempfile.TemporaryDirectory() as directory:
+            source = os.path.join(directory, "feed.json")
+            with open(source, "w") as file:
+                file.write(load_fixture("generic_feed_1.json"))
+            output = os.path.join(directory, "entries.ndjson")
+            main([source, "--output", output])
+            with open(output) as file:
+                assert len(file.readlines()) == 5
+
+    def test_arguments(self):
+        """Test rejecting invalid arguments."""
+        assert parse_coordinates("-31.5,151") == (-31.5, 151.0)
+        with self.assertRaises(SystemExit):
+            main(["past_hour_all_earthquakes", "--home", "north"])
+        with self.assertRaises(SystemExit):
+            main(["past_hour_all_earthquakes", "--format", "parquet"])
+        with tempfile.TemporaryDirectory() as directory:
+            for source in (
+                "past_century_all_earthquakes",
+                "missing.json",
+                os.path.join(directory, "missing.json"),
+                "file://" + os.path.join(directory, "missing.json"),
+            ):
+                with self.assertRaises(SystemExit):
+                    main([source])
+        with mock.patch.dict("sys.modules", {"pyarrow": None}):
+            with self.assertRaises(SystemExit):
+                main(
+                    [
+                        "past_hour_all_earthquakes",
+                        "--format",
+                        "arrow",
+                        "--output",
+                        "entries.arrow",
+                    ]
+                )
+
+    def test_buffered_writes(self):
+        """Test writing records in bulk."""
+        stream = mock.MagicMock()
+        writer = NdjsonWriter(stream, buffer_size=60)
+        writer.write("feed", "removed", "1")
+        assert stream.write.call_count == 0
+        writer.write("feed", "removed", "2")
+        assert stream.write.call_count == 1
+        writer.close()
+        assert stream.write.call_count == 1
+        assert repr(writer) == "<NdjsonWriter(buffered=0)>"
@@ -0,0 +1,98 @@
+"""Tests for snapshot deltas."""
+import json
+import unittest
+from unittest import mock
+
+from geojson_client.delta import (
+    TYPE_DELTA,
+    TYPE_SNAPSHOT,
+    DeltaEncoder,
+    apply_delta,
+    full_snapshot,
+    snapshot_delta,
+)
+from geojson_client.generic_feed import GenericFeedManager
+from tests.utils import load_fixture
+
+
+def _features(snapshot):
+    """Return the features of a snapshot by external id."""
+    return {
+        external_id: entry.feature
+        for external_id, entry in snapshot.feed_entries.items()
+    }
+
+
+class TestSnapshotDelta(unittest.TestCase):
+    """Tests for snapshot deltas."""
+
+    @mock.patch("requests.Request")
+    @mock.patch("requests.Session")
+    def test_delta(self, mock_session, mock_request):
+        """Test deltas between consecutive and older generations."""
+        mock_response = mock_session.return_value.__enter__.return_value.send
+        mock_response.return_value.ok = True
+        mock_response.return_value.text = load_fixture("generic_feed_1.json")
+        feed_manager = GenericFeedManager(
+            lambda external_id: None,
+            lambda external_id: None,
+            lambda external_id: None,
+            (-31.0, 151.0),
+            None,
+        )
+        encoder = DeltaEncoder(feed_manager, history=2)
+        feed_manager.update()
+        first = feed_manager.snapshot
+        resync = encoder.delta()
+        assert resync["type"] == TYPE_SNAPSHOT
+        assert resync["generation"] == 1
+        assert len(resync["features"]) == 5
+        state = apply_delta({}, resync)
+        assert state == _features(first)
+
+        feature_collection = json.loads(load_fixture("generic_feed_1.json"))
+        feature_collection["features"][0]["properties"]["title"] = "Title 1a"
+        feature_collection["features"][1]["geometry"]["coordinates"] = [150.0, -37.0]
+        del feature_collection["features"][4]["properties"]["title"]
+        mock_response.return_value.text = json.dumps(feature_collection)
+        feed_manager.update()
+        delta = encoder.delta(1)
+        assert delta["type"] == TYPE_DELTA
+        assert delta["from_generation"] == 1
+        assert delta["generation"] == 2
+        assert delta["added"] == []
+        assert delta["removed"] == []
+        changes = {change["id"]: change for change in delta["changed"]}
+        assert changes["3456"] == {"id": "3456", "properties": {"title": "Title 1a"}}
+        assert changes["4567"]["geometry"]["coordinates"] == [150.0, -37.0]
+        assert changes["7890"]["removed_properties"] == ["title"]
+        assert "Title 3" not in changes
+        # Deltas are plain JSON.
+        delta = json.loads(json.dumps(delta))
+        state = apply_delta(state, delta)
+        assert state == _features(feed_manager.snapshot)
+
+        mock_response.return_value.text = load_fixture("generic_feed_2.json")
+        feed_manager.update()
+        delta = encoder.delta(2)
+        assert [added["id"] for added in delta["added"]] == ["8901"]
+        assert set(delta["removed"]) == set(_features(first)) - {"3456", "4567"}
+        state = apply_delta(state, delta)
+        assert state == _features(feed_manager.snapshot)
+
+        # The first generation is no longer known.
+        assert encoder.delta(1)["type"] == TYPE_SNAPSHOT
+        assert repr(encoder) == "<DeltaEncoder(generations=[2, 3])>"
+
+    def test_unchanged(self):
+        """Test the delta between the same snapshot is empty."""
+        snapshot = mock.MagicMock(generation=4, feed_entries={"1": mock.MagicMock()})
+        assert snapshot_delta(snapshot, snapshot) == {
+            "type": TYPE_DELTA,
+            "from_generation": 4,
+            "generation": 4,
+            "added": [],
+            "changed": [],
+            "removed": [],
+        }
+        assert full_snapshot(snapshot)["features"][0]["id"] == "1"
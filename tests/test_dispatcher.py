@@ -0,0 +1,142 @@
+"""Tests for the callback dispatchers."""
+import asyncio
+import threading
+import time
+import unittest
+from unittest import mock
+
+from geojson_client.dispatcher import (
+    AsyncioCallbackDispatcher,
+    CallbackDispatcher,
+    ExecutorCallbackDispatcher,
+)
+from geojson_client.generic_feed import GenericFeedManager
+from tests.utils import load_fixture
+
+
+class TestCallbackDispatcher(unittest.TestCase):
+    """Tests for the callback dispatchers."""
+
+    def test_inline(self):
+        """Test running callbacks inline."""
+        calls = []
+        dispatcher = CallbackDispatcher()
+        dispatcher.dispatch("1", calls.append)
+        assert calls == ["1"]
+        assert dispatcher.wait()
+        assert repr(dispatcher) == "<CallbackDispatcher()>"
+
+    def test_executor_keeps_order_per_id(self):
+        """Test that callbacks for the same id run in order."""
+        calls = []
+        lock = threading.Lock()
+
+        def slow_callback(name):
+            def callback(external_id):
+                time.sleep(0.01)
+                with lock:
+                    calls.append((external_id, name))
+
+            return callback
+
+        dispatcher = ExecutorCallbackDispatcher(max_workers=4)
+        for name in ("create", "update", "remove"):
+            for external_id in ("1", "2", "3"):
+                dispatcher.dispatch(external_id, slow_callback(name))
+        assert dispatcher.wait(timeout=5.0)
+        dispatcher.shutdown()
+        assert len(calls) == 9
+        for external_id in ("1", "2", "3"):
+            assert [name for call_id, name in calls if call_id == external_id] == [
+                "create",
+                "update",
+                "remove",
+            ]
+
+    def test_executor_callback_error(self):
+        """Test that a failing callback does not stall the dispatcher."""
+        calls = []
+
+        def failing_callback(external_id):
+            raise ValueError(external_id)
+
+        dispatcher = ExecutorCallbackDispatcher(max_workers=1)
+        dispatcher.dispatch("1", failing_callback)
+        dispatcher.dispatch("1", calls.append)
+        assert dispatcher.wait(timeout=5.0)
+        dispatcher.shutdown()
+        assert calls == ["1"]
+
+    def test_wait_timeout(self):
+        """Test waiting for callbacks with a timeout."""
+        event = threading.Event()
+        dispatcher = ExecutorCallbackDispatcher(max_workers=1)
+        dispatcher.dispatch("1", lambda external_id: event.wait(5.0))
+        assert not dispatcher.wait(timeout=0.01)
+        event.set()
+        assert dispatcher.wait(timeout=5.0)
+        dispatcher.shutdown()
+
+    def test_asyncio(self):
+        """Test running callbacks on an event loop."""
+        calls = []
+
+        async def coroutine_callback(external_id):
+            calls.append(("async", external_id))
+
+        def callback(external_id):
+            calls.append(("sync", external_id))
+
+        async def run():
+            dispatcher = AsyncioCallbackDispatcher(asyncio.get_running_loop())
+            dispatcher.dispatch("1", coroutine_callback)
+            dispatcher.dispatch("1", callback)
+            dispatcher.dispatch("2", callback)
+            while not dispatcher.wait(timeout=0):
+                await asyncio.sleep(0.01)
+
+        asyncio.run(run())
+        assert [call for call in calls if call[1] == "1"] == [
+            ("async", "1"),
+            ("sync", "1"),
+        ]
+        assert ("sync", "2") in calls
+
+
+class TestFeedManagerDispatcher(unittest.TestCase):
+    """Tests for the feed manager using a dispatcher."""
+
+    @mock.patch("requests.Request")
+    @mock.patch("requests.Session")
+    def test_feed_manager_with_dispatcher(self, mock_session, mock_request):
+        """Test the feed manager dispatching callbacks to an executor."""
+        mock_session.return_value.__enter__.return_value.send.return_value.ok = True
+        mock_session.return_value.__enter__.return_value.send.return_value.text = (
+            load_fixture("generic_feed_1.json")
+        )
+        generated_entity_external_ids = []
+        event = threading.Event()
+
+        def _generate_entity(external_id):
+            """Generate new entity."""
+            event.wait(5.0)
+            generated_entity_external_ids.append(external_id)
+
+        dispatcher = ExecutorCallbackDispatcher(max_workers=2)
+        feed_manager = GenericFeedManager(
+            _generate_entity,
+            lambda external_id: None,
+            lambda external_id: None,
+            (-31.0, 151.0),
+            None,
+            dispatcher=dispatcher,
+            wait_for_callbacks=False,
+        )
+        feed_manager.update()
+        # The update returns before the callbacks have completed.
+        assert len(feed_manager.feed_entries) == 5
+        assert not feed_manager.wait_for_callbacks(timeout=0.01)
+        event.set()
+        assert feed_manager.wait_for_callbacks(timeout=5.0)
+        assert len(generated_entity_external_ids) == 5
+        dispatcher.shutdown()
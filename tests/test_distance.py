@@ -0,0 +1,120 @@
+"""Tests for the distance models."""
+import random
+import unittest
+from unittest import mock
+
+from haversine import haversine
+
+from geojson_client import UPDATE_OK
+from geojson_client.distance import (
+    DISTANCE_EQUIRECTANGULAR,
+    DISTANCE_HAVERSINE,
+    DISTANCE_MODELS,
+    DISTANCE_VINCENTY,
+    haversine_distance,
+)
+from geojson_client.exceptions import GeoJsonException
+from geojson_client.generic_feed import GenericFeed
+from tests.utils import load_fixture
+
+
+class TestDistanceModels(unittest.TestCase):
+    """Tests for the distance models."""
+
+    def test_haversine(self):
+        """Test the great-circle distance."""
+        model = DISTANCE_MODELS[DISTANCE_HAVERSINE]
+        self.assertAlmostEqual(
+            model.distance(-31.0, 150.0, -30.0, 151.0),
+            haversine((-31.0, 150.0), (-30.0, 151.0)),
+            9,
+        )
+        distances = model.distances(-31.0, 150.0, [[151.0, -30.0], [150.0, -31.0]])
+        self.assertAlmostEqual(distances[0], 146.8, 1)
+        assert distances[1] == 0.0
+        assert repr(model) == "<HaversineModel(name=haversine)>"
+
+    def test_vincenty(self):
+        """Test the geodesic distance on the ellipsoid."""
+        model = DISTANCE_MODELS[DISTANCE_VINCENTY]
+        # Flinders Peak to Buninyong, from Vincenty's paper.
+        self.assertAlmostEqual(
+            model.distance(
+                -37.95103341666667,
+                144.42486788888888,
+                -37.65282113888889,
+                143.92649552777777,
+            ),
+            54.972271,
+            6,
+        )
+        assert model.distance(-31.0, 150.0, -31.0, 150.0) == 0.0
+        # Nearly antipodal coordinates fall back to the great-circle distance.
+        self.assertAlmostEqual(
+            model.distance(0.0, 0.0, 0.5, 179.7),
+            haversine_distance(0.0, 0.0, 0.5, 179.7),
+            6,
+        )
+
+    def test_equirectangular_error_bound(self):
+        """Test the error of the approximation stays within its bound."""
+        model = DISTANCE_MODELS[DISTANCE_EQUIRECTANGULAR]
+        generator = random.Random(1)
+        for _ in range(10000):
+            latitude = generator.uniform(-80.0, 80.0)
+            longitude = generator.uniform(-180.0, 180.0)
+            other_latitude = latitude + generator.uniform(-2.0, 2.0)
+            other_longitude = longitude + generator.uniform(-2.0, 2.0)
+            distance, error = model.estimate(
+                latitude, longitude, other_latitude, other_longitude
+            )
+            exact = haversine_distance(
+                latitude, longitude, other_latitude, other_longitude
+            )
+            self.assertLessEqual(abs(distance - exact), error)
+
+    def test_equirectangular_near_radius(self):
+        """Test using the exact distance close to the radius."""
+        model = DISTANCE_MODELS[DISTANCE_EQUIRECTANGULAR]
+        exact = haversine_distance(-31.0, 150.0, -30.0, 151.0)
+        approximation = model.distance(-31.0, 150.0, -30.0, 151.0)
+        assert approximation != exact
+        assert model.distance(-31.0, 150.0, -30.0, 151.0, exact) == exact
+        assert model.distances(-31.0, 150.0, [[151.0, -30.0]], exact) == [exact]
+        assert model.distances(-31.0, 150.0, [[151.0, -30.0]], 10.0) == [approximation]
+        # Far away, the exact distance is used.
+        assert model.distance(-31.0, 150.0, 40.0, -10.0) == haversine_distance(
+            -31.0, 150.0, 40.0, -10.0
+        )
+
+    @mock.patch("requests.Request")
+    @mock.patch("requests.Session")
+    def test_feed_with_distance_model(self, mock_session, mock_request):
+        """Test filtering a feed with different distance models."""
+        mock_session.return_value.__enter__.return_value.send.return_value.ok = True
+        mock_session.return_value.__enter__.return_value.send.return_value.text = (
+            load_fixture("generic_feed_1.json")
+        )
+        home_coordinates = (-37.0, 150.0)
+        results = {}
+        for model in DISTANCE_MODELS:
+            feed = GenericFeed(
+                home_coordinates, None, filter_radius=90.0, distance_model=model
+            )
+            status, entries = feed.update()
+            assert status == UPDATE_OK
+            results[model] = {entry.external_id: entry for entry in entries}
+            assert entries[0].distance_model == model
+        assert set(results[DISTANCE_EQUIRECTANGULAR]) == set(
+            results[DISTANCE_HAVERSINE]
+        )
+        for external_id, entry in results[DISTANCE_HAVERSINE].items():
+            for model in DISTANCE_MODELS:
+                self.assertAlmostEqual(
+                    results[model][external_id].distance_to_home,
+                    entry.distance_to_home,
+                    delta=0.5,
+                )
+
+        with self.assertRaises(GeoJsonException):
+            GenericFeed(home_coordinates, None, distance_model="unknown")
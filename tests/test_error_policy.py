@@ -0,0 +1,140 @@
+"""Tests for the error handling policies."""
+import datetime
+import unittest
+from unittest import mock
+
+from geojson_client import UPDATE_ERROR, UPDATE_OK_NO_DATA
+from geojson_client.error_policy import CircuitBreaker, StaleWhileErrorPolicy
+from geojson_client.generic_feed import GenericFeedManager
+from tests.utils import load_fixture
+
+
+class TestStaleWhileErrorPolicy(unittest.TestCase):
+    """Tests for the stale-while-error policy."""
+
+    def test_keep_stale(self):
+        """Test the limits of the policy."""
+        now = datetime.datetime.now()
+        policy = StaleWhileErrorPolicy(max_failures=2, max_stale_seconds=60.0)
+        assert policy.keep_stale(1, now)
+        assert policy.keep_stale(2, now)
+        assert not policy.keep_stale(3, now)
+        assert not policy.keep_stale(1, now - datetime.timedelta(minutes=5))
+        assert not policy.keep_stale(1, None)
+        assert StaleWhileErrorPolicy().keep_stale(100, now)
+
+
+class TestCircuitBreaker(unittest.TestCase):
+    """Tests for the circuit breaker."""
+
+    @mock.patch("time.monotonic")
+    def test_circuit_breaker(self, mock_monotonic):
+        """Test opening and closing the circuit."""
+        mock_monotonic.return_value = 1000.0
+        circuit_breaker = CircuitBreaker(
+            failure_threshold=2, backoff=10.0, max_backoff=15.0
+        )
+        circuit_breaker.record_failure()
+        assert circuit_breaker.allow_request()
+        circuit_breaker.record_failure()
+        assert not circuit_breaker.allow_request()
+        assert circuit_breaker.retry_in == 10.0
+        mock_monotonic.return_value = 1010.0
+        assert circuit_breaker.allow_request()
+        # Failing again doubles the backoff, up to the maximum.
+        circuit_breaker.record_failure()
+        assert circuit_breaker.retry_in == 15.0
+        assert repr(circuit_breaker) == "<CircuitBreaker(failures=3, open=True)>"
+        circuit_breaker.record_success()
+        assert circuit_breaker.allow_request()
+        assert circuit_breaker.failures == 0
+
+
+class TestFeedManagerErrorPolicy(unittest.TestCase):
+    """Tests for the feed manager using error handling policies."""
+
+    @mock.patch("requests.Request")
+    @mock.patch("requests.Session")
+    def test_feed_manager_stale_while_error(self, mock_session, mock_request):
+        """Test keeping the last good state during update errors."""
+        mock_session.return_value.__enter__.return_value.send.return_value.ok = True
+        mock_session.return_value.__enter__.return_value.send.return_value.text = (
+            load_fixture("generic_feed_1.json")
+        )
+        removed_entity_external_ids = []
+        feed_manager = GenericFeedManager(
+            lambda external_id: None,
+            lambda external_id: None,
+            removed_entity_external_ids.append,
+            (-31.0, 151.0),
+            None,
+            stale_while_error=StaleWhileErrorPolicy(max_failures=2),
+            keep_last_data=True,
+        )
+        feed_manager.update()
+        assert len(feed_manager.feed_entries) == 5
+
+        mock_session.return_value.__enter__.return_value.send.return_value.ok = False
+        for failures in (1, 2):
+            feed_manager.update()
+            assert len(feed_manager.feed_entries) == 5
+            assert len(removed_entity_external_ids) == 0
+            assert feed_manager.stale
+            assert feed_manager.consecutive_failures == failures
+            assert feed_manager.snapshot.stale
+            assert feed_manager.snapshot.status == UPDATE_ERROR
+
+        # The last data is kept, so stale entries can be filtered again.
+        feed_manager.reevaluate(filter_overrides={"radius": 750.0})
+        assert len(feed_manager.feed_entries) == 2
+        assert not feed_manager.snapshot.stale
+        feed_manager.update()
+        assert feed_manager.snapshot.stale
+
+        # An unchanged feed is no longer stale.
+        with mock.patch.object(
+            feed_manager.feed, "update", return_value=(UPDATE_OK_NO_DATA, None)
+        ):
+            feed_manager.update()
+        assert len(feed_manager.feed_entries) == 2
+        assert not feed_manager.snapshot.stale
+        assert feed_manager.snapshot.status == UPDATE_OK_NO_DATA
+        assert feed_manager.snapshot.consecutive_failures == 0
+        for failures in (1, 2):
+            feed_manager.update()
+
+        # Exceeding the limit removes all entities.
+        feed_manager.update()
+        assert len(feed_manager.feed_entries) == 0
+        assert len(removed_entity_external_ids) == 5
+        assert feed_manager.feed.reevaluate()[0] == UPDATE_OK_NO_DATA
+        assert not feed_manager.stale
+
+        # A successful update resets the failures.
+        mock_session.return_value.__enter__.return_value.send.return_value.ok = True
+        feed_manager.update()
+        assert feed_manager.consecutive_failures == 0
+        assert not feed_manager.snapshot.stale
+
+    @mock.patch("requests.Request")
+    @mock.patch("requests.Session")
+    def test_feed_manager_circuit_breaker(self, mock_session, mock_request):
+        """Test not fetching the feed while the circuit is open."""
+        mock_session.return_value.__enter__.return_value.send.return_value.ok = False
+        circuit_breaker = CircuitBreaker(failure_threshold=2, backoff=60.0)
+        feed_manager = GenericFeedManager(
+            lambda external_id: None,
+            lambda external_id: None,
+            lambda external_id: None,
+            (-31.0, 151.0),
+            None,
+            circuit_breaker=circuit_breaker,
+        )
+        feed_send = mock_session.return_value.__enter__.return_value.send
+        feed_manager.update()
+        feed_manager.update()
+        assert feed_send.call_count == 2
+        assert circuit_breaker.is_open
+        feed_manager.update_override({"radius": 10.0})
+        assert feed_send.call_count == 2
+        assert feed_manager.consecutive_failures == 3
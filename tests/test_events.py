@@ -0,0 +1,172 @@
+"""Tests for the feed manager change events."""
+import asyncio
+import threading
+import unittest
+from queue import Empty
+from unittest import mock
+
+from geojson_client.events import (
+    BACKPRESSURE_BLOCK,
+    BACKPRESSURE_COALESCE,
+    BACKPRESSURE_DROP_OLDEST,
+    EVENT_CREATED,
+    EVENT_REMOVED,
+    EVENT_UPDATED,
+    FeedEvent,
+    FeedEventSubscription,
+)
+from geojson_client.generic_feed import GenericFeedManager
+from tests.utils import load_fixture
+
+
+class TestFeedEventSubscription(unittest.TestCase):
+    """Tests for the feed event subscription."""
+
+    def test_iterate(self):
+        """Test consuming events as an iterator."""
+        subscription = FeedEventSubscription()
+        subscription.publish(FeedEvent(EVENT_CREATED, "1", None, 1))
+        subscription.publish(FeedEvent(EVENT_UPDATED, "1", None, 2))
+        subscription.close()
+        events = list(subscription)
+        assert [event.event_type for event in events] == [
+            EVENT_CREATED,
+            EVENT_UPDATED,
+        ]
+        assert repr(events[0]) == "<FeedEvent(type=created, id=1, generation=1)>"
+        with self.assertRaises(Empty):
+            subscription.get(timeout=0)
+
+    def test_invalid_configuration(self):
+        """Test invalid subscription configuration."""
+        with self.assertRaises(ValueError):
+            FeedEventSubscription(backpressure="DOES NOT EXIST")
+        with self.assertRaises(ValueError):
+            FeedEventSubscription(max_size=0)
+
+    def test_drop_oldest(self):
+        """Test dropping the oldest event if the queue is full."""
+        subscription = FeedEventSubscription(
+            max_size=2, backpressure=BACKPRESSURE_DROP_OLDEST
+        )
+        for external_id in ("1", "2", "3"):
+            subscription.publish(FeedEvent(EVENT_CREATED, external_id, None, 1))
+        assert len(subscription) == 2
+        assert subscription.dropped == 1
+        assert subscription.get().external_id == "2"
+
+    def test_block(self):
+        """Test blocking the publisher until the consumer catches up."""
+        subscription = FeedEventSubscription(
+            max_size=1, backpressure=BACKPRESSURE_BLOCK
+        )
+        subscription.publish(FeedEvent(EVENT_CREATED, "1", None, 1))
+        publisher = threading.Thread(
+            target=subscription.publish,
+            args=(FeedEvent(EVENT_CREATED, "2", None, 1),),
+        )
+        publisher.start()
+        publisher.join(0.05)
+        assert publisher.is_alive()
+        assert subscription.get().external_id == "1"
+        publisher.join(1.0)
+        assert not publisher.is_alive()
+        assert subscription.get().external_id == "2"
+        assert subscription.dropped == 0
+
+    def test_block_timeout(self):
+        """Test dropping the oldest event after blocking for too long."""
+        subscription = FeedEventSubscription(
+            max_size=1, backpressure=BACKPRESSURE_BLOCK, block_timeout=0.01
+        )
+        subscription.publish(FeedEvent(EVENT_CREATED, "1", None, 1))
+        with self.assertLogs("geojson_client.events", "WARNING") as logs:
+            subscription.publish(FeedEvent(EVENT_CREATED, "2", None, 1))
+        assert "did not catch up within 0.01 seconds" in logs.output[0]
+        assert subscription.dropped == 1
+        assert subscription.get().external_id == "2"
+
+    def test_coalesce(self):
+        """Test coalescing events per external id."""
+        subscription = FeedEventSubscription(
+            max_size=3, backpressure=BACKPRESSURE_COALESCE
+        )
+        subscription.publish(FeedEvent(EVENT_CREATED, "1", "A", 1))
+        subscription.publish(FeedEvent(EVENT_UPDATED, "1", "B", 2))
+        subscription.publish(FeedEvent(EVENT_UPDATED, "2", "C", 2))
+        subscription.publish(FeedEvent(EVENT_REMOVED, "2", "C", 3))
+        subscription.publish(FeedEvent(EVENT_CREATED, "3", "D", 3))
+        subscription.publish(FeedEvent(EVENT_REMOVED, "3", "D", 4))
+        assert subscription.dropped == 0
+        event = subscription.get()
+        assert event.event_type == EVENT_CREATED
+        assert event.entry == "B"
+        assert event.generation == 2
+        event = subscription.get()
+        assert event.event_type == EVENT_REMOVED
+        assert event.external_id == "2"
+        assert len(subscription) == 0
+
+    def test_async_iterate(self):
+        """Test consuming events as an async iterator."""
+        subscription = FeedEventSubscription()
+
+        async def consume():
+            return [event.external_id async for event in subscription]
+
+        def produce():
+            for external_id in ("1", "2"):
+                subscription.publish(FeedEvent(EVENT_CREATED, external_id, None, 1))
+            subscription.close()
+
+        async def run():
+            task = asyncio.ensure_future(consume())
+            await asyncio.sleep(0)
+            threading.Thread(target=produce).start()
+            return await asyncio.wait_for(task, 1.0)
+
+        assert asyncio.run(run()) == ["1", "2"]
+
+
+class TestFeedManagerEvents(unittest.TestCase):
+    """Tests for change events produced by the feed manager."""
+
+    @mock.patch("requests.Request")
+    @mock.patch("requests.Session")
+    def test_feed_manager_events(self, mock_session, mock_request):
+        """Test subscribing to feed manager change events."""
+        mock_session.return_value.__enter__.return_value.send.return_value.ok = True
+        mock_session.return_value.__enter__.return_value.send.return_value.text = (
+            load_fixture("generic_feed_1.json")
+        )
+        feed_manager = GenericFeedManager(
+            lambda external_id: None,
+            lambda external_id: None,
+            lambda external_id: None,
+            (-31.0, 151.0),
+            None,
+        )
+        subscription = feed_manager.subscribe()
+        feed_manager.update()
+        events = [subscription.get(timeout=0) for _ in range(len(subscription))]
+        assert len(events) == 5
+        assert all(event.event_type == EVENT_CREATED for event in events)
+        assert all(event.generation == 1 for event in events)
+
+        mock_session.return_value.__enter__.return_value.send.return_value.text = (
+            load_fixture("generic_feed_2.json")
+        )
+        feed_manager.update()
+        events = [subscription.get(timeout=0) for _ in range(len(subscription))]
+        event_types = [event.event_type for event in events]
+        assert event_types.count(EVENT_REMOVED) == 3
+        assert event_types.count(EVENT_UPDATED) == 2
+        assert event_types.count(EVENT_CREATED) == 1
+        removed = [event for event in events if event.event_type == EVENT_REMOVED]
+        assert all(event.entry is not None for event in removed)
+
+        feed_manager.unsubscribe(subscription)
+        mock_session.return_value.__enter__.return_value.send.return_value.ok = False
+        feed_manager.update()
+        assert subscription.closed
+        assert len(subscription) == 0
@@ -0,0 +1,142 @@
+"""Tests for the fetch policy."""
+import threading
+import unittest
+from unittest import mock
+
+import requests
+
+from geojson_client import UPDATE_ERROR, UPDATE_OK
+from geojson_client.fetch_policy import FetchPolicy, FetchStatus
+from geojson_client.generic_feed import GenericFeed
+from geojson_client.transport import TransferStats
+from tests.utils import load_fixture
+
+
+class TestFetchPolicy(unittest.TestCase):
+    """Tests for the fetch policy."""
+
+    def test_timeouts(self):
+        """Test passing separate connect and read timeouts."""
+        send = mock.MagicMock()
+        send.return_value.ok = True
+        status = FetchStatus()
+        policy = FetchPolicy(connect_timeout=2.0, read_timeout=20.0)
+        assert policy.execute(send, status) == send.return_value
+        send.assert_called_once_with((2.0, 20.0))
+        assert status.attempts == 1
+
+    def test_deadline_limits_timeouts(self):
+        """Test limiting the timeouts to the overall deadline."""
+        send = mock.MagicMock()
+        send.return_value.ok = True
+        policy = FetchPolicy(connect_timeout=2.0, read_timeout=20.0, deadline=5.0)
+        policy.execute(send, FetchStatus())
+        connect_timeout, read_timeout = send.call_args[0][0]
+        assert connect_timeout == 2.0
+        assert read_timeout <= 5.0
+
+    @mock.patch("time.sleep")
+    def test_retries(self, mock_sleep):
+        """Test retrying after errors."""
+        ok_response = mock.MagicMock(ok=True, status_code=200)
+        unavailable_response = mock.MagicMock(ok=False, status_code=503)
+        send = mock.MagicMock(
+            side_effect=[
+                requests.exceptions.ConnectionError("Connection refused"),
+                unavailable_response,
+                ok_response,
+            ]
+        )
+        status = FetchStatus()
+        policy = FetchPolicy(retries=2, backoff=1.0)
+        assert policy.execute(send, status) == ok_response
+        assert status.attempts == 3
+        assert status.status_code == 200
+        self.assertIsNone(status.error)
+        assert mock_sleep.call_count == 2
+        # Backoff is jittered below an exponentially growing limit.
+        assert 0.0 <= mock_sleep.call_args_list[0][0][0] <= 1.0
+        assert 0.0 <= mock_sleep.call_args_list[1][0][0] <= 2.0
+
+    @mock.patch("time.sleep")
+    def test_retries_exhausted(self, mock_sleep):
+        """Test giving up after the last retry."""
+        send = mock.MagicMock(side_effect=requests.exceptions.Timeout("Timed out"))
+        status = FetchStatus()
+        with self.assertRaises(requests.exceptions.Timeout):
+            FetchPolicy(retries=1).execute(send, status)
+        assert status.attempts == 2
+        assert status.error == "Timed out"
+
+        # A non-retryable status code is returned without retrying.
+        send = mock.MagicMock(return_value=mock.MagicMock(ok=False, status_code=404))
+        status = FetchStatus()
+        assert FetchPolicy(retries=1).execute(send, status).status_code == 404
+        assert status.attempts == 1
+
+    def test_hedged_request(self):
+        """Test sending a hedged request when the first one is slow."""
+        release = threading.Event()
+        finished = threading.Event()
+        hedged_response = mock.MagicMock(ok=True, status_code=200)
+        hedged_response.transfer = TransferStats(100, 400)
+        calls = []
+
+        def send(timeout):
+            calls.append(timeout)
+            if len(calls) == 1:
+                release.wait(5.0)
+                slow_response = mock.MagicMock(ok=True, status_code=200)
+                slow_response.transfer = TransferStats(1000, 4000)
+                finished.set()
+                return slow_response
+            return hedged_response
+
+        status = FetchStatus()
+        policy = FetchPolicy(hedge_after=0.01)
+        assert policy.execute(send, status) == hedged_response
+        release.set()
+        assert finished.wait(5.0)
+        assert status.hedged_requests == 1
+        assert status.attempts == 1
+        assert len(calls) == 2
+        # Only the response that was used is recorded.
+        assert status.wire_bytes == 100
+        assert status.decoded_bytes == 400
+
+    def test_hedged_request_not_needed(self):
+        """Test not sending a hedged request if the first one is fast."""
+        send = mock.MagicMock()
+        send.return_value.ok = True
+        status = FetchStatus()
+        FetchPolicy(hedge_after=5.0).execute(send, status)
+        assert status.hedged_requests == 0
+        assert send.call_count == 1
+
+    @mock.patch("time.sleep")
+    @mock.patch("requests.Request")
+    @mock.patch("requests.Session")
+    def test_feed_with_fetch_policy(self, mock_session, mock_request, mock_sleep):
+        """Test updating a feed with retries."""
+        ok_response = mock.MagicMock(ok=True, status_code=200)
+        ok_response.text = load_fixture("generic_feed_1.json")
+        mock_session.return_value.__enter__.return_value.send.side_effect = [
+            requests.exceptions.ConnectionError(),
+            ok_response,
+        ]
+        feed = GenericFeed((-31.0, 151.0), None, fetch_policy=FetchPolicy(retries=1))
+        status, entries = feed.update()
+        assert status == UPDATE_OK
+        assert len(entries) == 5
+        assert feed.last_fetch_status.attempts == 2
+        assert repr(feed.last_fetch_status).startswith(
+            "<FetchStatus(attempts=2, hedged=0, "
+        )
+
+        mock_session.return_value.__enter__.return_value.send.side_effect = (
+            requests.exceptions.ConnectionError()
+        )
+        status, entries = feed.update()
+        assert status == UPDATE_ERROR
+        assert feed.last_fetch_status.attempts == 2
+        assert feed.last_fetch_status.error == "ConnectionError"
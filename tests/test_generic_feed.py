@@ -1,12 +1,17 @@
 """Test for the generic geojson feed."""
+import datetime
+import json
 import unittest
 from json import JSONDecodeError
 from unittest import mock
 
+import geojson
 import requests
 
-from geojson_client import UPDATE_ERROR, UPDATE_OK
+from geojson_client import UPDATE_ERROR, UPDATE_OK, UPDATE_OK_NO_DATA
 from geojson_client.generic_feed import GenericFeed, GenericFeedManager
+from geojson_client.mapping import FeedMapping
+from geojson_client.transport import StubTransport
 from tests.utils import load_fixture
 
 
@@ -55,6 +60,42 @@ class TestGenericFeed(unittest.TestCase):
         assert feed_entry.title == "Title 5"
         assert feed_entry.external_id == "7890"
 
+    @mock.patch("requests.Request")
+    @mock.patch("requests.Session")
+    def test_update_ok_with_mapping(self, mock_session, mock_request):
+        """Test extracting fields with a mapping."""
+        home_coordinates = (-31.0, 151.0)
+        mock_session.return_value.__enter__.return_value.send.return_value.ok = True
+        mock_session.return_value.__enter__.return_value.send.return_value.text = (
+            load_fixture("nsw_rural_fire_service_feed.json")
+        )
+        mapping = FeedMapping(
+            external_id=("properties", "guid"),
+            timestamp="pubDate",
+            timestamp_format="%d/%m/%Y %I:%M:%S %p",
+            category="category",
+        )
+
+        feed = GenericFeed(home_coordinates, None, mapping=mapping)
+        assert feed.mapping is mapping
+        status, entries = feed.update()
+        assert status == UPDATE_OK
+        assert len(entries) == 3
+
+        feed_entry = entries[0]
+        assert feed_entry.external_id == "1234"
+        assert feed_entry.title == "Title 1"
+        assert feed_entry.category == "Category 1"
+        assert feed_entry.timestamp == datetime.datetime(2018, 9, 21, 6, 30)
+        assert feed_entry.numbers == {}
+        self.assertIsNone(entries[2].category)
+        assert feed.last_timestamp == datetime.datetime(2018, 9, 21, 6, 40)
+
+        # Fields are extracted only once.
+        with mock.patch.object(mapping, "extract") as mock_extract:
+            assert feed_entry.external_id == "1234"
+            assert mock_extract.call_count == 0
+
     @mock.patch("requests.Request")
     @mock.patch("requests.Session")
     def test_update_ok_with_filtering(self, mock_session, mock_request):
@@ -91,6 +132,48 @@ class TestGenericFeed(unittest.TestCase):
         assert len(entries) == 1
         self.assertAlmostEqual(entries[0].distance_to_home, 77.0, 1)
 
+    @mock.patch("requests.Request")
+    @mock.patch("requests.Session")
+    @mock.patch("geojson.loads", wraps=geojson.loads)
+    def test_update_skip_unchanged(self, mock_loads, mock_session, mock_request):
+        """Test skipping a response that has not changed."""
+        home_coordinates = (-31.0, 151.0)
+        mock_response = mock_session.return_value.__enter__.return_value.send
+        mock_response.return_value.ok = True
+        mock_response.return_value.text = load_fixture("generic_feed_1.json")
+        mock_response.return_value.content = mock_response.return_value.text.encode()
+
+        feed = GenericFeed(home_coordinates, None, skip_unchanged=True)
+        status, entries = feed.update()
+        assert status == UPDATE_OK
+        assert len(entries) == 5
+        status, entries = feed.update()
+        assert status == UPDATE_OK_NO_DATA
+        self.assertIsNone(entries)
+        assert mock_loads.call_count == 1
+
+        # Changed filters are applied even if the response has not changed.
+        status, entries = feed.update_override({"radius": 740.0})
+        assert status == UPDATE_OK
+        assert len(entries) == 2
+        status, entries = feed.update_override({"radius": 740.0})
+        assert status == UPDATE_OK_NO_DATA
+
+        # After an error, the next response is returned in full.
+        mock_response.return_value.ok = False
+        status, entries = feed.update()
+        assert status == UPDATE_ERROR
+        mock_response.return_value.ok = True
+        status, entries = feed.update()
+        assert status == UPDATE_OK
+        assert len(entries) == 5
+
+        mock_response.return_value.text = load_fixture("generic_feed_2.json")
+        mock_response.return_value.content = mock_response.return_value.text.encode()
+        status, entries = feed.update()
+        assert status == UPDATE_OK
+        assert len(entries) == 3
+
     @mock.patch("requests.Request")
     @mock.patch("requests.Session")
     def test_update_error(self, mock_session, mock_request):
@@ -240,3 +323,212 @@ class TestGenericFeed(unittest.TestCase):
         assert len(generated_entity_external_ids) == 0
         assert len(updated_entity_external_ids) == 0
         assert len(removed_entity_external_ids) == 3
+
+    @mock.patch("requests.Request")
+    @mock.patch("requests.Session")
+    def test_reevaluate_without_last_data(self, mock_session, mock_request):
+        """Test not keeping the last data unless requested."""
+        mock_send = mock_session.return_value.__enter__.return_value.send
+        mock_send.return_value.ok = True
+        mock_send.return_value.text = load_fixture("generic_feed_1.json")
+        mock_send.return_value.content = mock_send.return_value.text.encode()
+        feed = GenericFeed(
+            (-31.0, 151.0), None, filter_radius=740.0, skip_unchanged=True
+        )
+        status, entries = feed.update()
+        assert len(entries) == 2
+        self.assertIsNone(feed._last_data)
+        status, entries = feed.reevaluate(home_coordinates=(-37.0, 150.0))
+        assert status == UPDATE_OK_NO_DATA
+        # The unchanged feed is filtered again for the new home.
+        status, entries = feed.update()
+        assert status == UPDATE_OK
+        assert len(entries) == 5
+
+    @mock.patch("requests.Request")
+    @mock.patch("requests.Session")
+    def test_feed_manager_reevaluate(self, mock_session, mock_request):
+        """Test filtering the feed again for a new location."""
+        home_coordinates = (-31.0, 151.0)
+        mock_send = mock_session.return_value.__enter__.return_value.send
+        mock_send.return_value.ok = True
+        mock_send.return_value.text = load_fixture("generic_feed_1.json")
+
+        generated_entity_external_ids = []
+        updated_entity_external_ids = []
+        removed_entity_external_ids = []
+        feed_manager = GenericFeedManager(
+            generated_entity_external_ids.append,
+            updated_entity_external_ids.append,
+            removed_entity_external_ids.append,
+            home_coordinates,
+            None,
+            filter_radius=740.0,
+            keep_last_data=True,
+        )
+        # Nothing to filter before the feed has been fetched.
+        feed_manager.reevaluate()
+        assert len(feed_manager.feed_entries) == 0
+
+        feed_manager.update()
+        assert set(feed_manager.feed_entries) == {"3456", "4567"}
+
+        generated_entity_external_ids.clear()
+        feed_manager.reevaluate(home_coordinates=(-37.0, 150.0))
+        assert feed_manager.feed.home_coordinates == (-37.0, 150.0)
+        assert len(feed_manager.feed_entries) == 5
+        assert len(generated_entity_external_ids) == 3
+        assert len(updated_entity_external_ids) == 2
+        self.assertAlmostEqual(
+            feed_manager.feed_entries["4567"].distance_to_home, 77.0, 1
+        )
+
+        feed_manager.reevaluate(filter_overrides={"radius": 80.0})
+        assert set(feed_manager.feed_entries) == {"4567"}
+        assert len(removed_entity_external_ids) == 4
+        assert mock_send.call_count == 1
+
+        # Nothing is left to filter after an error.
+        mock_send.return_value.ok = False
+        feed_manager.update()
+        feed_manager.reevaluate(home_coordinates=home_coordinates)
+        assert len(feed_manager.feed_entries) == 0
+
+    @mock.patch("requests.Request")
+    @mock.patch("requests.Session")
+    def test_feed_manager_snapshot(self, mock_session, mock_request):
+        """Test the snapshots published by the feed manager."""
+        home_coordinates = (-31.0, 151.0)
+        mock_session.return_value.__enter__.return_value.send.return_value.ok = True
+        mock_session.return_value.__enter__.return_value.send.return_value.text = (
+            load_fixture("generic_feed_1.json")
+        )
+
+        feed_manager = GenericFeedManager(
+            lambda external_id: None,
+            lambda external_id: None,
+            lambda external_id: None,
+            home_coordinates,
+            None,
+        )
+        snapshot = feed_manager.snapshot
+        assert snapshot.generation == 0
+        self.assertIsNone(snapshot.status)
+        assert len(snapshot.feed_entries) == 0
+
+        feed_manager.update()
+        first_snapshot = feed_manager.snapshot
+        assert first_snapshot.generation == 1
+        assert first_snapshot.status == UPDATE_OK
+        assert len(first_snapshot.feed_entries) == 5
+        assert first_snapshot.managed_external_ids == set(first_snapshot.feed_entries)
+        self.assertIsNotNone(first_snapshot.last_update)
+        assert repr(first_snapshot) == (
+            "<FeedManagerSnapshot(generation=1, status=OK, entries=5)>"
+        )
+        with self.assertRaises(TypeError):
+            first_snapshot.feed_entries["new"] = None
+
+        mock_session.return_value.__enter__.return_value.send.return_value.text = (
+            load_fixture("generic_feed_2.json")
+        )
+        feed_manager.update()
+        assert feed_manager.snapshot.generation == 2
+        assert len(feed_manager.snapshot.feed_entries) == 3
+        # Previously published snapshots are not affected by later updates.
+        assert len(first_snapshot.feed_entries) == 5
+
+        mock_session.return_value.__enter__.return_value.send.return_value.ok = False
+        feed_manager.update()
+        assert feed_manager.snapshot.generation == 3
+        assert feed_manager.snapshot.status == UPDATE_ERROR
+        assert len(feed_manager.snapshot.feed_entries) == 0
+        assert len(first_snapshot.feed_entries) == 5
+
+    @mock.patch("requests.Request")
+    @mock.patch("requests.Session")
+    def test_feed_manager_external_ids(self, mock_session, mock_request):
+        """Test external ids are interned and problems with them reported."""
+        mock_response = mock_session.return_value.__enter__.return_value.send
+        mock_response.return_value.ok = True
+        mock_response.return_value.text = load_fixture("generic_feed_1.json")
+        feed_manager = GenericFeedManager(
+            lambda external_id: None,
+            lambda external_id: None,
+            lambda external_id: None,
+            (-31.0, 151.0),
+            None,
+        )
+        feed_manager.update()
+        first_ids = {
+            str(external_id): external_id for external_id in feed_manager.feed_entries
+        }
+        feed_manager.update()
+        for external_id in feed_manager.feed_entries:
+            # The same objects, although the feed was decoded again.
+            assert external_id is first_ids[str(external_id)]
+        assert feed_manager.duplicate_external_ids == frozenset()
+
+        def feature(external_id, longitude):
+            return {
+                "type": "Feature",
+                "id": external_id,
+                "geometry": {"type": "Point", "coordinates": [longitude, -31.0]},
+                "properties": {},
+            }
+
+        mock_response.return_value.text = json.dumps(
+            {
+                "type": "FeatureCollection",
+                "features": [
+                    feature("1", 151.0),
+                    feature("1", 151.1),
+                    feature(None, 151.2),
+                ],
+            }
+        )
+        with self.assertLogs("geojson_client.feed_manager", "WARNING") as logs:
+            feed_manager.update()
+        assert feed_manager.duplicate_external_ids == {"1"}
+        assert "duplicate external ids: 1" in logs.output[0]
+        entries = list(feed_manager.feed_entries.values())
+        assert entries[0].coordinates == (-31.0, 151.1)
+        assert not entries[0].external_id_from_coordinates
+        assert entries[1].external_id_from_coordinates
+
+        # The entry without an id moves.
+        mock_response.return_value.text = json.dumps(
+            {
+                "type": "FeatureCollection",
+                "features": [feature("1", 151.0), feature(None, 151.3)],
+            }
+        )
+        with self.assertLogs("geojson_client.feed_manager", "WARNING") as logs:
+            feed_manager.update()
+        assert "1 entries of" in logs.output[0]
+        assert "probably moved" in logs.output[0]
+        assert feed_manager.duplicate_external_ids == frozenset()
+
+    def test_feed_manager_feed_options(self):
+        """Test passing the feed options through the feed manager."""
+        transport = StubTransport(
+            [(200, {}, load_fixture("generic_feed_1.json").encode("utf-8"))]
+        )
+        feed_manager = GenericFeedManager(
+            lambda external_id: None,
+            lambda external_id: None,
+            lambda external_id: None,
+            (-31.0, 151.0),
+            "https://example.com/feed.json",
+            skip_unchanged=True,
+            mapping=FeedMapping(title="description"),
+            transport=transport,
+        )
+        feed_manager.update()
+        assert len(transport.requests) == 1
+        assert transport.requests[0].url == "https://example.com/feed.json"
+        assert len(feed_manager.feed_entries) == 5
+        titles = {entry.title for entry in feed_manager.feed_entries.values()}
+        assert "Title 1" not in titles
+        # The unchanged body is skipped.
+        assert feed_manager.feed.update()[0] == UPDATE_OK_NO_DATA
@@ -0,0 +1,309 @@
+"""Tests for the geometry engine."""
+import unittest
+from unittest import mock
+from unittest.mock import MagicMock
+
+from geojson import (
+    GeometryCollection,
+    LineString,
+    MultiLineString,
+    MultiPoint,
+    MultiPolygon,
+    Point,
+    Polygon,
+)
+from haversine import haversine
+
+from geojson_client import geometry
+from geojson_client.distance import (
+    DISTANCE_EQUIRECTANGULAR,
+    DISTANCE_MODELS,
+    haversine_distance,
+)
+from geojson_client.geometry import (
+    GeometryKernel,
+    LruCache,
+    PreparedPolygon,
+    distance_to_polygon,
+    prepare_polygon,
+)
+
+SQUARE = [
+    [151.0, -30.0],
+    [151.5, -30.0],
+    [151.5, -30.5],
+    [151.0, -30.5],
+    [151.0, -30.0],
+]
+HOLE = [
+    [151.2, -30.2],
+    [151.3, -30.2],
+    [151.3, -30.3],
+    [151.2, -30.3],
+    [151.2, -30.2],
+]
+
+
+class TestPreparedPolygon(unittest.TestCase):
+    """Tests for prepared polygons."""
+
+    def setUp(self):
+        """Start without any cached polygons."""
+        geometry.clear_caches()
+
+    def test_contains(self):
+        """Test the point-in-polygon test, including holes."""
+        polygon = PreparedPolygon([SQUARE, HOLE])
+        assert polygon.bbox == (-30.5, 151.0, -30.0, 151.5)
+        assert polygon.contains(-30.1, 151.1)
+        assert not polygon.contains(-30.25, 151.25)
+        assert not polygon.contains(-31.0, 151.1)
+        assert repr(polygon) == (
+            "<PreparedPolygon(rings=2, bbox=(-30.5, 151.0, -30.0, 151.5))>"
+        )
+
+    def test_distance(self):
+        """Test the distance to the closest edge."""
+        polygon = PreparedPolygon([SQUARE, HOLE])
+        assert polygon.distance((-30.1, 151.1)) == 0.0
+        # Closest to a vertex.
+        self.assertAlmostEqual(polygon.distance((-31.0, 150.0)), 110.6, 1)
+        # Closest to the middle of an edge, not to any vertex.
+        distance = polygon.distance((-30.25, 150.5))
+        self.assertAlmostEqual(distance, haversine((-30.25, 150.5), (-30.25, 151.0)), 2)
+        # Inside the hole, closest to the hole's edge.
+        self.assertAlmostEqual(
+            polygon.distance((-30.25, 151.25)),
+            haversine((-30.25, 151.25), (-30.25, 151.2)),
+            2,
+        )
+        assert PreparedPolygon([]).distance((-30.0, 151.0)) == float("inf")
+
+    def test_lower_bound(self):
+        """Test ruling out polygons that are certainly too far away."""
+        polygon = PreparedPolygon([SQUARE])
+        for home_coordinates in [(-31.0, 150.0), (-20.0, 151.2), (-30.2, 100.0)]:
+            self.assertLessEqual(
+                polygon.lower_bound(home_coordinates),
+                polygon.distance(home_coordinates) + 1e-6,
+            )
+        assert polygon.lower_bound((-30.2, 151.2)) == 0.0
+        distance = polygon.distance((-20.0, 151.2), max_distance=100.0)
+        assert 100.0 < distance <= polygon.distance((-20.0, 151.2)) + 1e-6
+
+    def test_great_circle_edges(self):
+        """Test the same great-circle edges in all calculations."""
+        # The long northern edge bulges north to 63.43 degrees.
+        polygon = PreparedPolygon([[[0, 60], [60, 60], [60, 50], [0, 50], [0, 60]]])
+        self.assertAlmostEqual(polygon.bounds[2], 63.43, 2)
+        assert polygon.bbox == (50.0, 0.0, 60.0, 60.0)
+        for home_coordinates in [(61.0, 30.0), (63.0, 30.0)]:
+            assert polygon.contains(*home_coordinates)
+            assert polygon.distance(home_coordinates) == 0.0
+            assert polygon.distance(home_coordinates, max_distance=100.0) == 0.0
+        assert not polygon.contains(64.0, 30.0)
+        distance = polygon.distance((64.0, 30.0))
+        self.assertAlmostEqual(distance, 62.8, 1)
+        assert polygon.distance((64.0, 30.0), max_distance=100.0) == distance
+        self.assertLessEqual(polygon.lower_bound((64.0, 30.0)), distance)
+
+    def test_caches(self):
+        """Test reusing prepared polygons and distances."""
+        assert prepare_polygon([SQUARE]) is prepare_polygon([list(SQUARE)])
+        self.assertAlmostEqual(distance_to_polygon((-31.0, 150.0), [SQUARE]), 110.6, 1)
+        self.assertAlmostEqual(distance_to_polygon((-31.0, 150.0), [SQUARE]), 110.6, 1)
+        assert geometry._POLYGON_DISTANCES.hits == 1
+        # Lower bounds are not cached.
+        distance_to_polygon((-20.0, 151.2), [SQUARE], max_distance=100.0)
+        assert len(geometry._POLYGON_DISTANCES) == 1
+
+    def test_cached_estimate(self):
+        """Test checking cached approximate distances near the radius again."""
+        model = DISTANCE_MODELS[DISTANCE_EQUIRECTANGULAR]
+        exact = distance_to_polygon((-31.0, 150.0), [SQUARE])
+        geometry.clear_caches()
+        estimate = distance_to_polygon((-31.0, 150.0), [SQUARE], model=model)
+        assert estimate != exact
+        radius = (estimate + exact) / 2
+        assert distance_to_polygon((-31.0, 150.0), [SQUARE], radius, model) == exact
+        assert geometry._POLYGON_DISTANCES.hits == 1
+        # Far from the radius, the cached estimate is used.
+        assert distance_to_polygon((-31.0, 150.0), [SQUARE], 50.0, model) == exact
+        geometry.clear_caches()
+        distance_to_polygon((-31.0, 150.0), [SQUARE], model=model)
+        assert distance_to_polygon((-31.0, 150.0), [SQUARE], 50.0, model) == estimate
+
+    def test_closest_point(self):
+        """Test finding the closest point of great-circle edges."""
+        # The edge between two points on the 60th parallel bulges north.
+        chains = [([60.0, 60.0], [0.0, 90.0])]
+        latitude, longitude = geometry.closest_point(chains, 75.0, 45.0)
+        self.assertAlmostEqual(latitude, 67.79, 2)
+        self.assertAlmostEqual(longitude, 45.0, 6)
+        # Beyond the ends of the edge, the closest point is a vertex.
+        latitude, longitude = geometry.closest_point(chains, 60.0, 120.0)
+        self.assertAlmostEqual(latitude, 60.0, 6)
+        self.assertAlmostEqual(longitude, 90.0, 6)
+
+    def test_polygon_key_once(self):
+        """Test building the key of the same rings only once."""
+        rings = [SQUARE]
+        with mock.patch(
+            "geojson_client.geometry.polygon_key", wraps=geometry.polygon_key
+        ) as polygon_key:
+            prepared = prepare_polygon(rings)
+            distance_to_polygon((-31.0, 150.0), rings, max_distance=500.0)
+            distance_to_polygon((-31.0, 150.0), rings)
+            assert prepare_polygon(rings) is prepared
+            assert polygon_key.call_count == 1
+            # Equal rings of another feature share the prepared polygon.
+            assert prepare_polygon([list(SQUARE)]) is prepared
+            assert polygon_key.call_count == 2
+        assert prepared.key == geometry.polygon_key(rings)
+
+    def test_lru_cache(self):
+        """Test evicting the least recently used items."""
+        cache = LruCache(max_size=2)
+        cache.put("a", 1)
+        cache.put("b", 2)
+        cache.get("a")
+        cache.put("c", 3)
+        assert len(cache) == 2
+        self.assertIsNone(cache.get("b"))
+        assert cache.get("a") == 1
+        assert repr(cache) == "<LruCache(size=2, max_size=2, hits=2, misses=1)>"
+
+
+class TestGeometryKernels(unittest.TestCase):
+    """Tests for the geometry kernels."""
+
+    def setUp(self):
+        """Start without any cached polygons."""
+        geometry.clear_caches()
+
+    def test_geometry_type(self):
+        """Test recognising geometry types."""
+        assert geometry.geometry_type(Point((151.0, -30.0))) == "Point"
+        assert geometry.geometry_type(MagicMock(spec=MultiPolygon)) == "MultiPolygon"
+        assert geometry.geometry_type({"type": "LineString"}) == "LineString"
+        self.assertIsNone(geometry.geometry_type({"type": "Unknown"}))
+        self.assertIsNone(geometry.geometry_type(MagicMock()))
+
+    def test_distance(self):
+        """Test distances to all types of geometries."""
+        home_coordinates = (-30.25, 150.5)
+        expected = haversine(home_coordinates, (-30.25, 151.0))
+        for item in [
+            Point((151.0, -30.25)),
+            MultiPoint([(152.0, -30.0), (151.0, -30.25)]),
+            LineString([(151.0, -30.0), (151.0, -30.5)]),
+            MultiLineString([[(152.0, -30.0), (152.0, -31.0)], SQUARE]),
+            Polygon([SQUARE]),
+            MultiPolygon(
+                [([(160.0, -30.0), (161.0, -30.0), (160.0, -31.0)],), (SQUARE,)]
+            ),
+            GeometryCollection([Point((160.0, -30.0)), Polygon([SQUARE])]),
+            {"type": "LineString", "coordinates": [[151.0, -30.0], [151.0, -30.5]]},
+        ]:
+            self.assertAlmostEqual(
+                geometry.distance(home_coordinates, item), expected, 2, msg=item
+            )
+        assert geometry.distance(home_coordinates, MagicMock()) == float("inf")
+        assert geometry.distance((-30.1, 151.1), MultiPolygon([(SQUARE,)])) == 0.0
+        assert geometry.distance((-30.25, 151.25), Polygon([SQUARE, HOLE])) > 0.0
+
+    def test_distances(self):
+        """Test calculating distances of mixed geometries at once."""
+        home_coordinates = (-31.0, 150.0)
+        geometries = [
+            Point((151.0, -30.0)),
+            Polygon([SQUARE]),
+            MagicMock(),
+            Point((150.0, -31.5)),
+            LineString([(151.0, -30.0), (151.0, -30.5)]),
+        ]
+        distances = geometry.distances(home_coordinates, geometries)
+        assert len(distances) == 5
+        for item, distance in zip(geometries, distances):
+            self.assertAlmostEqual(
+                distance, geometry.distance(home_coordinates, item), 6
+            )
+        assert distances[2] == float("inf")
+
+    def test_batch_distances(self):
+        """Test ruling out far lines and polygons before any closest point."""
+        home_coordinates = (-31.0, 150.0)
+        lines = [
+            LineString([(151.0, -30.0), (151.0, -30.5)]),
+            MultiLineString([[(170.0, -10.0), (171.0, -10.0)], SQUARE]),
+            LineString([(170.0, -10.0), (171.0, -10.0)]),
+            LineString([]),
+        ]
+        polygons = [
+            Polygon([SQUARE]),
+            Polygon([[(170.0, -10.0), (171.0, -10.0), (170.0, -11.0)]]),
+            MultiPolygon([([(170.0, -10.0), (171.0, -10.0), (170.0, -11.0)],)]),
+        ]
+        # Closest points are only calculated for the geometries near home.
+        for items, calls in [(lines, 2), (polygons, 1)]:
+            exact = [geometry.distance(home_coordinates, item) for item in items]
+            assert geometry.distances(home_coordinates, items) == exact
+            # Keep the prepared polygons, but not their distances.
+            geometry._POLYGON_DISTANCES.clear()
+            with mock.patch(
+                "geojson_client.geometry._closest_on_arcs",
+                wraps=geometry._closest_on_arcs,
+            ) as closest:
+                distances = geometry.distances(home_coordinates, items, 500.0)
+            assert closest.call_count == calls
+            for distance, expected in zip(distances, exact):
+                if expected <= 500.0:
+                    self.assertAlmostEqual(distance, expected, 6)
+                else:
+                    assert 500.0 < distance <= expected + 1e-6
+
+    def test_centroid_and_bbox(self):
+        """Test centroids and bounding boxes of all types of geometries."""
+        assert geometry.centroid(Point((151.0, -30.0))) == (-30.0, 151.0)
+        assert geometry.centroid(MultiPoint([(151.0, -30.0), (152.0, -31.0)])) == (
+            -30.5,
+            151.5,
+        )
+        assert geometry.centroid(LineString([(151.0, -30.0), (152.0, -31.0)])) == (
+            -30.5,
+            151.5,
+        )
+        self.assertAlmostEqual(geometry.centroid(Polygon([SQUARE]))[0], -30.2, 6)
+        self.assertIsNone(geometry.centroid(MagicMock()))
+        collection = GeometryCollection(
+            [LineString([(151.0, -30.0), (152.0, -31.0)]), Polygon([SQUARE])]
+        )
+        assert geometry.centroid(collection) == (-30.5, 151.5)
+        assert geometry.bbox(collection) == (-31.0, 151.0, -30.0, 152.0)
+        assert geometry.bbox(MultiPolygon([(SQUARE,)])) == (-30.5, 151.0, -30.0, 151.5)
+        assert geometry.bboxes([Point((151.0, -30.0)), MagicMock()]) == [
+            (-30.0, 151.0, -30.0, 151.0),
+            None,
+        ]
+        assert geometry.centroids([Point((151.0, -30.0))]) == [(-30.0, 151.0)]
+
+    def test_register_kernel(self):
+        """Test registering a kernel for another geometry type."""
+
+        class CircleKernel(GeometryKernel):
+            """Kernel for circles with a radius in km."""
+
+            def distance(self, home_coordinates, item, max_distance=None, model=None):
+                """Return the distance to the circle."""
+                return max(
+                    0.0,
+                    haversine_distance(*home_coordinates, *item["center"])
+                    - item["radius"],
+                )
+
+        geometry.register_kernel("Circle", CircleKernel())
+        try:
+            circle = {"type": "Circle", "center": (-30.0, 151.0), "radius": 10.0}
+            self.assertAlmostEqual(geometry.distance((-31.0, 150.0), circle), 136.8, 1)
+        finally:
+            del geometry.KERNELS["Circle"]
@@ -0,0 +1,145 @@
+"""Tests for the entry history."""
+import unittest
+from datetime import datetime, timedelta
+from unittest import mock
+
+from geojson_client.generic_feed import GenericFeedManager
+from geojson_client.history import REASON_REMOVED, REASON_SUPERSEDED, EntryHistory
+from tests.utils import load_fixture
+
+
+def _entry(external_id, title="Title", size=0):
+    """Return a mock feed entry."""
+    entry = mock.MagicMock()
+    entry.external_id = external_id
+    entry.title = title
+    entry.coordinates = (-31.0, 151.0)
+    entry.feature = {"id": external_id, "properties": {"padding": "x" * size}}
+    return entry
+
+
+class TestEntryHistory(unittest.TestCase):
+    """Tests for the entry history."""
+
+    def test_indexes(self):
+        """Test looking up records by id and time."""
+        history = EntryHistory()
+        with mock.patch("geojson_client.history.datetime") as mock_datetime:
+            start = datetime(2020, 1, 1, 12, 0)
+            mock_datetime.now.return_value = start
+            history.record(_entry("1", "Version 1"), REASON_SUPERSEDED, 1)
+            mock_datetime.now.return_value = start + timedelta(minutes=10)
+            history.record(_entry("2"), REASON_REMOVED, 2)
+            mock_datetime.now.return_value = start + timedelta(minutes=20)
+            record = history.record(_entry("1", "Version 2"), REASON_REMOVED, 3)
+            assert len(history) == 3
+            assert [r.title for r in history.for_id("1")] == ["Version 1", "Version 2"]
+            assert history.for_id("3") == []
+            assert [
+                r.external_id
+                for r in history.between(start + timedelta(minutes=5), None)
+            ] == ["2", "1"]
+            assert [
+                r.generation
+                for r in history.between(None, start + timedelta(minutes=10))
+            ] == [1, 2]
+        assert record.feature == {"id": "1", "properties": {"padding": ""}}
+        assert record.coordinates == (-31.0, 151.0)
+        assert repr(record).startswith("<HistoryRecord(external_id=1, reason=removed")
+        history.clear()
+        assert len(history) == 0
+        assert history.size == 0
+
+    def test_evict_by_age(self):
+        """Test records are evicted once they are older than the maximum age."""
+        history = EntryHistory(max_age=3600)
+        with mock.patch("geojson_client.history.datetime") as mock_datetime:
+            start = datetime(2020, 1, 1, 12, 0)
+            mock_datetime.now.return_value = start
+            history.record(_entry("1"), REASON_REMOVED)
+            mock_datetime.now.return_value = start + timedelta(minutes=40)
+            history.record(_entry("2"), REASON_REMOVED)
+            mock_datetime.now.return_value = start + timedelta(minutes=61)
+            assert [r.external_id for r in history.between()] == ["2"]
+            assert history.for_id("1") == []
+            assert len(history) == 1
+
+    def test_evict_by_count_and_size(self):
+        """Test the oldest records are evicted beyond the count or size."""
+        history = EntryHistory(max_records=3)
+        for index in range(5):
+            history.record(_entry(str(index)), REASON_REMOVED)
+        assert [r.external_id for r in history.between()] == ["2", "3", "4"]
+        history = EntryHistory(max_bytes=1000)
+        for index in range(5):
+            history.record(_entry(str(index), size=300), REASON_REMOVED)
+        assert len(history) == 1
+        assert history.size <= 1000
+        assert repr(history) == "<EntryHistory(records=1, size={})>".format(
+            history.size
+        )
+
+    def test_compaction(self):
+        """Test evicted records are dropped in bulk."""
+        history = EntryHistory(max_records=10)
+        for index in range(5000):
+            history.record(_entry(index % 7), REASON_REMOVED)
+        assert len(history) == 10
+        assert len(history._records) < 2100
+        assert [r.external_id for r in history.between()] == [
+            index % 7 for index in range(4990, 5000)
+        ]
+        assert sum(len(history.for_id(index)) for index in range(7)) == 10
+
+    @mock.patch("requests.Request")
+    @mock.patch("requests.Session")
+    def test_feed_manager(self, mock_session, mock_request):
+        """Test the feed manager records removed and superseded entries."""
+        mock_response = mock_session.return_value.__enter__.return_value.send
+        mock_response.return_value.ok = True
+        mock_response.return_value.text = load_fixture("generic_feed_1.json")
+        history = EntryHistory(max_records=100)
+        feed_manager = GenericFeedManager(
+            lambda external_id: None,
+            lambda external_id: None,
+            lambda external_id: None,
+            (-31.0, 151.0),
+            None,
+            history=history,
+        )
+        assert feed_manager.history is history
+        feed_manager.update()
+        assert len(history) == 0
+        previous = dict(feed_manager.feed_entries)
+
+        mock_response.return_value.text = load_fixture("generic_feed_2.json")
+        feed_manager.update()
+        removed = {
+            record.external_id
+            for record in history.between()
+            if record.reason == REASON_REMOVED
+        }
+        assert removed == set(previous) - set(feed_manager.feed_entries)
+        superseded = {
+            record.external_id
+            for record in history.between()
+            if record.reason == REASON_SUPERSEDED
+        }
+        assert superseded == {
+            external_id
+            for external_id in set(previous) & set(feed_manager.feed_entries)
+            if previous[external_id].feature
+            != feed_manager.feed_entries[external_id].feature
+        }
+        assert superseded
+        for record in history.between():
+            assert record.generation == 2
+            assert record.feature == previous[record.external_id].feature
+
+        # A failed update removes all entries.
+        mock_response.return_value.ok = False
+        current = set(feed_manager.feed_entries)
+        feed_manager.update()
+        assert {
+            record.external_id for record in history.between() if record.generation == 3
+        } == current
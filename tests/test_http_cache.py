@@ -0,0 +1,139 @@
+"""Tests for the HTTP cache."""
+import tempfile
+import unittest
+from unittest import mock
+
+from geojson_client import UPDATE_OK, UPDATE_OK_NO_DATA
+from geojson_client.fetch_policy import CACHE_HIT, CACHE_MISS, CACHE_REVALIDATED
+from geojson_client.generic_feed import GenericFeed
+from geojson_client.http_cache import HttpCache, freshness_lifetime
+from tests.utils import load_fixture
+
+
+def _response(text, headers=None, status_code=200):
+    """Return a mocked response."""
+    return mock.MagicMock(
+        ok=status_code < 400, status_code=status_code, text=text, headers=headers or {}
+    )
+
+
+class TestHttpCache(unittest.TestCase):
+    """Tests for the HTTP cache."""
+
+    def test_freshness_lifetime(self):
+        """Test determining how long a response is fresh."""
+        assert freshness_lifetime({"cache-control": "public, max-age=60"}) == 60.0
+        assert freshness_lifetime({"cache-control": "max-age=60", "age": "20"}) == 40.0
+        assert freshness_lifetime({"cache-control": "no-cache, max-age=60"}) == 0.0
+        assert freshness_lifetime({"cache-control": "max-age=invalid"}) == 0.0
+        assert (
+            freshness_lifetime(
+                {
+                    "date": "Sun, 18 Oct 2026 10:00:00 GMT",
+                    "expires": "Sun, 18 Oct 2026 10:01:30 GMT",
+                }
+            )
+            == 90.0
+        )
+        assert freshness_lifetime({"expires": "invalid"}) == 0.0
+        assert freshness_lifetime({}) == 0.0
+
+    def test_store_and_evict(self):
+        """Test storing responses and evicting the least recently used."""
+        cache = HttpCache(max_entries=2)
+        cache.store("url1", _response("1", {"Cache-Control": "max-age=60"}))
+        cache.store("url2", _response("2"))
+        assert cache.get("url1").is_fresh()
+        assert not cache.get("url2").is_fresh()
+        cache.get("url1")
+        cache.store("url3", _response("3"))
+        assert len(cache) == 2
+        self.assertIsNone(cache.get("url2"))
+        self.assertIsNotNone(cache.get("url1"))
+
+        cache = HttpCache(max_bytes=5)
+        cache.store("url1", _response("123"))
+        cache.store("url2", _response("456"))
+        assert len(cache) == 1
+        self.assertIsNone(cache.get("url1"))
+
+    def test_no_store(self):
+        """Test not storing responses the server does not allow to cache."""
+        cache = HttpCache()
+        self.assertIsNone(
+            cache.store("url1", _response("1", {"Cache-Control": "no-store"}))
+        )
+        assert len(cache) == 0
+
+    def test_directory(self):
+        """Test keeping cached responses in a directory."""
+        with tempfile.TemporaryDirectory() as directory:
+            cache = HttpCache(directory=directory)
+            cache.store(
+                "url1", _response("1", {"Cache-Control": "max-age=60", "ETag": "a"})
+            )
+            cached = HttpCache(directory=directory).get("url1")
+            assert cached.text == "1"
+            assert cached.is_fresh()
+            assert cached.validators() == {"If-None-Match": "a"}
+            cache.remove("url1")
+            self.assertIsNone(HttpCache(directory=directory).get("url1"))
+
+
+class TestFeedWithHttpCache(unittest.TestCase):
+    """Tests for feeds using the HTTP cache."""
+
+    @mock.patch("requests.Request")
+    @mock.patch("requests.Session")
+    def test_fresh_response(self, mock_session, mock_request):
+        """Test serving a fresh response from the cache."""
+        mock_send = mock_session.return_value.__enter__.return_value.send
+        mock_send.return_value = _response(
+            load_fixture("generic_feed_1.json"), {"Cache-Control": "max-age=60"}
+        )
+        feed = GenericFeed((-31.0, 151.0), "url", http_cache=HttpCache())
+        status, entries = feed.update()
+        assert status == UPDATE_OK
+        assert len(entries) == 5
+        assert feed.last_fetch_status.cache_status == CACHE_MISS
+
+        status, entries = feed.update()
+        assert status == UPDATE_OK_NO_DATA
+        assert feed.last_fetch_status.cache_status == CACHE_HIT
+        assert feed.last_fetch_status.attempts == 0
+        assert mock_send.call_count == 1
+
+        # Another feed sharing the cache receives the cached response.
+        other_feed = GenericFeed((-31.0, 151.0), "url", http_cache=feed._http_cache)
+        status, entries = other_feed.update()
+        assert status == UPDATE_OK
+        assert len(entries) == 5
+        assert mock_send.call_count == 1
+
+    @mock.patch("requests.Request")
+    @mock.patch("requests.Session")
+    def test_revalidate_response(self, mock_session, mock_request):
+        """Test revalidating a stale response."""
+        mock_send = mock_session.return_value.__enter__.return_value.send
+        mock_send.return_value = _response(
+            load_fixture("generic_feed_1.json"), {"ETag": '"abc"'}
+        )
+        feed = GenericFeed((-31.0, 151.0), "url", http_cache=HttpCache())
+        status, entries = feed.update()
+        assert status == UPDATE_OK
+
+        mock_send.return_value = _response("", {"ETag": '"abc"'}, status_code=304)
+        status, entries = feed.update()
+        assert status == UPDATE_OK_NO_DATA
+        assert feed.last_fetch_status.cache_status == CACHE_REVALIDATED
+        conditional_request = mock_request.return_value.prepare.return_value.copy
+        conditional_request.return_value.headers.update.assert_called_with(
+            {"If-None-Match": '"abc"'}
+        )
+
+        mock_send.return_value = _response(
+            load_fixture("generic_feed_2.json"), {"ETag": '"def"'}
+        )
+        status, entries = feed.update()
+        assert status == UPDATE_OK
+        assert len(entries) == 3
@@ -0,0 +1,27 @@
+"""Tests for the import time of the package."""
+import unittest
+
+from benchmarks.import_time import loaded_modules, measure, parse_import_times
+
+
+class TestImportTime(unittest.TestCase):
+    """Tests for the import time of the package."""
+
+    def test_lazy_dependencies(self):
+        """Test importing feeds does not load the heavy dependencies."""
+        for module in (
+            "geojson_client",
+            "geojson_client.generic_feed",
+            "geojson_client.usgs_earthquake_hazards_program_feed",
+        ):
+            assert loaded_modules(module) == [], module
+
+    def test_measure(self):
+        """Test measuring the import times."""
+        times = measure("geojson_client.consts")
+        self_time, cumulative_time = times["geojson_client.consts"]
+        assert 0 < self_time <= cumulative_time
+        assert parse_import_times(
+            "import time: self [us] | cumulative | imported package\n"
+            "import time:       235 |        235 |     geojson_client.consts\n"
+        ) == {"geojson_client.consts": (235, 235)}
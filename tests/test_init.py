@@ -103,3 +103,21 @@ class TestGeoJsonDistanceHelper(unittest.TestCase):
             home_coordinates, mock_unsupported_geometry
         )
         assert distance == float("inf")
+
+    def test_distance_to_polygon_inside(self):
+        """Test calculating distance to polygon containing home."""
+        home_coordinates = [-30.2, 151.2]
+        mock_polygon = MagicMock(spec=Polygon)
+        mock_polygon.coordinates = [
+            [
+                [151.0, -30.0],
+                [151.5, -30.0],
+                [151.5, -30.5],
+                [151.0, -30.5],
+                [151.0, -30.0],
+            ]
+        ]
+        distance = GeoJsonDistanceHelper.distance_to_geometry(
+            home_coordinates, mock_polygon
+        )
+        assert distance == 0.0
@@ -0,0 +1,156 @@
+"""Tests for local sources."""
+import json
+import os
+import pathlib
+import tempfile
+import unittest
+from unittest import mock
+
+from geojson_client import UPDATE_ERROR, UPDATE_OK, UPDATE_OK_NO_DATA
+from geojson_client.generic_feed import GenericFeed
+from geojson_client.local_source import FeatureStream, LocalSource, local_path
+from tests.utils import load_fixture
+
+
+class TestLocalSource(unittest.TestCase):
+    """Tests for local sources."""
+
+    def setUp(self):
+        """Create a directory for the files."""
+        self._directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        """Remove the files."""
+        self._directory.cleanup()
+
+    def _write(self, name, content):
+        """Write a file and return its path."""
+        path = os.path.join(self._directory.name, name)
+        with open(path, "w") as file:
+            file.write(content)
+        return path
+
+    def test_local_path(self):
+        """Test recognising local paths."""
+        assert local_path("/tmp/feed.json") == "/tmp/feed.json"
+        assert local_path("file:///tmp/my%20feed.json") == "/tmp/my feed.json"
+        assert local_path(pathlib.Path("/tmp/feed.json")) == "/tmp/feed.json"
+        self.assertIsNone(local_path("feed.json"))
+        self.assertIsNone(local_path("https://example.com/feed.json"))
+        self.assertIsNone(local_path(None))
+
+    def test_read(self):
+        """Test reading feature collections and newline-delimited features."""
+        collection = json.loads(load_fixture("generic_feed_1.json"))
+        pretty = LocalSource(
+            self._write("pretty.json", json.dumps(collection, indent=2))
+        )
+        compact = LocalSource(self._write("compact.json", json.dumps(collection)))
+        ndjson = LocalSource(
+            self._write(
+                "features.ndjson",
+                "\n".join(json.dumps(feature) for feature in collection["features"])
+                + "\n\n",
+            )
+        )
+        for source in (pretty, compact, ndjson):
+            features = source.read().features
+            assert len(features) == 6
+            assert features[0]["properties"]["title"] == "Title 1"
+            assert len(list(source.features())) == 6
+        assert repr(ndjson) == "<LocalSource(path={})>".format(ndjson.path)
+
+        single = LocalSource(
+            self._write("single.ndjson", json.dumps(collection["features"][0]))
+        )
+        assert len(single.read().features) == 1
+        empty = LocalSource(self._write("empty.ndjson", ""))
+        assert empty.read().features == []
+
+    def test_feed(self):
+        """Test updating feeds from local files."""
+        path = self._write("feed.json", load_fixture("generic_feed_1.json"))
+        feed = GenericFeed((-31.0, 151.0), "file://" + path, skip_unchanged=True)
+        status, entries = feed.update()
+        assert status == UPDATE_OK
+        assert len(entries) == 5
+        status, entries = feed.update()
+        assert status == UPDATE_OK_NO_DATA
+
+        self._write("feed.json", load_fixture("generic_feed_2.json"))
+        os.utime(path, ns=(0, 0))
+        status, entries = feed.update()
+        assert status == UPDATE_OK
+        assert len(entries) == 3
+
+        self._write("feed.json", "{")
+        status, entries = feed.update()
+        assert status == UPDATE_ERROR
+        os.remove(path)
+        status, entries = feed.update()
+        assert status == UPDATE_ERROR
+
+    def test_read_metadata(self):
+        """Test keeping the metadata of a single feature collection."""
+        source = LocalSource(
+            self._write(
+                "usgs.json", load_fixture("usgs_earthquake_hazards_program_feed.json")
+            )
+        )
+        collection = source.read()
+        assert collection.metadata["title"] == "Feed Title"
+        assert len(collection.features) == 3
+
+    def test_stream(self):
+        """Test building entries straight from newline-delimited files."""
+        collection = json.loads(load_fixture("generic_feed_1.json"))
+        lines = [json.dumps(feature) for feature in collection["features"]]
+        path = self._write("features.ndjson", "\n".join(lines))
+        source = LocalSource(path)
+        assert isinstance(source.stream(), FeatureStream)
+        assert source.stream().get("metadata") is None
+        assert "metadata" not in source.stream()
+        assert repr(source.stream()) == "<FeatureStream(path={})>".format(path)
+        assert source.stream().features is not source.stream().features
+        assert len(list(source.stream().features)) == 6
+        # Single documents are decoded as they are.
+        assert (
+            LocalSource(self._write("single.json", json.dumps(collection)))
+            .stream()
+            .get("type")
+            == "FeatureCollection"
+        )
+
+        feed = GenericFeed((-31.0, 151.0), path)
+        status, entries = feed.update()
+        assert status == UPDATE_OK
+        assert len(entries) == 5
+        # A broken line after the first one is only found while building.
+        self._write("features.ndjson", "\n".join(lines[:2] + ["{"] + lines[2:]))
+        status, entries = feed.update()
+        assert status == UPDATE_ERROR
+
+    def test_stream_keep_last_data(self):
+        """Test keeping the features of newline-delimited files."""
+        collection = json.loads(load_fixture("generic_feed_1.json"))
+        lines = [json.dumps(feature) for feature in collection["features"]]
+        path = self._write("features.ndjson", "\n".join(lines))
+        feed = GenericFeed((-31.0, 151.0), path, keep_last_data=True)
+        status, entries = feed.update()
+        assert status == UPDATE_OK
+        assert len(entries) == 5
+        # The kept features are filtered again without reading the file.
+        self._write("features.ndjson", "\n".join(lines[:2]))
+        with mock.patch.object(LocalSource, "_map") as mock_map:
+            status, entries = feed.reevaluate(filter_overrides={"radius": 750})
+        assert not mock_map.called
+        assert status == UPDATE_OK
+        assert len(entries) == 2
+
+        self._write("features.ndjson", "\n".join(lines[:2] + ["{"] + lines[2:]))
+        status, entries = feed.update()
+        assert status == UPDATE_ERROR
+        # The features of the last successful update are kept.
+        status, entries = feed.reevaluate()
+        assert status == UPDATE_OK
+        assert len(entries) == 5
@@ -0,0 +1,75 @@
+"""Tests for the field mapping."""
+import datetime
+import unittest
+
+import geojson
+
+from geojson_client.mapping import (
+    TIMESTAMP_EPOCH_MILLISECONDS,
+    FeedMapping,
+)
+
+
+def _feature(properties, feature_id=None):
+    """Return a point feature with the properties."""
+    return geojson.Feature(
+        id=feature_id, geometry=geojson.Point((151.0, -31.0)), properties=properties
+    )
+
+
+class TestFeedMapping(unittest.TestCase):
+    """Tests for the field mapping."""
+
+    def test_default_mapping(self):
+        """Test the default fallback chain of external ids."""
+        mapping = FeedMapping()
+        assert mapping.extract(_feature({"id": "2"}, feature_id="1")).external_id == "1"
+        assert mapping.extract(_feature({"id": "2", "guid": "3"})).external_id == "2"
+        assert mapping.extract(_feature({"guid": "3", "title": "T"})).external_id == "3"
+        fields = mapping.extract(_feature({"title": "T"}))
+        assert fields.external_id == "T"
+        assert fields.title == "T"
+        assert repr(fields) == "<MappedFields(external_id=T, title=T)>"
+        fields = mapping.extract(_feature({}), lambda: (-31.0, 151.0))
+        assert fields.external_id == hash((-31.0, 151.0))
+        self.assertIsNone(fields.title)
+        self.assertIsNone(fields.timestamp)
+
+    def test_typed_fields(self):
+        """Test converting timestamps and numbers."""
+        mapping = FeedMapping(
+            external_id=["code", ("properties", "ids", "primary")],
+            timestamp="time",
+            timestamp_format=TIMESTAMP_EPOCH_MILLISECONDS,
+            numeric_fields={"magnitude": "mag", "depth": ("properties", "depth")},
+        )
+        assert mapping.numeric_field_names == ("magnitude", "depth")
+        assert repr(mapping) == "<FeedMapping(numeric_fields=['magnitude', 'depth'])>"
+        fields = mapping.extract(
+            _feature(
+                {
+                    "ids": {"primary": "ab"},
+                    "time": 1537606800000,
+                    "mag": "4.5",
+                    "depth": True,
+                }
+            )
+        )
+        assert fields.external_id == "ab"
+        assert fields.timestamp == datetime.datetime(
+            2018, 9, 22, 9, 0, tzinfo=datetime.timezone.utc
+        )
+        assert fields.numbers == {"magnitude": 4.5, "depth": None}
+
+        # Invalid values are ignored.
+        fields = mapping.extract(_feature({"time": "soon", "mag": "high"}))
+        self.assertIsNone(fields.timestamp)
+        assert fields.numbers == {"magnitude": None, "depth": None}
+
+    def test_iso_timestamp(self):
+        """Test parsing ISO 8601 timestamps."""
+        mapping = FeedMapping(timestamp="updated")
+        fields = mapping.extract(_feature({"updated": "2018-09-22T09:00:00Z"}))
+        assert fields.timestamp == datetime.datetime(
+            2018, 9, 22, 9, 0, tzinfo=datetime.timezone.utc
+        )
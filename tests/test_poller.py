@@ -0,0 +1,110 @@
+"""Tests for the adaptive poller."""
+import json
+import threading
+import unittest
+from unittest import mock
+
+from geojson_client.generic_feed import GenericFeedManager
+from geojson_client.poller import AdaptivePoller, expected_staleness
+from geojson_client.usgs_earthquake_hazards_program_feed import (
+    UsgsEarthquakeHazardsProgramFeedManager,
+)
+from tests.utils import load_fixture
+
+
+def _feed_manager(feed_manager_class, *args):
+    """Return a feed manager without callbacks."""
+    return feed_manager_class(
+        lambda external_id: None,
+        lambda external_id: None,
+        lambda external_id: None,
+        (-31.0, 151.0),
+        *args,
+    )
+
+
+class TestAdaptivePoller(unittest.TestCase):
+    """Tests for the adaptive poller."""
+
+    def test_expected_staleness(self):
+        """Test the expected staleness for different change rates."""
+        # Rare changes hardly cause any staleness.
+        self.assertAlmostEqual(expected_staleness(60.0, 1e-9), 6e-7, 9)
+        # Frequent changes cause a staleness of about half the interval.
+        self.assertAlmostEqual(expected_staleness(60.0, 100.0), 29.99, 2)
+        assert expected_staleness(60.0, 0.01) < expected_staleness(120.0, 0.01)
+        assert expected_staleness(60.0, 0.01) < expected_staleness(60.0, 0.02)
+
+    @mock.patch("requests.Request")
+    @mock.patch("requests.Session")
+    def test_poll_adapts_to_change_rate(self, mock_session, mock_request):
+        """Test polling less often while the feed does not change."""
+        mock_session.return_value.__enter__.return_value.send.return_value.ok = True
+        mock_session.return_value.__enter__.return_value.send.return_value.text = (
+            load_fixture("generic_feed_1.json")
+        )
+        mock_response = (
+            mock_session.return_value.__enter__.return_value.send.return_value
+        )
+        feed_manager = _feed_manager(GenericFeedManager, None)
+        poller = AdaptivePoller(
+            feed_manager, freshness_sla=30.0, min_interval=5.0, max_interval=3600.0
+        )
+        with mock.patch("time.time") as mock_time:
+            mock_time.return_value = 1000.0
+            initial_delay = poller.poll()
+            for _ in range(10):
+                mock_time.return_value += poller.next_poll_delay
+                poller.poll()
+            quiet_delay = poller.next_poll_delay
+            quiet_change_rate = poller.change_rate
+            assert quiet_delay > initial_delay
+
+            for fixture in ("generic_feed_2.json", "generic_feed_1.json") * 5:
+                mock_response.text = load_fixture(fixture)
+                mock_time.return_value += poller.next_poll_delay
+                poller.poll()
+            assert poller.change_rate > quiet_change_rate
+            assert poller.next_poll_delay < quiet_delay
+            assert 5.0 <= poller.next_poll_delay <= 3600.0
+
+    @mock.patch("requests.Request")
+    @mock.patch("requests.Session")
+    def test_poll_after_next_generation(self, mock_session, mock_request):
+        """Test waiting for the next generation of the feed."""
+        feed = json.loads(load_fixture("usgs_earthquake_hazards_program_feed.json"))
+        generated = feed["metadata"]["generated"] / 1000
+        mock_session.return_value.__enter__.return_value.send.return_value.ok = True
+        mock_session.return_value.__enter__.return_value.send.return_value.text = (
+            json.dumps(feed)
+        )
+        feed_manager = _feed_manager(
+            UsgsEarthquakeHazardsProgramFeedManager,
+            "past_hour_all_earthquakes",
+        )
+        poller = AdaptivePoller(
+            feed_manager, freshness_sla=1.0, min_interval=1.0, margin=2.0
+        )
+        with mock.patch("time.time") as mock_time:
+            mock_time.return_value = generated + 10.0
+            poller.poll()
+            feed["metadata"]["generated"] += 300000
+            mock_session.return_value.__enter__.return_value.send.return_value.text = (
+                json.dumps(feed)
+            )
+            mock_time.return_value = generated + 310.0
+            delay = poller.poll()
+        assert poller.regeneration_interval == 300.0
+        # The next generation is expected 300 seconds after the last one.
+        self.assertAlmostEqual(delay, 292.0, 1)
+
+    def test_run(self):
+        """Test polling until stopped."""
+        feed_manager = mock.MagicMock()
+        feed_manager.feed.last_generated = None
+        feed_manager.feed.last_fetch_status = None
+        stop_event = threading.Event()
+        feed_manager.update.side_effect = stop_event.set
+        poller = AdaptivePoller(feed_manager)
+        poller.run(stop_event)
+        assert feed_manager.update.call_count == 1
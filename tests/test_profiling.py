@@ -0,0 +1,145 @@
+"""Tests for the update profiler."""
+import gc
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from geojson_client import UPDATE_OK
+from geojson_client.generic_feed import GenericFeed, GenericFeedManager
+from geojson_client.profiling import (
+    STAGE_BUILD,
+    STAGE_CALLBACKS,
+    STAGE_DECODE,
+    STAGE_DIFF,
+    STAGE_FETCH,
+    STAGE_FILTER,
+    UpdateProfiler,
+)
+from geojson_client.usgs_earthquake_hazards_program_feed import (
+    UsgsEarthquakeHazardsProgramTieredFeed,
+)
+from tests.utils import load_fixture
+
+
+class TestUpdateProfiler(unittest.TestCase):
+    """Tests for the update profiler."""
+
+    @mock.patch("requests.Request")
+    @mock.patch("requests.Session")
+    def test_profile_feed_manager(self, mock_session, mock_request):
+        """Test profiling the next update of a feed manager."""
+        mock_session.return_value.__enter__.return_value.send.return_value.ok = True
+        mock_session.return_value.__enter__.return_value.send.return_value.text = (
+            load_fixture("generic_feed_1.json")
+        )
+        generated = []
+        feed_manager = GenericFeedManager(
+            generated.append,
+            lambda external_id: None,
+            lambda external_id: None,
+            (-31.0, 151.0),
+            None,
+        )
+        profiler = UpdateProfiler(updates=1, memory=True)
+        profiler.attach(feed_manager)
+        # Garbage of other tests collected during the update would count as
+        # freed memory.
+        gc.collect()
+        assert profiler.attached
+        feed_manager.update()
+        assert len(generated) == 5
+        assert not profiler.attached
+        # The wrappers are gone again.
+        assert "update" not in vars(feed_manager)
+        assert "_decode" not in vars(feed_manager.feed)
+
+        results = profiler.results
+        assert len(results) == 1
+        stages = results[0].stages
+        assert set(stages) == {
+            STAGE_FETCH,
+            STAGE_DECODE,
+            STAGE_BUILD,
+            STAGE_FILTER,
+            STAGE_DIFF,
+            STAGE_CALLBACKS,
+        }
+        assert stages[STAGE_CALLBACKS].calls == 5
+        assert stages[STAGE_BUILD].allocated > 0
+        # The time of the diff stage does not include the callbacks.
+        assert (
+            stages[STAGE_DIFF].duration + stages[STAGE_CALLBACKS].duration
+            <= results[0].duration
+        )
+        profile = results[0].as_dict()
+        assert profile["number"] == 1
+        assert any(
+            "_build_entries" in function["function"]
+            for function in profile["stages"][STAGE_BUILD]["functions"]
+        )
+
+        feed_manager.update()
+        assert len(profiler.results) == 1
+
+        with tempfile.TemporaryDirectory() as directory:
+            paths = profiler.dump(directory)
+            assert os.path.join(directory, "update-1-decode.prof") in paths
+            with open(os.path.join(directory, "profiles.json")) as file:
+                assert json.load(file)[0]["stages"][STAGE_FETCH]["calls"] == 1
+
+    @mock.patch("requests.Request")
+    @mock.patch("requests.Session")
+    def test_profile_feed(self, mock_session, mock_request):
+        """Test profiling a feed until detached."""
+        mock_session.return_value.__enter__.return_value.send.return_value.ok = True
+        mock_session.return_value.__enter__.return_value.send.return_value.text = (
+            load_fixture("generic_feed_1.json")
+        )
+        feed = GenericFeed((-31.0, 151.0), None, filter_radius=740.0)
+        profiler = UpdateProfiler(cpu=False)
+        profiler.attach(feed)
+        for _ in range(3):
+            status, entries = feed.update()
+            assert status == UPDATE_OK
+            assert len(entries) == 2
+        profiler.detach()
+        feed.update()
+        results = profiler.results
+        assert [result.number for result in results] == [1, 2, 3]
+        assert set(results[0].stages) == {
+            STAGE_FETCH,
+            STAGE_DECODE,
+            STAGE_BUILD,
+            STAGE_FILTER,
+        }
+        assert results[0].stages[STAGE_FILTER].functions() == []
+        assert repr(profiler) == (
+            "<UpdateProfiler(attached=False, updates=None, results=3)>"
+        )
+
+    @mock.patch("time.time")
+    @mock.patch("requests.Request")
+    @mock.patch("requests.Session")
+    def test_profile_tiered_feed(self, mock_session, mock_request, mock_time):
+        """Test profiling the delta feed of the tiered USGS feed."""
+        mock_time.return_value = 1537606800.0
+        mock_session.return_value.__enter__.return_value.send.return_value.ok = True
+        mock_session.return_value.__enter__.return_value.send.return_value.text = (
+            load_fixture("usgs_earthquake_hazards_program_feed.json")
+        )
+        feed = UsgsEarthquakeHazardsProgramTieredFeed(
+            (-31.0, 151.0), "past_month_all_earthquakes"
+        )
+        feed.update()
+        profiler = UpdateProfiler(updates=1, cpu=False)
+        profiler.attach(feed)
+        # The delta feed is fetched.
+        status, entries = feed.update()
+        assert status == UPDATE_OK
+        assert not profiler.attached
+        assert "_decode" not in vars(feed._delta_feed)
+        stages = profiler.results[0].stages
+        assert stages[STAGE_FETCH].calls == 1
+        assert stages[STAGE_DECODE].calls == 1
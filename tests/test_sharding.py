@@ -0,0 +1,203 @@
+"""Tests for the sharded feed runtime."""
+import os
+import sys
+import time
+import unittest
+from unittest import mock
+
+from geojson_client.cli import create_feed
+from geojson_client.exceptions import GeoJsonException
+from geojson_client.sharding import (
+    SHARED_MEMORY_AVAILABLE,
+    ShardedFeedRuntime,
+    SharedEntry,
+    SharedSnapshotReader,
+    SharedSnapshotWriter,
+    SnapshotMoved,
+    _attach_segment,
+    attach_segment,
+    decode_snapshot,
+    encode_snapshot,
+    read_shared_snapshot,
+    rendezvous_shard,
+)
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures")
+
+
+def _snapshot(generation, count):
+    """Return a mock feed manager snapshot with the number of entries."""
+    entries = {}
+    for index in range(count):
+        entry = mock.MagicMock()
+        entry.title = "Title {}".format(index)
+        entry.coordinates = (-31.0, 151.0 + index)
+        entry.distance_to_home = float(index)
+        entries[str(index)] = entry
+    return mock.MagicMock(generation=generation, status="OK", feed_entries=entries)
+
+
+def _wait_for(condition, timeout=10.0):
+    """Wait until the condition returns a true value, and return it."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        result = condition()
+        if result:
+            return result
+        time.sleep(0.05)
+    raise AssertionError("Timed out")
+
+
+class TestRendezvousShard(unittest.TestCase):
+    """Tests for rendezvous hashing."""
+
+    def test_shard(self):
+        """Test keys only move away from a removed shard."""
+        keys = ["https://example.com/{}.json".format(index) for index in range(200)]
+        before = {key: rendezvous_shard(key, [0, 1, 2, 3]) for key in keys}
+        assert set(before.values()) == {0, 1, 2, 3}
+        after = {key: rendezvous_shard(key, [0, 1, 3]) for key in keys}
+        for key in keys:
+            if before[key] != 2:
+                assert after[key] == before[key]
+            else:
+                assert after[key] in (0, 1, 3)
+        with self.assertRaises(GeoJsonException):
+            rendezvous_shard("key", [])
+
+
+class TestSharedSnapshots(unittest.TestCase):
+    """Tests for snapshots in shared memory."""
+
+    def test_encoding(self):
+        """Test the compact encoding of snapshots."""
+        snapshot = decode_snapshot(encode_snapshot(_snapshot(3, 2)))
+        assert snapshot.generation == 3
+        assert snapshot.status == "OK"
+        assert snapshot.entries[1].external_id == "1"
+        assert snapshot.entries[1].title == "Title 1"
+        assert snapshot.entries[1].longitude == 152.0
+        assert snapshot.entries[1].distance == 1.0
+        assert repr(snapshot) == "<SharedSnapshot(generation=3, status=OK, entries=2)>"
+        assert snapshot.entries[-1] == snapshot.entries[1]
+        assert snapshot.entries[:1] == [SharedEntry("0", "Title 0", -31.0, 151.0, 0.0)]
+        with self.assertRaises(IndexError):
+            snapshot.entries[2]
+        # Missing values and non-ASCII titles.
+        source = _snapshot(4, 1)
+        source.status = None
+        source.feed_entries["0"].coordinates = None
+        source.feed_entries["0"].title = "Café"
+        snapshot = decode_snapshot(encode_snapshot(source))
+        self.assertIsNone(snapshot.status)
+        assert list(snapshot.entries) == [SharedEntry("0", "Café", None, None, 0.0)]
+        with self.assertRaises(ValueError):
+            decode_snapshot(encode_snapshot(_snapshot(3, 2))[:-40])
+
+    @unittest.skipUnless(SHARED_MEMORY_AVAILABLE, "requires shared memory")
+    def test_attach_segment(self):
+        """Test other processes do not remove the segments on exit."""
+        writer = SharedSnapshotWriter()
+        name = writer.publish(encode_snapshot(_snapshot(1, 1)))
+        try:
+            with mock.patch(
+                "multiprocessing.resource_tracker.unregister"
+            ) as mock_unregister:
+                segment = attach_segment(name)
+            segment.close()
+            if sys.version_info < (3, 13):
+                mock_unregister.assert_called_once_with("/" + name, "shared_memory")
+            else:
+                mock_unregister.assert_not_called()
+        finally:
+            writer.close()
+
+    @unittest.skipUnless(SHARED_MEMORY_AVAILABLE, "requires shared memory")
+    def test_writer(self):
+        """Test publishing snapshots and moving them to larger segments."""
+        writer = SharedSnapshotWriter()
+        name = writer.publish(encode_snapshot(_snapshot(1, 1)))
+        assert name == writer.name
+        segment = _attach_segment(name)
+        try:
+            assert read_shared_snapshot(segment).generation == 1
+            assert writer.publish(encode_snapshot(_snapshot(2, 1))) is None
+            assert read_shared_snapshot(segment).generation == 2
+            new_name = writer.publish(encode_snapshot(_snapshot(3, 500)))
+            assert new_name and new_name != name
+            with self.assertRaises(SnapshotMoved):
+                read_shared_snapshot(segment)
+        finally:
+            segment.close()
+        segment = _attach_segment(new_name)
+        try:
+            reader = SharedSnapshotReader(segment)
+            assert repr(reader) == "<SharedSnapshotReader(name={})>".format(new_name)
+            snapshot = reader.read()
+            assert len(snapshot.entries) == 500
+            # The snapshot is only decoded again once it has changed.
+            assert reader.read() is snapshot
+            writer.publish(encode_snapshot(_snapshot(4, 500)))
+            assert reader.read().generation == 4
+            with mock.patch(
+                "geojson_client.sharding.decode_snapshot", side_effect=ValueError
+            ):
+                writer.publish(encode_snapshot(_snapshot(5, 500)))
+                with self.assertRaises(GeoJsonException):
+                    reader.read()
+            assert reader.read().generation == 5
+            writer.close()
+            with self.assertRaises(SnapshotMoved):
+                read_shared_snapshot(segment)
+        finally:
+            segment.close()
+
+
+class TestShardedFeedRuntime(unittest.TestCase):
+    """Tests for the sharded feed runtime."""
+
+    def test_runtime(self):
+        """Test feeds are updated in workers and moved when a worker dies."""
+        paths = [
+            os.path.join(FIXTURES, name)
+            for name in ("generic_feed_1.json", "generic_feed_2.json")
+        ]
+        with ShardedFeedRuntime(
+            workers=2, interval=0.2, check_interval=0.05
+        ) as runtime:
+            assert repr(runtime) == "<ShardedFeedRuntime(workers=[0, 1], feeds=0)>"
+            for path in paths:
+                worker_id = runtime.add_feed(path, create_feed, (0.0, 0.0))
+                assert worker_id == runtime.assignment(path)
+                # Each URL is only managed once.
+                assert runtime.add_feed(path, create_feed, (0.0, 0.0)) == worker_id
+            first = _wait_for(lambda: runtime.snapshot(paths[0]))
+            assert len(first.entries) == 5
+            second = _wait_for(lambda: runtime.snapshot(paths[1]))
+            assert {entry.external_id for entry in second.entries} == {
+                "3456",
+                "4567",
+                "8901",
+            }
+            _wait_for(lambda: runtime.snapshot(paths[0]).generation > first.generation)
+
+            # Kill the worker of the first feed.
+            worker_id = runtime.assignment(paths[0])
+            process, _ = runtime._workers[worker_id]
+            process.terminate()
+            _wait_for(lambda: runtime._workers[worker_id][0] is not process)
+            assert runtime.workers == [0, 1]
+            assert runtime.assignment(paths[0]) == worker_id
+            restarted = _wait_for(lambda: runtime.snapshot(paths[0]))
+            assert len(restarted.entries) == 5
+
+            # Waiting for a segment that is never announced is limited.
+            runtime._segments["missing"] = "geojson-client-missing"
+            start = time.monotonic()
+            assert runtime.snapshot("missing", timeout=0.2) is None
+            assert time.monotonic() - start < 2.0
+
+            runtime.remove_feed(paths[1])
+            assert runtime.assignment(paths[1]) is None
+            assert runtime.snapshot(paths[1]) is None
+        assert runtime.workers == []
@@ -0,0 +1,176 @@
+"""Tests for the HTTP transports."""
+import gzip
+import json
+import unittest
+import zlib
+
+import requests
+
+from benchmarks.stub_server import Scenario, StubFeedServer
+from geojson_client import UPDATE_ERROR, UPDATE_OK
+from geojson_client.exceptions import GeoJsonException
+from geojson_client.generic_feed import GenericFeed
+from geojson_client.transport import (
+    ENCODING_BROTLI,
+    ENCODING_ZSTD,
+    ContentDecoder,
+    HttpxTransport,
+    RequestsTransport,
+    StubTransport,
+    Urllib3Transport,
+    available_encodings,
+    encode_body,
+    read_body,
+)
+from tests.utils import load_fixture
+
+BODY = json.dumps({"values": list(range(2000))}).encode("utf-8")
+
+
+def _chunks(data, size=100):
+    """Split the data into chunks."""
+    return [data[start : start + size] for start in range(0, len(data), size)]
+
+
+class TestContentDecoder(unittest.TestCase):
+    """Tests for decompressing bodies."""
+
+    def test_encodings(self):
+        """Test decompressing bodies chunk by chunk."""
+        for encoding, data in (
+            (None, BODY),
+            ("identity", BODY),
+            ("gzip", gzip.compress(BODY)),
+            ("deflate", zlib.compress(BODY)),
+            # Raw deflate data without the zlib header.
+            ("deflate", zlib.compress(BODY)[2:-4]),
+            ("deflate, gzip", gzip.compress(zlib.compress(BODY))),
+        ):
+            body, transfer = read_body(_chunks(data), encoding)
+            assert body == BODY, encoding
+            assert transfer.wire_bytes == len(data)
+            assert transfer.decoded_bytes == len(BODY)
+            assert transfer.decompress_time >= 0.0
+        assert repr(
+            transfer
+        ) == "<TransferStats(wire_bytes={}, decoded_bytes={})>".format(
+            len(data), len(BODY)
+        )
+        assert repr(ContentDecoder("deflate, gzip")) == "<ContentDecoder(stages=2)>"
+
+    def test_errors(self):
+        """Test unsupported encodings and corrupt bodies."""
+        with self.assertRaises(requests.exceptions.ContentDecodingError):
+            read_body([BODY], "compress")
+        with self.assertRaises(requests.exceptions.ContentDecodingError):
+            read_body([b"not compressed"], "gzip")
+        with self.assertRaises(GeoJsonException):
+            encode_body(BODY, "compress")
+
+    @unittest.skipUnless(ENCODING_BROTLI in available_encodings(), "requires brotli")
+    def test_brotli(self):
+        """Test decompressing brotli bodies."""
+        data = encode_body(BODY, ENCODING_BROTLI)
+        assert read_body(_chunks(data), ENCODING_BROTLI)[0] == BODY
+
+    @unittest.skipUnless(ENCODING_ZSTD in available_encodings(), "requires zstandard")
+    def test_zstd(self):
+        """Test decompressing zstd bodies."""
+        data = encode_body(BODY, ENCODING_ZSTD)
+        assert read_body(_chunks(data), ENCODING_ZSTD)[0] == BODY
+
+
+class TestTransports(unittest.TestCase):
+    """Tests for the transports."""
+
+    def test_stub_transport(self):
+        """Test a feed with the stub transport."""
+        text = load_fixture("generic_feed_1.json").encode("utf-8")
+        wire = gzip.compress(text)
+        transport = StubTransport(
+            [
+                (200, {"Content-Encoding": "gzip"}, wire),
+                (500, {}, b""),
+                (200, {"Content-Encoding": "gzip"}, b"corrupt"),
+            ]
+        )
+        feed = GenericFeed(
+            (-31.0, 151.0), "http://example.com/feed", transport=transport
+        )
+        status, entries = feed.update()
+        assert status == UPDATE_OK
+        assert len(entries) == 5
+        assert "gzip" in transport.requests[0].headers["Accept-Encoding"]
+        fetch_status = feed.last_fetch_status
+        assert fetch_status.wire_bytes == len(wire)
+        assert fetch_status.decoded_bytes == len(text)
+        assert fetch_status.decompress_time > 0.0
+
+        status, _ = feed.update()
+        assert status == UPDATE_ERROR
+        assert feed.last_fetch_status.status_code == 500
+        status, _ = feed.update()
+        assert status == UPDATE_ERROR
+        assert len(transport.requests) == 3
+
+    def test_stub_transport_function(self):
+        """Test canned responses returned by a function."""
+        transport = StubTransport(
+            lambda request: (
+                200,
+                {"Content-Type": "application/json; charset=latin-1"},
+                request.url.encode("latin-1"),
+            )
+        )
+        request = requests.Request("GET", "http://example.com/ä").prepare()
+        response = transport.send(request, 1.0)
+        assert response.ok
+        assert response.text == request.url
+        assert repr(response).startswith("<TransportResponse(url=http://example.com/")
+        assert repr(transport) == "<StubTransport()>"
+
+    def test_pooled_transports(self):
+        """Test fetching from a server with requests and urllib3."""
+        with StubFeedServer(Scenario(events=50, body_size=20000)) as server:
+            for transport in (
+                RequestsTransport(),
+                RequestsTransport(requests.Session()),
+                Urllib3Transport(maxsize=2),
+            ):
+                feed = GenericFeed((-30.0, 150.0), server.url, transport=transport)
+                for _ in range(2):
+                    status, entries = feed.update()
+                    assert status == UPDATE_OK, transport
+                    assert len(entries) == 50
+                    fetch_status = feed.last_fetch_status
+                    # The stub server compresses with gzip.
+                    assert 0 < fetch_status.wire_bytes < fetch_status.decoded_bytes
+                transport.close()
+
+    def test_urllib3_errors(self):
+        """Test connection errors are raised as those of requests."""
+        transport = Urllib3Transport()
+        request = requests.Request("GET", "http://127.0.0.1:1/feed").prepare()
+        with self.assertRaises(requests.exceptions.RequestException):
+            transport.send(request, (0.5, 0.5))
+        feed = GenericFeed(
+            (-31.0, 151.0), "http://127.0.0.1:1/feed", transport=transport
+        )
+        assert feed.update() == (UPDATE_ERROR, None)
+
+    def test_httpx_transport(self):
+        """Test the httpx transport requires httpx."""
+        try:
+            import httpx  # noqa: F401
+        except ImportError:
+            with self.assertRaises(GeoJsonException):
+                HttpxTransport()
+            return
+        with StubFeedServer(Scenario(events=5)) as server:
+            transport = HttpxTransport()
+            feed = GenericFeed((-30.0, 150.0), server.url, transport=transport)
+            status, entries = feed.update()
+            assert status == UPDATE_OK
+            assert len(entries) == 5
+            assert feed.last_fetch_status.wire_bytes > 0
+            transport.close()
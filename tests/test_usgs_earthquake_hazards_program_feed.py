@@ -1,13 +1,16 @@
 """Test for the USGS Earthquake Hazards Program feed."""
 import datetime
+import json
 import unittest
 from unittest import mock
 
-from geojson_client import UPDATE_OK
+from geojson_client import UPDATE_ERROR, UPDATE_OK, UPDATE_OK_NO_DATA
 from geojson_client.exceptions import GeoJsonException
+from geojson_client.transport import StubTransport
 from geojson_client.usgs_earthquake_hazards_program_feed import (
     UsgsEarthquakeHazardsProgramFeed,
     UsgsEarthquakeHazardsProgramFeedManager,
+    UsgsEarthquakeHazardsProgramTieredFeed,
 )
 from tests.utils import load_fixture
 
@@ -57,6 +60,9 @@ class TestUsgsEarthquakeHazardsProgramFeed(unittest.TestCase):
         assert feed_entry.type == "Type 1"
         assert feed_entry.status == "Status 1"
         assert feed_entry.attribution == "Feed Title"
+        assert feed.last_generated == datetime.datetime(
+            2018, 9, 22, 9, 0, tzinfo=datetime.timezone.utc
+        )
 
     @mock.patch("requests.Request")
     @mock.patch("requests.Session")
@@ -82,6 +88,140 @@ class TestUsgsEarthquakeHazardsProgramFeed(unittest.TestCase):
         assert feed_entry.title == "Title 1"
         assert feed_entry.external_id == "1234"
 
+    @mock.patch("requests.Request")
+    @mock.patch("requests.Session")
+    def test_update_skip_unchanged(self, mock_session, mock_request):
+        """Test skipping a feed that has not been regenerated."""
+        home_coordinates = (-31.0, 151.0)
+        fixture = load_fixture("usgs_earthquake_hazards_program_feed.json")
+        mock_response = mock_session.return_value.__enter__.return_value.send
+        mock_response.return_value.ok = True
+        mock_response.return_value.text = fixture
+        mock_response.return_value.content = fixture.encode()
+
+        feed = UsgsEarthquakeHazardsProgramFeed(
+            home_coordinates, "past_hour_significant_earthquakes", skip_unchanged=True
+        )
+        status, entries = feed.update()
+        assert status == UPDATE_OK
+        assert len(entries) == 3
+
+        # Only the generation time is compared, not the whole body.
+        mock_response.return_value.text = fixture.replace(
+            "Title 1", "Title 1 (Updated)"
+        )
+        mock_response.return_value.content = mock_response.return_value.text.encode()
+        status, entries = feed.update()
+        assert status == UPDATE_OK_NO_DATA
+
+        mock_response.return_value.text = fixture.replace(
+            "1537606800000", "1537606860000"
+        ).replace("Title 1", "Title 1 (Updated)")
+        mock_response.return_value.content = mock_response.return_value.text.encode()
+        status, entries = feed.update()
+        assert status == UPDATE_OK
+        assert entries[0].title == "Title 1 (Updated)"
+
+    @mock.patch("time.time")
+    @mock.patch("requests.Request")
+    @mock.patch("requests.Session")
+    def test_tiered_feed(self, mock_session, mock_request, mock_time):
+        """Test keeping the state of a long feed up to date with a short feed."""
+        home_coordinates = (-31.0, 151.0)
+        now = 1537606800.0
+        long_feed = json.loads(
+            load_fixture("usgs_earthquake_hazards_program_feed.json")
+        )
+        # This event is about to fall out of the past month.
+        long_feed["features"][2]["properties"]["time"] = (now - 30 * 86400 + 30) * 1000
+        delta_feed = json.loads(
+            load_fixture("usgs_earthquake_hazards_program_feed.json")
+        )
+        delta_feed["metadata"]["generated"] += 60000
+        delta_feed["metadata"]["title"] = "Delta Feed Title"
+        delta_feed["features"][0]["properties"]["updated"] += 60000
+        delta_feed["features"][0]["properties"]["title"] = "Title 1 (Updated)"
+        delta_feed["features"][1]["properties"]["updated"] -= 60000
+        delta_feed["features"][1]["properties"]["title"] = "Title 2 (Outdated)"
+        delta_feed["features"][2]["id"] = "4567"
+        delta_feed["features"][2]["properties"]["time"] = (now + 30) * 1000
+        mock_send = mock_session.return_value.__enter__.return_value.send
+
+        def _respond(feed):
+            mock_send.return_value.ok = True
+            mock_send.return_value.text = json.dumps(feed)
+
+        feed = UsgsEarthquakeHazardsProgramTieredFeed(
+            home_coordinates,
+            "past_month_all_earthquakes",
+            reconcile_interval=3600.0,
+            keep_last_data=True,
+        )
+        assert repr(feed).startswith(
+            "<UsgsEarthquakeHazardsProgramTieredFeed(home=(-31.0, 151.0), "
+        )
+        mock_time.return_value = now
+        _respond(long_feed)
+        status, entries = feed.update()
+        assert status == UPDATE_OK
+        assert sorted(entry.external_id for entry in entries) == [
+            "1234",
+            "2345",
+            "3456",
+        ]
+
+        # The delta feed is merged and the oldest event ages out.
+        mock_time.return_value = now + 60
+        _respond(delta_feed)
+        status, entries = feed.update()
+        assert status == UPDATE_OK
+        entries = {entry.external_id: entry for entry in entries}
+        assert sorted(entries) == ["1234", "2345", "4567"]
+        assert entries["1234"].title == "Title 1 (Updated)"
+        assert entries["2345"].title == "Title 2"
+        # The long feed's title remains the attribution of all entries.
+        assert {entry.attribution for entry in entries.values()} == {"Feed Title"}
+        assert feed._last_data.metadata == {
+            "generated": delta_feed["metadata"]["generated"],
+            "title": "Feed Title",
+            "count": 3,
+        }
+        assert feed.last_generated == datetime.datetime(
+            2018, 9, 22, 9, 1, tzinfo=datetime.timezone.utc
+        )
+
+        # An error fetching the delta feed is reported.
+        mock_time.return_value = now + 120
+        mock_send.return_value.ok = False
+        mock_send.return_value.status_code = 503
+        status, entries = feed.update()
+        assert status == UPDATE_ERROR
+        assert feed.last_fetch_status.status_code == 503
+        assert feed.last_fetch_status is feed._delta_feed.last_fetch_status
+
+        # The long feed replaces the state when reconciling.
+        mock_time.return_value = now + 3600
+        _respond(long_feed)
+        status, entries = feed.update()
+        assert status == UPDATE_OK
+        assert len(entries) == 2
+        assert mock_send.call_count == 4
+
+    def test_tiered_feed_wrong_delta_feed(self):
+        """Test invalid delta feeds."""
+        home_coordinates = (-31.0, 151.0)
+        with self.assertRaises(GeoJsonException):
+            UsgsEarthquakeHazardsProgramTieredFeed(
+                home_coordinates,
+                "past_day_all_earthquakes",
+                delta_feed_type="past_hour_m45_earthquakes",
+            )
+        with self.assertRaises(GeoJsonException):
+            UsgsEarthquakeHazardsProgramTieredFeed(
+                home_coordinates,
+                "past_hour_all_earthquakes",
+            )
+
     def test_update_wrong_feed(self):
         """Test invalid feed name."""
         home_coordinates = (-31.0, 151.0)
@@ -165,3 +305,30 @@ class TestUsgsEarthquakeHazardsProgramFeed(unittest.TestCase):
         assert len(generated_entity_external_ids) == 1
         assert len(updated_entity_external_ids) == 1
         assert len(removed_entity_external_ids) == 0
+
+    def test_feed_manager_feed_options(self):
+        """Test passing the feed options through the feed manager."""
+        transport = StubTransport(
+            [
+                (
+                    200,
+                    {},
+                    load_fixture("usgs_earthquake_hazards_program_feed.json").encode(
+                        "utf-8"
+                    ),
+                )
+            ]
+        )
+        feed_manager = UsgsEarthquakeHazardsProgramFeedManager(
+            lambda external_id: None,
+            lambda external_id: None,
+            lambda external_id: None,
+            (-31.0, 151.0),
+            "past_hour_significant_earthquakes",
+            skip_unchanged=True,
+            transport=transport,
+        )
+        feed_manager.update()
+        assert len(transport.requests) == 1
+        assert len(feed_manager.feed_entries) == 3
+        assert feed_manager.feed.update()[0] == UPDATE_OK_NO_DATA